@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Simple HTTP load test for the NEO API.
+
+Sends GET requests to one or more routes from a pool of threads for a fixed
+duration and prints requests per second and latency percentiles as JSON.
+
+Example:
+    python bench/load_test.py --url http://localhost:5000 --routes /healthz /data/2030 --concurrency 16
+"""
+import argparse
+import json
+import threading
+import time
+import requests
+
+
+def _run(session: requests.Session, urls: list, deadline: float, latencies: list, errors: list) -> None:
+    i = 0
+    while time.perf_counter() < deadline:
+        url = urls[i % len(urls)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=30)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except requests.RequestException as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def load_test(base_url: str, routes: list, concurrency: int, duration: float) -> dict:
+    '''
+    Runs the load test and summarizes it.
+
+    Args:
+        base_url (str): address of the API
+        routes (list): routes requested in turn by each thread
+        concurrency (int): number of client threads
+        duration (float): seconds to run for
+    Returns:
+        report (dict): request count, errors, requests per second and latency percentiles in ms
+    '''
+    urls = [base_url.rstrip('/') + route for route in routes]
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_run, args=(requests.Session(), urls, deadline, latencies, errors))
+               for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def pct(p):
+        return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000, 2) if latencies else None
+
+    return {'routes': routes,
+            'concurrency': concurrency,
+            'requests': len(latencies),
+            'errors': len(errors),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': pct(0.50),
+            'p95_ms': pct(0.95),
+            'p99_ms': pct(0.99)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--routes', nargs='+', default=['/healthz'])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+    print(json.dumps(load_test(args.url, args.routes, args.concurrency, args.duration), indent=2))
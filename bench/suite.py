@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the NEO API and worker on synthetic CNEOS data.
+
+For every dataset size the suite writes a synthetic csv (bench/synthetic.py) and loads it with
+an ingest job into an in-process fakeredis server. It then times:
+- every read route, /now and the top-K route (/data/biggest_neos), through the Flask test client
+- both worker plot jobs
+
+The report is JSON keyed by dataset size and route name, so reports of two commits can be
+compared. Use --compare to check a run against an earlier report; the script exits with
+status 1 if anything got slower by more than --threshold.
+
+Routes are timed three ways:
+- first: the first request after the load, which also builds the per-version columnar table
+  and KD-tree
+- median_ms and min_ms: over --repeat requests that miss the response cache
+- cached_ms: a request answered from the response cache
+
+Needs fakeredis: pip install -r bench/requirements.txt
+
+Example:
+    python bench/suite.py --rows 10000 100000 --output report.json
+    python bench/suite.py --rows 10000 100000 --compare report.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+# read and plot routes, named so reports of different commits line up
+ROUTES = {
+    'data': '/data',
+    'data_date': '/data/date',
+    'data_year': '/data/2030',
+    'distance_query': '/data/distance_query?min=0.001&max=0.0012',
+    'velocity_query': '/data/velocity_query?min=30&max=31',
+    'max_diam': '/data/max_diam/5',
+    'top_k': '/data/biggest_neos/10',
+    'now': '/now/10',
+    'query_filter': '/data/query?where=velocity>30,h<=20&sort=-velocity&limit=100',
+    'query_group': '/data/query?where=year>=2000&group=year&agg=count,mean:velocity,max:h',
+    'similar': '/data/similar?distance=0.01&velocity=12&h=22&k=10',
+    'stats': '/stats',
+    'stats_column': '/stats/velocity?start=2000&end=2100',
+}
+JOBS = {
+    'hexbin': {'start_date': '2025-Jan-01', 'end_date': '2034-Dec-31', 'kind': '1'},
+    'month_scatter': {'start_date': '2030-Jun-01', 'end_date': '2030-Jun-30', 'kind': '2'},
+}
+
+
+def setup(nodes: int = 0):
+    '''
+    Points the shared Redis pools at one fakeredis server and imports the API and worker.
+
+    Args:
+        nodes (int): number of catalog nodes, each a fakeredis server of its own; 0 keeps the
+            catalog in db 0 of the main server
+    Returns:
+        modules (tuple): the NEO_api and worker modules
+    '''
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import fakeredis
+    import connections
+    server = fakeredis.FakeServer()
+    for db in (connections.NEO_DB, connections.QUEUE_DB, connections.JOBS_DB,
+               connections.RESULTS_DB, connections.META_DB):
+        connections._pools[db] = fakeredis.FakeRedis(server=server, db=db).connection_pool
+    connections.REDIS_CATALOG_NODES = [f"catalog-{node}:6379" for node in range(nodes)]
+    for node in range(nodes):
+        connections._pools[(connections.NEO_DB, node)] = fakeredis.FakeRedis(server=fakeredis.FakeServer()).connection_pool
+    import NEO_api
+    import worker
+    logging.getLogger().setLevel(os.environ['LOG_LEVEL'])
+    return NEO_api, worker
+
+
+def run_next_job(worker) -> None:
+    """Runs the next job the worker's scheduler picks, in this process."""
+    worker.do_batch(*worker.next_batch(size=1))
+
+
+def phase_sums(metrics) -> dict:
+    """Total seconds and count per (kind, phase) of the worker phase histogram."""
+    sums = {}
+    for name, labels, series in metrics.registry.snapshot()['histograms']:
+        if name == 'neo_worker_phase_seconds':
+            sums[(labels['kind'], labels['phase'])] = (series[-1], sum(series[:-1]))
+    return sums
+
+
+def time_request(client, url: str) -> tuple:
+    start = time.perf_counter()
+    response = client.get(url)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    return elapsed, len(response.get_data())
+
+
+def bench_routes(client, repeat: int, skip: list) -> dict:
+    '''
+    Times every route in ROUTES that is not skipped.
+
+    Returns:
+        routes (dict): per route name, the url, timings in ms and the body size in bytes
+    '''
+    results = {}
+    for name, url in ROUTES.items():
+        if name in skip:
+            continue
+        first, size = time_request(client, url)
+        cached, _ = time_request(client, url)
+        # a parameter the routes ignore gives a new response cache key, so the route runs again
+        separator = '&' if '?' in url else '?'
+        times = [time_request(client, f"{url}{separator}bench={run}")[0] for run in range(repeat)]
+        results[name] = {'url': url,
+                         'first_ms': round(first * 1000, 3),
+                         'median_ms': round(statistics.median(times) * 1000, 3),
+                         'min_ms': round(min(times) * 1000, 3),
+                         'cached_ms': round(cached * 1000, 3),
+                         'bytes': size}
+    return results
+
+
+def bench_jobs(client, worker, metrics, repeat: int) -> dict:
+    '''
+    Times both worker plot jobs, with the mean time of each phase.
+
+    Returns:
+        jobs (dict): per job name, its timings in seconds and mean phase times
+    '''
+    results = {}
+    for name, params in JOBS.items():
+        before = phase_sums(metrics)
+        times = []
+        for _ in range(repeat):
+            job = client.post('/jobs', json=params).get_json()
+            start = time.perf_counter()
+            run_next_job(worker)
+            times.append(time.perf_counter() - start)
+            status = json.loads(worker.jdb.get(job['id']))['status']
+            if status != 'complete':
+                raise RuntimeError(f"{name} job ended {status}")
+        phases = {}
+        for (kind, phase), (total, count) in phase_sums(metrics).items():
+            old_total, old_count = before.get((kind, phase), (0.0, 0))
+            if kind == params['kind'] and count > old_count:
+                phases[phase] = round((total - old_total) / (count - old_count), 4)
+        results[name] = {'params': params,
+                         'median_seconds': round(statistics.median(times), 4),
+                         'min_seconds': round(min(times), 4),
+                         'phases_seconds': phases}
+    return results
+
+
+def bench_dataset(api, worker, rows: int, repeat: int, skip: list, directory: str) -> dict:
+    '''
+    Generates, loads and benchmarks one dataset.
+
+    Returns:
+        dataset (dict): generation and ingest timings, routes and jobs
+    '''
+    import metrics
+    from synthetic import write_csv
+
+    client = api.app.test_client()
+    client.delete('/data')
+
+    path = os.path.join(directory, f"neo_{rows}.csv")
+    start = time.perf_counter()
+    write_csv(path, rows)
+    generate_seconds = time.perf_counter() - start
+
+    api.NEO_CSV_PATH = path
+    job = client.post('/data', query_string={'resume': 'false'}).get_json()
+    start = time.perf_counter()
+    run_next_job(worker)
+    ingest_seconds = time.perf_counter() - start
+    loaded = json.loads(worker.jdb.get(job['id']))
+    if loaded['status'] != 'complete':
+        raise RuntimeError(f"Ingest of {rows} rows ended {loaded['status']}: {loaded.get('errors')}")
+
+    return {'rows': rows,
+            'generate_seconds': round(generate_seconds, 3),
+            'ingest': {'seconds': round(ingest_seconds, 3),
+                       'rows_per_second': round(rows / ingest_seconds, 1)},
+            'routes': bench_routes(client, repeat, skip),
+            'jobs': bench_jobs(client, worker, metrics, max(1, repeat // 2))}
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_ms: float) -> list:
+    '''
+    Compares the timings of a report with those of an earlier one.
+
+    Args:
+        report (dict): the new report
+        baseline (dict): the earlier report
+        threshold (float): relative slowdown counted as a regression, e.g. 0.2 for 20%
+        min_ms (float): slowdowns smaller than this many milliseconds are ignored as noise
+    Returns:
+        rows (list): (dataset rows, name, old ms, new ms, ratio, regressed) for every timing in both
+    '''
+    rows = []
+    for size, dataset in report['datasets'].items():
+        old = baseline.get('datasets', {}).get(size)
+        if old is None:
+            continue
+        pairs = [('ingest', old['ingest']['seconds'] * 1000, dataset['ingest']['seconds'] * 1000)]
+        pairs += [(f"route {name}", old['routes'][name]['median_ms'], timing['median_ms'])
+                  for name, timing in dataset['routes'].items() if name in old['routes']]
+        pairs += [(f"job {name}", old['jobs'][name]['median_seconds'] * 1000, timing['median_seconds'] * 1000)
+                  for name, timing in dataset['jobs'].items() if name in old['jobs']]
+        for name, before, after in pairs:
+            ratio = after / before if before else float('inf')
+            regressed = ratio > 1 + threshold and after - before > min_ms
+            rows.append((size, name, round(before, 3), round(after, 3), round(ratio, 2), regressed))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help='dataset sizes, e.g. 10000 100000 1000000')
+    parser.add_argument('--repeat', type=int, default=5, help='requests per route that miss the response cache')
+    parser.add_argument('--skip', nargs='*', default=[], choices=list(ROUTES),
+                        help='routes to leave out, e.g. data at 1M rows')
+    parser.add_argument('--nodes', type=int, default=0,
+                        help='split the catalog over this many fakeredis servers, as REDIS_CATALOG_NODES does')
+    parser.add_argument('--output', help='file to write the report to, printed otherwise')
+    parser.add_argument('--compare', help='earlier report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown that fails --compare')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='smaller slowdowns are ignored by --compare')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        api, worker = setup(args.nodes)
+        report = {'commit': _commit(),
+                  'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  'python': platform.python_version(),
+                  'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} cpus",
+                  'redis': 'fakeredis',
+                  'catalog_nodes': args.nodes,
+                  'repeat': args.repeat,
+                  'datasets': {}}
+        for rows in args.rows:
+            print(f"benchmarking {rows} rows", file=sys.stderr)
+            report['datasets'][str(rows)] = bench_dataset(api, worker, rows, args.repeat, args.skip, directory)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if not args.compare:
+        return 0
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"compared with {baseline.get('commit')} ({args.compare})", file=sys.stderr)
+    for size, name, before, after, ratio, regressed in compare(report, baseline, args.threshold, args.min_ms):
+        regressions += regressed
+        print(f"{size:>9} {name:<28} {before:>12.3f} ms {after:>12.3f} ms {ratio:>6.2f}x"
+              f"{'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Synthetic CNEOS close-approach data for the benchmarks.
+
+Writes a csv with the columns and value formats of the CNEOS export the API loads (neo.csv):
+close-approach dates with their uncertainty, distances, velocities, H magnitudes, both
+diameter formats and rarity. Dates are unique to the minute, like the keys of the catalog,
+and span 1900 to 2200. The same seed always gives the same file.
+
+Example:
+    python bench/synthetic.py --rows 100000 --output /tmp/neo_100k.csv
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+MONTHS = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+UNCERTAINTIES = np.array(['< 00:01', '00:01', '00:02', '00:13', '01:45', '1_02:30', '12_00:00'])
+LETTERS = np.array(list('ABCDEFGHJKLMNOPQRSTUVWXYZ'))
+FIRST_MINUTE = np.datetime64('1900-01-01T00:00', 'm')
+LAST_MINUTE = np.datetime64('2200-12-31T23:59', 'm')
+
+
+def _unique_minutes(rng: np.random.Generator, rows: int) -> np.ndarray:
+    span = int((LAST_MINUTE - FIRST_MINUTE).astype(np.int64)) + 1
+    if rows > span:
+        raise ValueError(f"At most {span} rows have unique close-approach minutes")
+    minutes = np.unique(rng.integers(0, span, size=rows + rows // 10 + 10))
+    while len(minutes) < rows:
+        minutes = np.unique(np.concatenate([minutes, rng.integers(0, span, size=rows)]))
+    return np.sort(rng.choice(minutes, size=rows, replace=False))
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    '''
+    Generates the rows of a synthetic CNEOS export.
+
+    Args:
+        rows (int): number of close approaches
+        seed (int): random seed
+    Returns:
+        frame (DataFrame): the csv columns, in close-approach order
+    '''
+    rng = np.random.default_rng(seed)
+    times = FIRST_MINUTE + _unique_minutes(rng, rows).astype('timedelta64[m]')
+    years = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = times.astype('datetime64[M]').astype(np.int64) % 12
+    days = (times.astype('datetime64[D]') - times.astype('datetime64[M]')).astype(np.int64) + 1
+    clock = (times - times.astype('datetime64[D]')).astype(np.int64)
+    uncertainty = UNCERTAINTIES[rng.choice(len(UNCERTAINTIES), size=rows, p=[0.4, 0.2, 0.1, 0.1, 0.1, 0.07, 0.03])]
+    dates = [f"{year}-{MONTHS[month]}-{day:02d} {minute // 60:02d}:{minute % 60:02d} ±  {unc}"
+             for year, month, day, minute, unc in zip(years, months, days, clock, uncertainty)]
+    letters = LETTERS[rng.integers(len(LETTERS), size=(rows, 2))]
+    objects = [f"({year} {a}{b}{number})" for year, (a, b), number in
+               zip(years, letters, rng.integers(1, 200, size=rows))]
+
+    distance = rng.uniform(0.0001, 0.05, size=rows)
+    h = np.round(rng.normal(24.0, 3.0, size=rows).clip(10, 34), 1)
+    # diameters from H as in the CNEOS export: a range over albedos, or a measured value in km
+    low = 1329 / np.sqrt(0.25) * 10 ** (-h / 5) * 1000
+    high = 1329 / np.sqrt(0.05) * 10 ** (-h / 5) * 1000
+    measured = rng.random(rows) < 0.02
+    diameters = [f"{lo / 1000:.3f}±{(hi - lo) / 4000:.3f} km" if known else f"{lo:.0f} m -  {hi:.0f} m"
+                 for lo, hi, known in zip(low, high, measured)]
+    velocity = np.round(rng.gamma(4.0, 3.5, size=rows) + 1, 2)
+
+    return pd.DataFrame({
+        'Object': objects,
+        'Close-Approach (CA) Date': dates,
+        'CA DistanceNominal (au)': np.round(distance, 5),
+        'CA DistanceMinimum (au)': np.round(distance * rng.uniform(0.5, 1.0, size=rows), 5),
+        'V relative(km/s)': velocity,
+        'V infinity(km/s)': np.round(velocity * rng.uniform(0.6, 1.0, size=rows), 2),
+        'H(mag)': h,
+        'Diameter': diameters,
+        'Rarity': rng.choice(7, size=rows, p=[0.05, 0.2, 0.3, 0.25, 0.12, 0.06, 0.02]),
+    })
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> str:
+    '''
+    Writes a synthetic CNEOS csv.
+
+    Returns:
+        path (str): the path written
+    '''
+    make_frame(rows, seed).to_csv(path, index=False)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='neo_synthetic.csv')
+    args = parser.parse_args()
+    print(write_csv(args.output, args.rows, args.seed))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the vectorized timestamp parser against the per-string strptime path.
+
+Generates CNEOS style close-approach timestamps, parses them both ways, checks that
+the results agree and prints the timings as JSON.
+
+Example:
+    python bench/timestamps.py --rows 100000 --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from utils import MONTH_ABBREVIATIONS, parse_timestamps, to_epoch  # noqa: E402
+
+
+def make_timestamps(rows: int, seed: int = 0) -> list:
+    '''
+    Generates timestamps like "2031-Mar-07 14:05 ±  1_02:30" with the uncertainty variants of the csv.
+    '''
+    rng = np.random.default_rng(seed)
+    uncertainties = ['< 00:01', '00:01', '00:13', '1_02:30', '12_00:00']
+    return [f"{rng.integers(1900, 2200)}-{MONTH_ABBREVIATIONS[rng.integers(12)]}-{rng.integers(1, 29):02d} "
+            f"{rng.integers(24):02d}:{rng.integers(60):02d} ±  {uncertainties[rng.integers(len(uncertainties))]}"
+            for _ in range(rows)]
+
+
+def parse_one_by_one(timestamps: list) -> tuple:
+    '''
+    The per-string path the API and worker used: split off the uncertainty, then strptime.
+    '''
+    epoch, uncertainty = [], []
+    for value in timestamps:
+        time_part, _, tail = value.split("\\")[0].partition('±')
+        epoch.append(to_epoch(datetime.strptime(time_part.rstrip(), "%Y-%b-%d %H:%M")))
+        days, _, clock = tail.strip().lstrip('<').strip().rpartition('_')
+        hours, minutes = clock.split(':')
+        uncertainty.append(int(days or 0) * 1440 + int(hours) * 60 + int(minutes))
+    return np.array(epoch), np.array(uncertainty, dtype=np.float64)
+
+
+def best_of(function, timestamps: list, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(timestamps)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='number of timestamps')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per parser, the best is reported')
+    args = parser.parse_args()
+
+    timestamps = make_timestamps(args.rows)
+    loop_seconds, (loop_epoch, loop_uncertainty) = best_of(parse_one_by_one, timestamps, args.repeat)
+    vector_seconds, (epoch, uncertainty) = best_of(parse_timestamps, timestamps, args.repeat)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'strptime_seconds': round(loop_seconds, 4),
+        'vectorized_seconds': round(vector_seconds, 4),
+        'speedup': round(loop_seconds / vector_seconds, 1),
+        'epoch_match': bool(np.array_equal(loop_epoch, epoch)),
+        'uncertainty_match': bool(np.array_equal(loop_uncertainty, uncertainty)),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
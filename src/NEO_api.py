@@ -1,97 +1,103 @@
 #!/usr/bin/env python3
-import json
+import io
 import logging
 import redis
 import socket
 import os
 import re
 from datetime import datetime, timezone
-from hotqueue import HotQueue
-import pandas as pd
-from jobs import add_job, get_job_by_id, get_job_result
-from flask import Flask, jsonify, request, Response, send_file
-from utils import create_min_diam_column, create_max_diam_column
+from jobs import (add_job, add_ingest_job, get_job_by_id, get_job_result, cancel_job, promote_job, queue_depths, PRIORITIES,
+                  DEFAULT_PRIORITY)
+from flask import Blueprint, Flask, jsonify, request, Response, send_file
+from ingest import CHECKPOINT_KEY
+import queries
+from cache import cached
+from serialization import FastJSONProvider, compress_response
+import metrics
+from profiling import profile_requests
+from catalog import (load_keys, load_records, load_json, bump_data_version, get_data_version, chronological, paginate,
+                     FIELD_ALIASES)
+from columns import query_table
+import similar
+from similar import load_index
+from rollups import COLUMNS as ROLLUP_COLUMNS, clear_rollups, column_stats, load_buckets, parse_period, period_counts
+from objects import clear_objects, object_keys, search_prefix
+import renditions
+from warmup import find_job, remember_job
+from connections import lazy_redis, lazy_catalog, lazy_queue, read_catalog, JOBS_DB, RESULTS_DB, META_DB
 
 # Set logging
-log_level_str = os.environ.get("LOG_LEVEL", "DEBUG").upper()
+log_level_str = os.environ.get("LOG_LEVEL", "INFO").upper()
 log_level = getattr(logging, log_level_str, logging.ERROR)
 
 format_str=f'[%(asctime)s {socket.gethostname()}] %(filename)s:%(funcName)s:%(lineno)s - %(levelname)s: %(message)s'
 logging.basicConfig(level=log_level, format=format_str)
 
 
-REDIS_IP = os.environ.get("REDIS_HOST", "redis-db")
+# Redis clients, created on first use from the shared pools in connections.py. The read routes
+# take a reader from read_catalog() instead of rd, so they can be served by a replica
+rd = lazy_catalog()
+q = lazy_queue("queue")
+jdb = lazy_redis(JOBS_DB)
+rdb = lazy_redis(RESULTS_DB)
+# Metadata database (ingest checkpoints)
+mdb = lazy_redis(META_DB)
 
-# Initialize Redis client
-rd = redis.Redis(host=REDIS_IP, port=6379, db=0)
-q = HotQueue("queue", host=REDIS_IP, port=6379, db=1)
-jdb = redis.Redis(host=REDIS_IP, port=6379, db=2)
-rdb = redis.Redis(host=REDIS_IP, port=6379, db=3)
+NEO_CSV_PATH = os.environ.get("NEO_CSV_PATH", "/app/neo.csv")
 
-# Initialize app
-app = Flask(__name__)
+# Routes, added to the app by create_app
+api = Blueprint('neo', __name__)
 
-@app.route('/data', methods = ['POST'])
-def fetch_neo_data():
+@api.route('/data', methods = ['POST'])
+def fetch_neo_data() -> Response:
     """
-    This function downloads the data as a csv and uploads it to Redis.
+    This function queues a job that loads the csv into Redis. The worker does the loading,
+    so the request returns right away and progress is reported by /jobs/<jobid>.
         Args:
             None
         Returns:
-            message (str): message indicating whether data push was successful
+            job (JSON): the ingest job that was queued
     """
 
-    logging.debug("Retrieving and parsing data...")
-    try:
-        data = pd.read_csv('/app/neo.csv')
-    except FileNotFoundError:
+    logging.debug("Queueing data ingest...")
+    if not os.path.exists(NEO_CSV_PATH):
         return 'NEO file not found'
-    try:
-        # apply functions to create a minimum and maximum diameter column for use in later route
-        data['Minimum Diameter'] = data['Diameter'].apply(create_min_diam_column)
-        data['Maximum Diameter'] = data['Diameter'].apply(create_max_diam_column)
-        
-        # save data in redis
-        for idx, row in data.iterrows():
-            dict_data = {'Object' : row['Object'], 'Close-Approach (CA) Date' : row['Close-Approach (CA) Date'], 'CA DistanceNominal (au)' : row['CA DistanceNominal (au)'], 'CA DistanceMinimum (au)' : row['CA DistanceMinimum (au)'], 'V relative(km/s)' : row['V relative(km/s)'], 'V infinity(km/s)':  row['V infinity(km/s)'], 'H(mag)' : row['H(mag)'], 'Diameter' : row['Diameter'],'Rarity' : row['Rarity'], 'Minimum Diameter' : row['Minimum Diameter'], 'Maximum Diameter' : row['Maximum Diameter']}
-            rd.set(row['Close-Approach (CA) Date'], json.dumps(dict_data))
-
-        if len(rd.keys('*')) == len(data):
-            logging.debug("Successful loading of data")
-            return 'success loading data\n'
-        else:
-            logging.debug("Unsuccessful loading of data")
-            return 'failed to load all data into redis'
-    except Exception as e:
-        logging.error(f"Error downloading NEO data: {e}")
-        return f"Error fetching data: {e}\n"
+    resume = request.args.get('resume', 'true').lower() != 'false'
+    job = add_ingest_job(NEO_CSV_PATH, resume)
+    logging.debug(f"Ingest job {job['id']} queued")
+    return jsonify(job)
 
-@app.route('/data', methods = ['GET'])
-def return_neo_data() -> str:
+@api.route('/data', methods = ['GET'])
+@cached(precompress=True)
+def return_neo_data() -> Response:
     """
-    This function returns all of the data stored in Redis as a JSON object
+    This function returns the data stored in Redis as a JSON object
+
+    Query Parameters:
+        fields (str): comma separated fields to return, all by default
+        offset (int): number of NEOs to skip
+        limit (int): maximum number of NEOs to return
 
     Args:
         None
     
     Returns:
-        A JSON string that returns all the data stored in redis
+        A JSON response that returns the data stored in redis, in time order
     """
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
     logging.debug("Getting all data...")
-    dat = {}
-    for key in rd.keys('*'):
-        key = key.decode('utf-8')
-        try:
-            # save data in dict
-            val = json.loads(rd.get(key).decode('utf-8'))
-            dat[key] = val
-        except:
-            logging.error(f'Error retrieving data at {key}')
+    reader = read_catalog()
+    page = paginate(chronological(load_keys(reader)), offset, limit)
+    # the body is put together from the stored JSON, without decoding the records
+    dat = load_json(reader, fields=fields, keys=page)
     logging.debug("All data parsed")
-    # return as JSON string
-    return json.dumps(dat, ensure_ascii=False, sort_keys=True)
+    return Response(dat, mimetype='application/json')
 
-@app.route('/data', methods = ["DELETE"])
+@api.route('/data', methods = ["DELETE"])
 def delete_neo_data() -> str:
     '''
     This function deletes all of the data stored in redis
@@ -104,6 +110,12 @@ def delete_neo_data() -> str:
     '''
     logging.debug("Flushing the database...")
     rd.flushdb()
+    # a checkpoint would no longer match what is in redis
+    mdb.delete(CHECKPOINT_KEY)
+    clear_rollups(mdb)
+    clear_objects(mdb)
+    # cached responses were built from the deleted data
+    bump_data_version(mdb)
     if not rd.keys():
         logging.debug("Success in flushing all data")
         return 'Database flushed\n'
@@ -111,31 +123,38 @@ def delete_neo_data() -> str:
         logging.error("Failure in flushing all data")
         return "Database failed to clear\n"
     
-@app.route('/data/date', methods = ['GET'])
+@api.route('/data/date', methods = ['GET'])
+@cached
 def get_date() -> list:
     '''
     This function returns all of the dates and time values which are the keys in Redis.
+    Query Parameters:
+        offset (int): number of dates to skip
+        limit (int): maximum number of dates to return
     Args:
         None
-    Returns: A flask response containing the years/time as a list
+    Returns: A flask response containing the years/time as a list, in time order
     '''
+    try:
+        _, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
     logging.debug("Beginning to return dates")
-    date = []
-    for key in rd.keys('*'):
-        try:
-            key = key.decode('utf-8')
-            date.append(key)
-        except Exception as e:
-            logging.warning(f"Could not decode key: {e}")
+    reader = read_catalog()
+    date = paginate(chronological(load_keys(reader)), offset, limit)
     logging.debug("Completed Date parsing")
     return date
 
-@app.route('/data/<year>', methods = ['GET'])
+@api.route('/data/<year>', methods = ['GET'])
+@cached
 def get_data_by_year(year: str) -> dict:
     '''
     This function returns the data for NEO's that will approach Earth in a given year.
         Args:
             year (str): the year for which you want NEO data for
+        Query Parameters:
+            fields, offset, limit: projection and page of the result, as for /data
         Returns:
             dat (dict) - subset of the data
     '''
@@ -143,17 +162,18 @@ def get_data_by_year(year: str) -> dict:
     logging.debug(f"Retrieving data for year: {year}")
     if not year.isnumeric():
         return 'Invalid year entered\n'
-    
-    dat = {}
-    for key in rd.keys('*'):
-        key = key.decode('utf-8')
-        # check is year matches
-        if key.split('-')[0] == year:
-            dat[key] = json.loads(rd.get(key).decode('utf-8'))
-            logging.debug(f"Loading data associated with key: {key}")
-    return dat
-
-@app.route('/data/distance_query', methods=['GET'])
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    # keys start with the year so only that year's records are fetched
+    reader = read_catalog()
+    page = paginate(chronological(load_keys(reader, f"{year}-*")), offset, limit)
+    return Response(load_json(reader, fields=fields, keys=page), mimetype='application/json')
+
+@api.route('/data/distance_query', methods=['GET'])
+@cached
 def get_distances() -> Response:
     """
     Get all close-approach distances with optional filtering
@@ -161,8 +181,10 @@ def get_distances() -> Response:
     Query Parameters:
         min (float): Minimum distance in AU
         max (float): Maximum distance in AU
-    
-    Args: 
+        offset (int): number of results to skip
+        limit (int): maximum number of results to return
+
+    Args:
         none
 
     Returns:
@@ -174,43 +196,24 @@ def get_distances() -> Response:
         # Parse query parameters
         min_dist = request.args.get('min', type=float)
         max_dist = request.args.get('max', type=float)
-        
-        results = []
-        
-        for key in rd.keys('*'):
-            key = key.decode('utf-8')
-            neo = json.loads(rd.get(key).decode('utf-8'))
-            
-            try:
-                # Get distance
-                distance = float(neo.get('CA DistanceNominal (au)') or neo.get('CA DistanceMinimum (au)', 0))
-            except (ValueError, TypeError):
-                continue
-                
-            # Apply filters
-            if min_dist is not None and distance < min_dist:
-                continue
-            if max_dist is not None and distance > max_dist:
-                continue
-                
-            results.append({
-                'date': key,
-                'object': neo.get('Object', 'Unknown'),
-                'distance_au': distance,
-            })
-            logging.debug(f"Adding distance data associated with {key}")
-
-        logging.debug("Completed close-approach distance analysis")
-        return jsonify({
-            'count': len(results),
-            'results': results
-        })
+        _, offset, limit = queries.parse_projection(request.args)
+
+        # filter on the distance columns, then fetch the object names for the page only
+        reader = read_catalog()
+        table = query_table(reader, mdb, ['CA DistanceNominal (au)', 'CA DistanceMinimum (au)'],
+                            lambda part: queries.distance_rows(part, min_dist, max_dist)[0])
+        rows, distances = queries.distance_rows(table, min_dist, max_dist)
+        keys = paginate(table.keys[rows], offset, limit).tolist()
+        objects = load_records(reader, fields=['Object'], keys=keys)
+        page = queries.distance_results(keys, paginate(distances, offset, limit), objects)
+        return jsonify({'count': len(page), 'total': len(rows), 'results': page})
         
     except Exception as e:
         logging.error(f"Error in get_distances: {str(e)}")
         return jsonify("Error in getting distance")
     
-@app.route('/data/velocity_query', methods= ['GET'])
+@api.route('/data/velocity_query', methods= ['GET'])
+@cached
 def query_velocity() -> dict:
     """
     Query NEO (Near-Earth Object) data stored in Redis based on a velocity range.
@@ -221,6 +224,7 @@ def query_velocity() -> dict:
     Query Parameters:
         min (float): Minimum relative velocity (km/s).
         max (float): Maximum relative velocity (km/s).
+        fields, offset, limit: projection and page of the result, as for /data
 
     Returns:
         dat: A dictionary of NEO data entries within the specified velocity range.
@@ -240,22 +244,21 @@ def query_velocity() -> dict:
     if min_velocity > max_velocity:
         logging.warning('Invalid input: min velocity greater than max velocity.')
         return 'min velocity must be less than max velocity\n'
-
-    dat = {}
-    
-    for key in rd.keys('*'):
-        key = key.decode('utf-8')
-        try:
-            neo = json.loads(rd.get(key).decode('utf-8'))
-            # check velocity
-            if min_velocity <= float(neo.get('V relative(km/s)')) <= max_velocity:
-                dat[key] = json.loads(rd.get(key).decode('utf-8'))
-        except Exception as e:
-            logging.error(f'Error processing key {key}: {e}')
-
-    return dat 
-
-@app.route('/data/max_diam/<max_diameter>', methods=['GET'])
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    # filter on the velocity column, then fetch the requested fields for the page only
+    reader = read_catalog()
+    table = query_table(reader, mdb, ['V relative(km/s)'],
+                        lambda part: queries.velocity_rows(part, min_velocity, max_velocity))
+    keys = table.keys[queries.velocity_rows(table, min_velocity, max_velocity)]
+    return Response(load_json(reader, fields=fields, keys=paginate(keys, offset, limit).tolist()),
+                    mimetype='application/json')
+
+@api.route('/data/max_diam/<max_diameter>', methods=['GET'])
+@cached
 def query_diameter(max_diameter: float) -> Response:
     """
         This function is for an API endpoint. Given a max diameter, this route will find all
@@ -264,34 +267,30 @@ def query_diameter(max_diameter: float) -> Response:
         Args:
             max_diameter: type - float/int. Upper bound for diameter
 
+        Query Parameters:
+            fields, offset, limit: projection and page of the result, as for /data
+
         Returns:
             All the NEOs less than the max_diameter. Compares the input
             to the max diameter of each NEO since it is a range.
     """
     if not max_diameter.isnumeric():
         return "Invalid diameter entered\n"
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
 
     logging.debug(f"Finding NEOs with a diameter less than {max_diameter}")
     max_diameter = float(max_diameter)
-    results = {}
-
-    for key in rd.keys('*'):
-        key_str = key.decode('utf-8')
-        neo = json.loads(rd.get(key).decode('utf-8'))
-
-        diam_str = neo.get('Maximum Diameter')
-        if diam_str:
-            try:
-                diam = float(diam_str)
-                if diam <= max_diameter:
-                    results[key_str] = neo
-                    logging.debug(f"Added NEO with a diamater of {diam}")
-            except (ValueError, TypeError):
-                continue  # skip if diameter isn't parseable
-    logging.debug("Completed diamater analysis")
-    return jsonify(results)
-
-@app.route('/data/biggest_neos/<count>', methods=['GET'])
+    reader = read_catalog()
+    table = query_table(reader, mdb, ['Maximum Diameter'], lambda part: queries.diameter_rows(part, max_diameter))
+    keys = table.keys[queries.diameter_rows(table, max_diameter)]
+    return Response(load_json(reader, fields=fields, keys=paginate(keys, offset, limit).tolist()),
+                    mimetype='application/json')
+
+@api.route('/data/biggest_neos/<count>', methods=['GET'])
+@cached
 def find_biggest_neo(count: int) -> Response:
     """
         This function is for an API endpoint. Given input, it will 
@@ -300,6 +299,10 @@ def find_biggest_neo(count: int) -> Response:
         Args:
             count: type - int. How many NEOs you want returned
 
+        Query Parameters:
+            fields (str): comma separated fields to return, all by default
+            offset (int): number of the biggest NEOs to skip
+
         Returns:
             List of dictionaries of count number of NEOs as a JSON Reponse
     """
@@ -309,38 +312,224 @@ def find_biggest_neo(count: int) -> Response:
     except ValueError:
         logging.error("Invalid count provided, could not convert to integer.")
         return jsonify('Error: Invalid count value. Must be an integer.')
+    try:
+        fields, offset, _ = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
 
-    dat = []
     logging.debug("Retrieving NEO data from Redis...")
-    for key in rd.keys('*'):
-        key_str = key.decode('utf-8')
-        try:
-            value = json.loads(rd.get(key).decode('utf-8'))
-            dat.append({key_str: value})
-        except Exception as e:
-            logging.error(f"Error decoding Redis data for key {key_str}: {e}")
-
-    def get_score(d):
-        time_key = next(iter(d))
-        return d[time_key].get("H(mag)", float('inf'))  # default if score missing
-    
-    sorted_data = sorted(dat, key=get_score)
-    limit_data = sorted_data[:num_neo]
+    reader = read_catalog()
+    # the biggest NEOs of the catalog are among the biggest of each batch
+    table = query_table(reader, mdb, ['H(mag)'], lambda part: queries.biggest_rows(part, offset + num_neo))
+    keys = table.keys[queries.biggest_rows(table, offset + num_neo)[offset:]].tolist()
+    page = load_records(reader, fields=fields, keys=keys)
+    limit_data = [{key: page[key]} for key in keys if key in page]
     logging.info(f"Returning top {num_neo} NEOs based on H scale.")
 
     return jsonify(limit_data)
 
-@app.route('/now/<count>', methods = ['GET'])
+@api.route('/data/query', methods=['GET'])
+@cached
+def query_data() -> Response:
+    """
+    Runs a compound filter, a sort and optional per-period aggregates over the catalog in
+    one vectorized pass, instead of combining the results of the other query routes.
+
+    Query Parameters:
+        where (str): comma separated clauses that must all hold, e.g. velocity>10,h<=22,date>=2025-Jan-01
+        sort (str): column to order by, prefixed with - for descending. Defaults to date.
+        group (str): year or month, to return aggregates per period instead of NEOs
+        agg (str): aggregates per period, e.g. count,mean:velocity,max:h. Defaults to count.
+        fields, offset, limit: projection and page of the result, as for /data
+
+    Returns:
+        JSON with the number of NEOs or periods returned, the total matching and the results
+    """
+    try:
+        plan = queries.parse_query(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    logging.debug(f"Running query plan {plan}")
+    reader = read_catalog()
+    table = query_table(reader, mdb, queries.plan_fields(plan), lambda part: queries.select(part, plan))
+    rows = queries.select(table, plan)
+    if plan['group']:
+        groups = queries.aggregate(table, rows, plan)
+        page = paginate(groups, plan['offset'], plan['limit'])
+        return jsonify({'count': len(page), 'total': len(groups), 'matched': len(rows), 'results': page})
+
+    keys = paginate(table.keys[rows], plan['offset'], plan['limit']).tolist()
+    page = load_records(reader, fields=plan['fields'], keys=keys)
+    return jsonify({'count': len(page), 'total': len(rows), 'results': page})
+
+@api.route('/data/similar', methods=['GET'])
+@cached
+def find_similar() -> Response:
+    """
+    Finds the NEOs closest to a given one, or to given values, in standardized close-approach
+    distance, relative velocity and H magnitude, using a KD-tree of the catalog.
+
+    Query Parameters:
+        key (str): close-approach date of the NEO to search around, or
+        distance, velocity, h (float): the values to search around
+        k (int): number of neighbors, 10 by default
+        radius (float): return every NEO within this weighted distance instead of k
+        weights (str): per feature weights, e.g. velocity:2,h:0.5
+        fields, offset, limit: projection and page of the result, as for /data
+
+    Returns:
+        JSON list of neighbors with their weighted distance, closest first
+    """
+    reader = read_catalog()
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+        neighbors = similar.search(load_index(reader, mdb), request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    neighbors = paginate(neighbors, offset, limit)
+    page = load_records(reader, fields=fields, keys=[key for key, _ in neighbors])
+    results = [{'date': key, 'score': score, 'neo': page.get(key)} for key, score in neighbors]
+    return jsonify({'count': len(results), 'results': results})
+
+def _stats_window() -> tuple:
+    start, end = request.args.get('start'), request.args.get('end')
+    return (parse_period(start) if start else None,
+            parse_period(end, end=True) if end else None)
+
+@api.route('/stats', methods=['GET'])
+@cached
+def get_stats() -> Response:
+    """
+    Summary statistics of every numeric column, combined from the monthly rollups kept at ingest.
+
+    Query Parameters:
+        start (str): first year or month of the window, e.g. 2025 or 2025-Jan
+        end (str): last year or month of the window
+
+    Returns:
+        JSON with the NEO count and the n, mean, std, min and max of each column
+    """
+    try:
+        start, end = _stats_window()
+    except ValueError as e:
+        return f'{e}\n'
+    buckets = load_buckets(mdb, start, end)
+    count = sum(int(bucket.get('count', 0)) for bucket in buckets.values())
+    columns = {alias: column_stats(buckets, alias, histogram=False) for alias in ROLLUP_COLUMNS.values()}
+    return jsonify({'count': count, 'months': len(buckets), 'columns': columns})
+
+@api.route('/stats/counts', methods=['GET'])
+@cached
+def get_stats_counts() -> Response:
+    """
+    NEO counts per year or month, combined from the monthly rollups.
+
+    Query Parameters:
+        group (str): year or month, defaults to month
+        start, end (str): window as for /stats
+
+    Returns:
+        JSON list of {period, count} in time order
+    """
+    group = request.args.get('group', 'month')
+    if group not in ('year', 'month'):
+        return f'Invalid group: {group}\n'
+    try:
+        start, end = _stats_window()
+    except ValueError as e:
+        return f'{e}\n'
+    return jsonify(period_counts(load_buckets(mdb, start, end), group))
+
+@api.route('/stats/<column>', methods=['GET'])
+@cached
+def get_column_stats(column: str) -> Response:
+    """
+    Distribution of one numeric column, combined from the monthly rollups.
+
+    Args:
+        column (str): short name of the column, e.g. velocity, distance, h or rarity
+
+    Query Parameters:
+        start, end (str): window as for /stats
+
+    Returns:
+        JSON with n, mean, std, min, max and the fixed-bin histogram edges and counts
+    """
+    if column not in ROLLUP_COLUMNS.values():
+        return f'Unknown column: {column}\n'
+    try:
+        start, end = _stats_window()
+    except ValueError as e:
+        return f'{e}\n'
+    return jsonify(column_stats(load_buckets(mdb, start, end), column))
+
+@api.route('/objects', methods=['GET'])
+@cached
+def find_objects() -> Response:
+    """
+    Finds objects by the start of their designation, from the designation index kept at ingest.
+
+    Query Parameters:
+        prefix (str): start of the designation, e.g. 2020 A; every object if not given
+        offset (int): number of objects to skip
+        limit (int): maximum number of objects to return
+
+    Returns:
+        JSON list of designations with their number of close approaches, in lexicographic order
+    """
+    try:
+        _, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+    results = search_prefix(mdb, request.args.get('prefix', ''), offset, limit)
+    return jsonify({'count': len(results), 'results': results})
+
+@api.route('/objects/<path:designation>', methods=['GET'])
+@cached
+def get_object(designation: str) -> Response:
+    """
+    Every close approach of one object, in time order.
+
+    Args:
+        designation (str): designation of the object, with or without parentheses, e.g. 2020 AB
+
+    Query Parameters:
+        fields, offset, limit: projection and page of the result, as for /data
+
+    Returns:
+        JSON with the total number of approaches and the records of the page
+    """
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+    keys, total = object_keys(mdb, designation, offset, limit)
+    if not total:
+        return jsonify({'error': f"Unknown object: {designation}"}), 404
+    page = load_records(read_catalog(), fields=fields, keys=keys)
+    results = [{'date': key, 'neo': page[key]} for key in keys if key in page]
+    return jsonify({'object': designation, 'total': total, 'count': len(results), 'results': results})
+
+@api.route('/now/<count>', methods = ['GET'])
 def get_timeliest_neos(count: int) -> dict:
     ''' 
     This function returns the n closest NEO's in time to right now.
         Args:
             count - the number of closest NEO's the user wants to return
+        Query Parameters:
+            fields (str): comma separated fields to return, all by default
+            offset (int): number of the closest NEO's to skip
         Returns:
             results (JSON) - a JSON dictionary contanining the n closest NEO's in time
     '''
     if not count.isnumeric():
         return 'Invalid count entered\n'
+    try:
+        fields, offset, _ = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
 
     logging.debug(f"Requested {count} closest NEOs in time to now.")
 
@@ -349,48 +538,16 @@ def get_timeliest_neos(count: int) -> dict:
     # get current time
     current_time = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
     logging.info(f"Current UTC time: {current_time}")
-    # intialize empty dict to hold full data
-    dat = {}
-    # retrive all data from redis
-    for key in rd.keys('*'):
-        key = key.decode('utf-8')
-        try:
-            dat[key] = json.loads(rd.get(key).decode('utf-8'))
-        except Exception as e:
-            logging.error(f"Error decoding Redis data for key {key}: {e}")
-
-    # initialize dict to hold cleaned keys (without the uncertainty part)
-    cleaned_dict = {}
-    logging.debug("Cleaning and parsing timestamps...")
-
-    # loop thru keys and clean them, saving them to new dict where values are its original values
-    for i in dat.keys():
-        clean_time = i.split("\\")[0].split('±')[0].rstrip()
-        cleaned_dict[clean_time] = dat.get(i)
-
-    # initialize list to hold all future timestamps
-    future_keys_clean = []
-
-    for i in cleaned_dict.keys():
-        dt = datetime.strptime(i, "%Y-%b-%d %H:%M")
-        # if date of timestamp is greater than current time, add it to list
-        if current_time <= dt:
-            future_keys_clean.append(i)
-
-    # sort future keys based on timestamp
-    sorted_keys = sorted(future_keys_clean, key=lambda x: datetime.strptime(x, "%Y-%b-%d %H:%M"))
-
-    # initalize final results dict
-    results = {}
-    # find first n keys and return that
-    for j in sorted_keys[:num_neo]:
-        results[j] = cleaned_dict.get(j)
-    
+    # the keys are the approach times, so records are only fetched for the selected NEOs
+    reader = read_catalog()
+    pairs = queries.timeliest_keys(load_keys(reader), offset + num_neo, current_time)[offset:]
+    page = load_records(reader, fields=fields, keys=[key for _, key in pairs])
+    results = {clean_time: page.get(key) for clean_time, key in pairs}
     logging.info(f"Retrieved {len(results)} closest NEOs.")
 
     return results
 
-@app.route('/jobs', methods=['POST'])
+@api.route('/jobs', methods=['POST'])
 def create_job() -> Response:
     """
     This function is a API route that creates a new job
@@ -412,6 +569,7 @@ def create_job() -> Response:
     start_date = params.get("start_date")
     end_date = params.get("end_date")
     kind = params.get('kind')
+    priority = params.get('priority')
 
     re_pattern = r'^\d{4}-(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)-\d{2}$'
 
@@ -429,8 +587,21 @@ def create_job() -> Response:
     elif int(start_date.split('-')[2]) > int(end_date.split('-')[2]):
            return "Start date must be before end date\n"
 
+    elif priority is not None and priority not in PRIORITIES:
+        return f"Priority must be one of {', '.join(PRIORITIES)}\n"
+
+    # the same plot on the same data, e.g. from the warm-up after a load, is not drawn again
+    job = find_job(mdb, start_date, end_date, kind)
+    if job is not None:
+        # a job still waiting in a lower class than the request's is moved up to it
+        job = promote_job(job, priority or DEFAULT_PRIORITY[kind])
+        metrics.registry.inc('neo_jobs_reused_total', kind=kind)
+        logging.debug(f"Returning job {job['id']} queued with the same parameters")
+        return jsonify({**job, 'reused': True})
+
     # Check if ID's are valid
-    keys = rd.keys()
+    reader = read_catalog()
+    keys = reader.keys()
     ID = []
     logging.info("Filtering out Dates... ")
     for key in keys:
@@ -441,12 +612,14 @@ def create_job() -> Response:
         return jsonify("Error: no Data in Redis")
     
     # Add a job
-    job = add_job(start_date, end_date, kind)
+    version = get_data_version(mdb)
+    job = add_job(start_date, end_date, kind, priority=priority)
+    remember_job(mdb, job, version)
 
     logging.debug(f"Job created and queued successfully.")
     return jsonify(job)
 
-@app.route('/jobs', methods=['GET'])
+@api.route('/jobs', methods=['GET'])
 def list_jobs() -> Response:
     """
     This function is a API route that lists all the job IDs
@@ -472,7 +645,7 @@ def list_jobs() -> Response:
     logging.debug("All job ID's found successfully")
     return jsonify(job_ids)
 
-@app.route('/jobs/<jobid>', methods=['GET'])
+@api.route('/jobs/<jobid>', methods=['GET'])
 def get_job(jobid: str) -> Response:
     """
     This function is a API route that retrieves job details by ID
@@ -493,35 +666,99 @@ def get_job(jobid: str) -> Response:
     
     return jsonify(job)
 
+@api.route('/jobs/<jobid>', methods=['DELETE'])
+def delete_job(jobid: str) -> Response:
+    """
+    This function is a API route that cancels a job. A queued job is removed from its queue and a running
+    job is stopped by the worker within about a second; both end with the status cancelled.
 
-@app.route('/results/<job_id>', methods = ['GET'])
+    Args:
+        jobid is the ID of the job to cancel as a string
+
+    Returns:
+        The job as a Flask json response: 200 once cancelled, 202 while a running job is being stopped,
+        404 if there is no such job and 409 if it has already finished
+    """
+    job, outcome = cancel_job(jobid)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if outcome == 'finished':
+        return jsonify({"error": f"Job already {job['status']}", "job": job}), 409
+    if outcome == 'signalled':
+        logging.info(f"Asked the worker to stop job {jobid}")
+        return jsonify({**job, "cancel_requested": True}), 202
+    logging.info(f"Removed job {jobid} from the queue")
+    return jsonify(job)
+
+
+@api.route('/results/<job_id>', methods = ['GET'])
 def get_results(job_id : str) -> Response:
     '''
     This function returns the output of the job given a specific ID
         Args:
             job_id (str) - a specific job ID
+        Query Parameters:
+            size (str) - rendition of the plot: thumb (a few KB preview), standard (the default),
+                         hidpi or svg (when the worker saves it, see PLOT_RENDITIONS)
         Returns:
-            output.png (image) - the plot that the job generates, saved to the working directory 
+            output.png (image) - the plot that the job generates, as stored by the worker
     '''
     
     logging.debug("Retrieving job results...")
-
-    if not rdb.get(f"{job_id}_output_plot"):
+    size = request.args.get('size', renditions.DEFAULT_RENDITION)
+    if size not in renditions.RENDITIONS:
+        return jsonify({'error': f"Unknown size: {size}", 'sizes': list(renditions.RENDITIONS)}), 400
+
+    # the default rendition is stored for every plot, so it tells whether the job has a result
+    pipe = rdb.pipeline(transaction=False)
+    pipe.exists(renditions.rendition_key(job_id, renditions.DEFAULT_RENDITION))
+    pipe.get(renditions.rendition_key(job_id, size))
+    found, image = pipe.execute()
+    if not found:
         return 'Job ID not found\n'
     
     if get_job_by_id(job_id)['status'] == 'complete': # check for completion
-        try:
-            with open("output.png", 'wb') as f: # open new file to store image bytes and write to it
-                f.write(rdb.get(f"{job_id}_output_plot"))
-        except:
-            logging.error(f'Could not open new file to write bytes to')
-            return "error"
-        return send_file("output.png", mimetype='image/png', as_attachment=True) # send bytes for putput png to output stream
+        if image is None:
+            return jsonify({'error': f"No {size} rendition was saved for job {job_id}"}), 404
+        # the stored bytes are sent as they are; nothing is rendered again
+        name = 'output' if size == renditions.DEFAULT_RENDITION else f'output_{size}'
+        return send_file(io.BytesIO(image), mimetype=renditions.mimetype(size), as_attachment=True,
+                         download_name=f'{name}.{renditions.extension(size)}')
     else:
         return "Job still in progress"
 
 
-@app.route('/help', methods=['GET'])
+@api.route('/healthz', methods=['GET'])
+def liveness() -> Response:
+    """
+    Liveness probe: the process is up and serving requests. Does not touch Redis.
+    """
+    return jsonify({'status': 'ok'})
+
+@api.route('/readyz', methods=['GET'])
+def readiness() -> Response:
+    """
+    Readiness probe: the process can reach Redis (every catalog node and the instance of the jobs)
+    and is ready for traffic.
+    """
+    try:
+        rd.ping()
+        jdb.ping()
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"Redis not reachable: {e}")
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ready'})
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics() -> Response:
+    """
+    Prometheus metrics: latency per route, Redis round trips and time per request, JSON encode
+    and decode time per request and worker phase timings, summed over every API and worker process,
+    and the depth of every job queue.
+    """
+    return Response(metrics.render(metrics.collect(mdb), queue_depths()), mimetype='text/plain; version=0.0.4')
+
+@api.route('/help', methods=['GET'])
 def print_routes():
     """
     This function provides a general understanding
@@ -530,9 +767,16 @@ def print_routes():
 
     all_routes = {}
 
+    all_routes["fields / offset / limit"] = [
+        "Optional parameters of the /data, /data/date, /data/\u003Cyear\u003E and query routes.",
+        "fields: comma separated fields to return, e.g. fields=date,distance,h (aliases: " + ", ".join(FIELD_ALIASES) + ").",
+        "offset: number of results to skip. limit: maximum number of results to return.",
+        "To curl: '/data?fields=date,distance&offset=100&limit=50'"
+    ]
+
     all_routes["/data"] = [
         "GET request: returns data in the Redis database.",
-        "POST request: fills data into Redis database.",
+        "POST request: queues a job that fills data into Redis database in chunks, resuming an interrupted load unless ?resume=false.",
         "DELETE request: flushes the database holding NEO data"
         "To curl GET: /data",
         "To curl POST: -X POST /data"
@@ -574,6 +818,46 @@ def print_routes():
         "To curl: /data/\u003Ccount\u003E"
     ]
 
+    all_routes["/data/query"] = [
+        "GET request: filters, sorts and aggregates the NEOs in one pass.",
+        "Parameters: where (clauses joined by commas, e.g. velocity>10,h<=22,date>=2025-Jan-01), sort (e.g. -velocity), group (year or month), agg (e.g. count,mean:velocity,max:h), fields, offset, limit.",
+        "To curl: '/data/query?where=velocity>10,h<=22&sort=-velocity&limit=10' or '/data/query?where=year>=2030&group=month&agg=count,mean:distance'"
+    ]
+
+    all_routes["/data/similar"] = [
+        "GET request: nearest NEOs in standardized distance, velocity and H, from a KD-tree.",
+        "Parameters: key (a close-approach date) or distance, velocity and h; k (default 10) or radius; weights (e.g. velocity:2,h:0.5); fields, offset, limit.",
+        "To curl: '/data/similar?distance=0.01&velocity=12&h=22&k=5&weights=h:2'"
+    ]
+
+    all_routes["/stats"] = [
+        "GET request: count and n/mean/std/min/max of every numeric column, from rollups kept at ingest.",
+        "Parameters: start and end (optional), a year (2025) or a month (2025-Jan).",
+        "To curl: '/stats?start=2025&end=2030-Jun'"
+    ]
+
+    all_routes["/stats/counts"] = [
+        "GET request: NEO counts per month, or per year with group=year.",
+        "To curl: '/stats/counts?group=year&start=2025&end=2035'"
+    ]
+
+    all_routes["/stats/\u003Ccolumn\u003E"] = [
+        "GET request: n/mean/std/min/max and a fixed-bin histogram of one column (" + ", ".join(ROLLUP_COLUMNS.values()) + ").",
+        "To curl: '/stats/velocity?start=2025-Jan&end=2025-Dec'"
+    ]
+
+    all_routes["/objects"] = [
+        "GET request: designations starting with a prefix and their number of close approaches, from an index kept at ingest.",
+        "Parameters: prefix (optional), offset, limit.",
+        "To curl: '/objects?prefix=2020%20A&limit=20'"
+    ]
+
+    all_routes["/objects/\u003Cdesignation\u003E"] = [
+        "GET request: every close approach of one object in time order, with or without the parentheses of its designation.",
+        "Parameters: fields, offset, limit.",
+        "To curl: '/objects/2020%20AB?fields=date,distance'"
+    ]
+
     all_routes['/now/\u003Ccount\u003E'] = [
         "GET request: returns the x closest NEO's in time.",
         "Parameter: integer.",
@@ -583,27 +867,65 @@ def print_routes():
 
     all_routes["/jobs"] = [
         "GET request: returns all jobs on the queue with their status.",
-        "POST request: creates a new job to add to the queue.",
+        "POST request: creates a new job to add to the queue. An optional priority (high, normal or low) overrides the default of the kind.",
+        "A job with the same dates and kind on the current data, e.g. one precomputed after a load, is returned instead of a new one.",
         "To curl GET: /jobs",
         "To curl POST: -X POST /jobs"
     ]
 
     all_routes["/jobs/\u003Cjobid\u003E"] = [
-        "GET request: returns status of a specific job based on job ID.",
-        "To curl: /jobs/\u003Cjobid\u003E"
+        "GET request: returns status of a specific job based on job ID. Ingest jobs also report rows_loaded, throughput and errors.",
+        "DELETE request: cancels a queued or running job.",
+        "To curl: /jobs/\u003Cjobid\u003E",
+        "To curl DELETE: -X DELETE /jobs/\u003Cjobid\u003E"
     ]
 
     all_routes["/results/\u003Cjob_id\u003E"] = [
         "GET request: returns the output plot of a given job by saving it to the local directory.",
-        "To curl: /results/\u003Cjob_id\u003E"
+        "Query parameter size: thumb, standard (default), hidpi or svg rendition of the plot.",
+        "To curl: /results/\u003Cjob_id\u003E",
+        "To curl a preview: /results/\u003Cjob_id\u003E?size=thumb"
+    ]
+
+    all_routes["/healthz"] = [
+        "GET request: liveness probe, returns ok while the process is serving."
+    ]
+
+    all_routes["/readyz"] = [
+        "GET request: readiness probe, returns 503 until Redis is reachable."
+    ]
+
+    all_routes["/metrics"] = [
+        "GET request: Prometheus metrics of every API and worker process (latency per route, Redis round trips, JSON time, worker phases).",
+        "Any route can be profiled with ?profile=1 when the API runs with PROFILE_REQUESTS=1.",
+        "To curl: /metrics"
     ]
 
     return jsonify(all_routes)
-        
 
-    
 
+def create_app() -> Flask:
+    '''
+    Builds the Flask app with the JSON provider, the request hooks and the routes.
+    The Redis clients are lazy handles, so no connection is opened until a request needs one.
+
+    Returns:
+        app (Flask): the API app
+    '''
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    # hooks: metrics first so its timing includes compression, the profiler last so it only covers the view
+    metrics.instrument(app, mdb)
+    app.after_request(compress_response)
+    profile_requests(app)
+    app.register_blueprint(api)
+    return app
+
+
+# the app served by gunicorn (NEO_api:app)
+app = create_app()
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    # development server only, production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.environ.get("FLASK_DEBUG", "0") == "1", host='0.0.0.0')
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+from quart import Quart, Response, jsonify, request
+from quart.json.provider import DefaultJSONProvider
+import queries
+from catalog import aload_keys, aload_records, aload_json, chronological, paginate
+from columns import aquery_table
+import similar
+from similar import aload_index
+from connections import get_async_redis, get_async_catalog, META_DB
+
+# Async variant of the read routes in NEO_api.py. It serves /data* and /now with the same
+# query functions, but fetches records with redis.asyncio so one worker can keep many requests
+# waiting on Redis at once. Run with: hypercorn async_api:app --bind 0.0.0.0:5001
+
+# Set logging
+log_level_str = os.environ.get("LOG_LEVEL", "INFO").upper()
+log_level = getattr(logging, log_level_str, logging.ERROR)
+
+format_str=f'[%(asctime)s {socket.gethostname()}] %(filename)s:%(funcName)s:%(lineno)s - %(levelname)s: %(message)s'
+logging.basicConfig(level=log_level, format=format_str)
+
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Quart JSON provider that also encodes the NEORecords read from the catalog."""
+
+    @staticmethod
+    def default(obj):
+        if hasattr(obj, 'to_json'):
+            return obj.to_json()
+        return DefaultJSONProvider.default(obj)
+
+
+# Initialize app
+app = Quart(__name__)
+app.json = RecordJSONProvider(app)
+
+
+def _rd():
+    """Async client for the NEO database, created on first use."""
+    return get_async_catalog()
+
+
+@app.route('/data', methods=['GET'])
+async def return_neo_data():
+    """
+    Returns the data stored in Redis as a JSON object, with the fields, offset and limit
+    query parameters of the Flask route.
+    """
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+    page = paginate(chronological(await aload_keys(_rd())), offset, limit)
+    return Response(await aload_json(_rd(), fields=fields, keys=page), mimetype='application/json')
+
+
+@app.route('/data/date', methods=['GET'])
+async def get_date():
+    """
+    Returns the dates and time values which are the keys in Redis, in time order.
+    """
+    try:
+        _, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+    return jsonify(paginate(chronological(await aload_keys(_rd())), offset, limit))
+
+
+@app.route('/data/<year>', methods=['GET'])
+async def get_data_by_year(year: str):
+    """
+    Returns the data for NEO's that will approach Earth in a given year.
+    """
+    if not year.isnumeric():
+        return 'Invalid year entered\n'
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+    page = paginate(chronological(await aload_keys(_rd(), f"{year}-*")), offset, limit)
+    return Response(await aload_json(_rd(), fields=fields, keys=page), mimetype='application/json')
+
+
+@app.route('/data/distance_query', methods=['GET'])
+async def get_distances():
+    """
+    Returns close-approach distances between the optional min and max query parameters (AU).
+    """
+    try:
+        min_dist = request.args.get('min', type=float)
+        max_dist = request.args.get('max', type=float)
+        _, offset, limit = queries.parse_projection(request.args)
+        table = await aquery_table(_rd(), get_async_redis(META_DB), ['CA DistanceNominal (au)', 'CA DistanceMinimum (au)'],
+                                   lambda part: queries.distance_rows(part, min_dist, max_dist)[0])
+        rows, distances = queries.distance_rows(table, min_dist, max_dist)
+        keys = paginate(table.keys[rows], offset, limit).tolist()
+        objects = await aload_records(_rd(), fields=['Object'], keys=keys)
+        page = queries.distance_results(keys, paginate(distances, offset, limit), objects)
+        return jsonify({'count': len(page), 'total': len(rows), 'results': page})
+    except Exception as e:
+        logging.error(f"Error in get_distances: {str(e)}")
+        return jsonify("Error in getting distance")
+
+
+@app.route('/data/velocity_query', methods=['GET'])
+async def query_velocity():
+    """
+    Returns the NEOs with relative velocity between the min and max query parameters (km/s).
+    """
+    if not (request.args.get('min', '').isnumeric() and request.args.get('max', '').isnumeric()):
+        logging.warning('Invalid input: non-numeric min or max velocity.')
+        return 'Invalid date range entered\n'
+
+    min_velocity = float(request.args.get('min'))
+    max_velocity = float(request.args.get('max'))
+    if min_velocity > max_velocity:
+        logging.warning('Invalid input: min velocity greater than max velocity.')
+        return 'min velocity must be less than max velocity\n'
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    table = await aquery_table(_rd(), get_async_redis(META_DB), ['V relative(km/s)'],
+                               lambda part: queries.velocity_rows(part, min_velocity, max_velocity))
+    keys = paginate(table.keys[queries.velocity_rows(table, min_velocity, max_velocity)], offset, limit).tolist()
+    return Response(await aload_json(_rd(), fields=fields, keys=keys), mimetype='application/json')
+
+
+@app.route('/data/max_diam/<max_diameter>', methods=['GET'])
+async def query_diameter(max_diameter: str):
+    """
+    Returns the NEOs with a maximum diameter less than the input.
+    """
+    if not max_diameter.isnumeric():
+        return "Invalid diameter entered\n"
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    table = await aquery_table(_rd(), get_async_redis(META_DB), ['Maximum Diameter'],
+                               lambda part: queries.diameter_rows(part, float(max_diameter)))
+    keys = paginate(table.keys[queries.diameter_rows(table, float(max_diameter))], offset, limit).tolist()
+    return Response(await aload_json(_rd(), fields=fields, keys=keys), mimetype='application/json')
+
+
+@app.route('/data/biggest_neos/<count>', methods=['GET'])
+async def find_biggest_neo(count: str):
+    """
+    Returns the count biggest NEOs based on the H scale.
+    """
+    try:
+        num_neo = int(count)
+    except ValueError:
+        logging.error("Invalid count provided, could not convert to integer.")
+        return jsonify('Error: Invalid count value. Must be an integer.')
+    try:
+        fields, offset, _ = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    table = await aquery_table(_rd(), get_async_redis(META_DB), ['H(mag)'],
+                               lambda part: queries.biggest_rows(part, offset + num_neo))
+    keys = table.keys[queries.biggest_rows(table, offset + num_neo)[offset:]].tolist()
+    page = await aload_records(_rd(), fields=fields, keys=keys)
+    return jsonify([{key: page[key]} for key in keys if key in page])
+
+
+@app.route('/data/query', methods=['GET'])
+async def query_data():
+    """
+    Filters, sorts and aggregates the catalog in one pass, see /data/query in NEO_api.py.
+    """
+    try:
+        plan = queries.parse_query(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    table = await aquery_table(_rd(), get_async_redis(META_DB), queries.plan_fields(plan),
+                               lambda part: queries.select(part, plan))
+    rows = queries.select(table, plan)
+    if plan['group']:
+        groups = queries.aggregate(table, rows, plan)
+        page = paginate(groups, plan['offset'], plan['limit'])
+        return jsonify({'count': len(page), 'total': len(groups), 'matched': len(rows), 'results': page})
+
+    keys = paginate(table.keys[rows], plan['offset'], plan['limit']).tolist()
+    page = await aload_records(_rd(), fields=plan['fields'], keys=keys)
+    return jsonify({'count': len(page), 'total': len(rows), 'results': page})
+
+
+@app.route('/data/similar', methods=['GET'])
+async def find_similar():
+    """
+    Finds the nearest NEOs with the KD-tree, see /data/similar in NEO_api.py.
+    """
+    try:
+        fields, offset, limit = queries.parse_projection(request.args)
+        index = await aload_index(_rd(), get_async_redis(META_DB))
+        neighbors = similar.search(index, request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    neighbors = paginate(neighbors, offset, limit)
+    page = await aload_records(_rd(), fields=fields, keys=[key for key, _ in neighbors])
+    results = [{'date': key, 'score': score, 'neo': page.get(key)} for key, score in neighbors]
+    return jsonify({'count': len(results), 'results': results})
+
+
+@app.route('/now/<count>', methods=['GET'])
+async def get_timeliest_neos(count: str):
+    """
+    Returns the count closest NEO's in time to right now.
+    """
+    if not count.isnumeric():
+        return 'Invalid count entered\n'
+    try:
+        fields, offset, _ = queries.parse_projection(request.args)
+    except ValueError as e:
+        return f'{e}\n'
+
+    current_time = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+    pairs = queries.timeliest_keys(await aload_keys(_rd()), offset + int(count), current_time)[offset:]
+    page = await aload_records(_rd(), fields=fields, keys=[key for _, key in pairs])
+    return jsonify({clean_time: page.get(key) for clean_time, key in pairs})
+
+
+@app.route('/healthz', methods=['GET'])
+async def liveness():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return jsonify({'status': 'ok'})
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5001)
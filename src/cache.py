@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import make_response, request
+from catalog import get_data_version
+from serialization import negotiate_encoding, compress, COMPRESS_MIN_BYTES
+from connections import lazy_redis, META_DB
+
+# total size of the cached response bodies kept by each API process
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# seconds a client may reuse a response before revalidating it with its ETag
+CACHE_MAX_AGE = int(os.environ.get("CACHE_MAX_AGE", "0"))
+
+mdb = lazy_redis(META_DB)
+
+
+class ResponseCache:
+    """LRU cache of serialized response bodies, and optionally their compressed variants,
+    capped by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''
+        Returns the entry stored under key and marks it as most recently used.
+
+        Args:
+            key (tuple): cache key
+        Returns:
+            entry (tuple): body bytes and mimetype, or None
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, body: bytes, mimetype: str) -> None:
+        '''
+        Stores a response body, evicting the least recently used entries to stay under the cap.
+
+        Args:
+            key (tuple): cache key
+            body (bytes): serialized response body
+            mimetype (str): mimetype of the body
+        '''
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (body, mimetype, {})
+            self.size += len(body)
+            self._evict()
+
+    def get_compressed(self, key, encoding: str) -> bytes:
+        '''
+        Returns the body stored under key compressed with encoding, or None if it was not stored.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[2].get(encoding) if entry is not None else None
+
+    def put_compressed(self, key, encoding: str, data: bytes) -> None:
+        '''
+        Stores a compressed variant of the body under key so it is not compressed again.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or encoding in entry[2]:
+                return
+            entry[2][encoding] = data
+            self.size += len(data)
+            self._evict()
+
+    def _entry_size(self, entry) -> int:
+        return len(entry[0]) + sum(len(data) for data in entry[2].values())
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= self._entry_size(entry)
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= self._entry_size(entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+response_cache = ResponseCache(CACHE_MAX_BYTES)
+
+
+def current_version() -> int:
+    """Returns the data version the cached responses are keyed on."""
+    return get_data_version(mdb)
+
+
+def cache_key(path: str, args, version: int) -> tuple:
+    '''
+    Builds the cache key of a request: route, query arguments in a fixed order and data version.
+
+    Args:
+        path (str): request path
+        args (MultiDict): query arguments
+        version (int): data version
+    Returns:
+        key (tuple): cache key
+    '''
+    return (path, tuple(sorted(args.items(multi=True))), version)
+
+
+def make_etag(key: tuple) -> str:
+    """Returns the ETag of a cache key, so it changes whenever the data version does."""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def _cached_response(key, body: bytes, mimetype: str, precompress: bool):
+    response = make_response(body, 200)
+    response.mimetype = mimetype
+    if not precompress or len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    # serve the compressed variant kept in the cache instead of compressing on every hit
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    data = response_cache.get_compressed(key, encoding)
+    if data is None:
+        data = compress(body, encoding)
+        response_cache.put_compressed(key, encoding, data)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def cached(view=None, *, precompress: bool = False):
+    '''
+    Decorator for GET routes whose response only depends on the route, the query arguments and
+    the data. A hit costs one read of the data version: a matching If-None-Match gets a 304 and
+    otherwise the stored body is sent again. Loading or deleting data bumps the version, which
+    makes every older entry unreachable until it is evicted.
+
+    The ETag is weak because the same body may be sent with different content encodings.
+    With precompress=True the compressed variants of the body are cached as well, which is
+    worth it for large responses such as the full catalog.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = cache_key(request.path, request.args, current_version())
+            etag = make_etag(key)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                entry = response_cache.get(key)
+                if entry is not None:
+                    response = _cached_response(key, *entry, precompress)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        logging.debug(f"Not caching {request.path}: status {response.status_code}")
+                        return response
+                    body = response.get_data()
+                    response_cache.put(key, body, response.mimetype)
+                    if precompress:
+                        response = _cached_response(key, body, response.mimetype, precompress)
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, must-revalidate'
+            return response
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
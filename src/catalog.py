@@ -0,0 +1,398 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Mapping
+import metrics
+from serialization import dumps, loads
+
+# Every NEO is stored as a Redis hash keyed by its close-approach date, with one JSON encoded
+# value per field. Reads ask for the fields they need (HMGET), so fields a route does not
+# return are never fetched or decoded.
+
+# number of records fetched per pipeline
+BATCH_SIZE = int(os.environ.get("CATALOG_BATCH_SIZE", "1000"))
+
+# key in the metadata database counting changes to the NEO data
+DATA_VERSION_KEY = "data_version"
+
+FIELDS = ['Object', 'Close-Approach (CA) Date', 'CA DistanceNominal (au)', 'CA DistanceMinimum (au)',
+          'V relative(km/s)', 'V infinity(km/s)', 'H(mag)', 'Diameter', 'Rarity',
+          'Minimum Diameter', 'Maximum Diameter', 'Epoch', 'Uncertainty (min)']
+
+# short names accepted by the fields= query parameter
+FIELD_ALIASES = {'object': 'Object',
+                 'date': 'Close-Approach (CA) Date',
+                 'distance': 'CA DistanceNominal (au)',
+                 'distance_min': 'CA DistanceMinimum (au)',
+                 'velocity': 'V relative(km/s)',
+                 'v_infinity': 'V infinity(km/s)',
+                 'h': 'H(mag)',
+                 'diameter': 'Diameter',
+                 'rarity': 'Rarity',
+                 'min_diameter': 'Minimum Diameter',
+                 'max_diameter': 'Maximum Diameter',
+                 'epoch': 'Epoch',
+                 'uncertainty': 'Uncertainty (min)'}
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# attribute of NEORecord holding each stored field: the field's short alias
+ATTRIBUTES = {field: alias for alias, field in FIELD_ALIASES.items()}
+_MISSING = object()
+
+
+def layout(fields: list) -> tuple:
+    '''
+    Returns the (field, attribute) pairs of NEORecords holding the given fields, in their order.
+    '''
+    return tuple((field, ATTRIBUTES[field]) for field in fields)
+
+
+# JSON the json module writes for non-finite floats, which the API sends as null like orjson does
+_NON_FINITE = {b'NaN': b'null', b'Infinity': b'null', b'-Infinity': b'null'}
+
+
+class NEORecord(Mapping):
+    '''
+    One NEO read from the catalog. It reads like the dict of stored field names it replaces
+    (record['H(mag)'], record.get('Object')), but holds one slot per field and a layout of the
+    fields read, shared by every record of a read, instead of a dict of its own. Fields that
+    were not read are absent, and the fields come back in the order they were asked for.
+
+    Args:
+        fields (list): stored field names
+        values (list): their values, in the same order
+    '''
+    __slots__ = ('_layout',) + tuple(ATTRIBUTES.values())
+
+    def __init__(self, fields: list = (), values: list = ()):
+        self._layout = layout(fields)
+        for (_, attribute), value in zip(self._layout, values):
+            setattr(self, attribute, value)
+
+    def __getitem__(self, field: str):
+        try:
+            return getattr(self, ATTRIBUTES[field])
+        except (KeyError, AttributeError):
+            raise KeyError(field) from None
+
+    def get(self, field: str, default=None):
+        attribute = ATTRIBUTES.get(field)
+        return default if attribute is None else getattr(self, attribute, default)
+
+    def __iter__(self):
+        for field, attribute in self._layout:
+            if getattr(self, attribute, _MISSING) is not _MISSING:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"NEORecord({self.to_json()!r})"
+
+    def to_json(self) -> dict:
+        '''
+        Returns the record in its public JSON shape, a dict keyed by the stored field names.
+        '''
+        json = {}
+        for field, attribute in self._layout:
+            value = getattr(self, attribute, _MISSING)
+            if value is not _MISSING:
+                json[field] = value
+        return json
+
+    def to_stored(self) -> dict:
+        '''
+        Returns the field mapping stored in the record's Redis hash.
+        '''
+        return encode_record(self)
+
+
+def resolve_fields(names) -> list:
+    '''
+    Turns field names or their short aliases into stored field names.
+
+    Args:
+        names (list): names from the fields= parameter, or None for every field
+    Returns:
+        fields (list): stored field names, or None for every field
+    Raises:
+        ValueError: if a name is not a known field
+    '''
+    if not names:
+        return None
+    fields = []
+    for name in names:
+        field = FIELD_ALIASES.get(name.strip().lower(), name.strip())
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field: {name}")
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+
+def chronological(keys) -> list:
+    '''
+    Sorts close-approach date keys ("2025-Jan-01 00:00 ± ...") in time order.
+    '''
+    def sort_key(key):
+        try:
+            return key[:4], MONTHS.index(key[5:8]), key[9:]
+        except ValueError:
+            return key[:4], 12, key[5:]
+    return sorted(keys, key=sort_key)
+
+
+def paginate(keys: list, offset: int = 0, limit: int = None) -> list:
+    '''
+    Returns the slice of keys selected by offset and limit.
+    '''
+    if limit is None:
+        return keys[offset:]
+    return keys[offset:offset + limit]
+
+
+def _batches(keys: list) -> list:
+    return [keys[i:i + BATCH_SIZE] for i in range(0, len(keys), BATCH_SIZE)]
+
+
+def encode_record(record: dict) -> dict:
+    '''
+    Encodes a record as the field mapping stored in its Redis hash.
+    '''
+    return {field: dumps(record.get(field)) for field in FIELDS}
+
+
+def save_records(pipe, records: list) -> None:
+    '''
+    Queues the writes of records on a Redis pipeline, keyed by close-approach date.
+
+    Args:
+        pipe: Redis pipeline for the NEO database
+        records (list): record dictionaries
+    '''
+    for record in records:
+        pipe.hset(record['Close-Approach (CA) Date'], mapping=encode_record(record))
+
+
+def _queue_reads(pipe, keys: list, fields: list) -> None:
+    for key in keys:
+        if fields is None:
+            pipe.hgetall(key)
+        else:
+            pipe.hmget(key, fields)
+
+
+def _stored_values(raw, fields: tuple) -> list:
+    # an HGETALL reply as the values of `fields`, None where the hash has no such field
+    if isinstance(raw, dict):
+        return [raw.get(field.encode('utf-8')) for field in fields]
+    return raw
+
+
+def _decode(keys: list, values: list, fields: list) -> dict:
+    '''
+    Decodes fetched hashes into NEORecords, skipping the ones that are missing or unreadable.
+
+    Args:
+        keys (list): decoded keys
+        values (list): HGETALL or HMGET replies in the same order
+        fields (list): the fields that were asked for, None for all
+    Returns:
+        records (dict): records keyed by close-approach date
+    '''
+    start = time.perf_counter()
+    # every field in the order of the csv, whatever order HGETALL returns them in
+    fields = tuple(FIELDS if fields is None else fields)
+    pairs = layout(fields)
+    records = {}
+    for key, raw in zip(keys, values):
+        raw = _stored_values(raw, fields)
+        if not raw or all(value is None for value in raw):
+            continue
+        record = object.__new__(NEORecord)
+        record._layout = pairs
+        try:
+            for (_, attribute), value in zip(pairs, raw):
+                if value is not None:
+                    setattr(record, attribute, loads(value))
+        except ValueError:
+            logging.error(f'Error retrieving data at {key}')
+            continue
+        records[key] = record
+    stats = metrics.current()
+    if stats is not None:
+        stats.decode_seconds += time.perf_counter() - start
+    return records
+
+
+def get_data_version(mdb) -> int:
+    '''
+    Returns the data version, which changes every time the NEO data is loaded or deleted.
+
+    Args:
+        mdb: Redis client for the metadata database
+    Returns:
+        version (int): the current data version
+    '''
+    return int(mdb.get(DATA_VERSION_KEY) or 0)
+
+
+def bump_data_version(mdb) -> int:
+    '''
+    Marks the NEO data as changed so anything derived from an older version is discarded.
+
+    Args:
+        mdb: Redis client for the metadata database
+    Returns:
+        version (int): the new data version
+    '''
+    return mdb.incr(DATA_VERSION_KEY)
+
+
+def load_keys(rd, pattern: str = '*') -> list:
+    '''
+    Returns the keys of the NEO database matching a pattern.
+
+    Args:
+        rd: Redis client for the NEO database
+        pattern (str): Redis glob pattern, e.g. "2025-*" for one year
+    Returns:
+        keys (list): decoded keys
+    '''
+    return [key.decode('utf-8') for key in rd.keys(pattern)]
+
+
+def load_records(rd, pattern: str = '*', fields: list = None, keys: list = None) -> dict:
+    '''
+    Returns records of the NEO database, fetched with one pipeline per batch of keys.
+
+    Args:
+        rd: Redis client for the NEO database
+        pattern (str): Redis glob pattern, used when keys is not given
+        fields (list): fields to fetch, None for all of them
+        keys (list): keys to fetch, in the order the records should be returned
+    Returns:
+        records (dict): records keyed by close-approach date
+    '''
+    if keys is None:
+        keys = load_keys(rd, pattern)
+    records = {}
+    for batch, replies in iter_replies(rd, keys, fields):
+        records.update(_decode(batch, replies, fields))
+    return records
+
+
+def iter_replies(rd, keys: list, fields: list = None):
+    '''
+    Fetches the stored values of records with one pipeline per batch of keys, for callers that
+    decode them their own way.
+
+    Args:
+        rd: Redis client for the NEO database
+        keys (list): keys to fetch
+        fields (list): fields to fetch, None for all of them
+    Yields:
+        batch (tuple): the keys of a batch and their HMGET replies, or HGETALL replies for all fields
+    '''
+    for batch in _batches(keys):
+        pipe = rd.pipeline(transaction=False)
+        _queue_reads(pipe, batch, fields)
+        yield batch, pipe.execute()
+
+
+def _encode_stored(keys: list, values: list, fields: tuple) -> list:
+    # the stored values are JSON already; NaN, which the json module may have stored, is sent as null
+    names = [dumps(field) + b':' for field in fields]
+    members = []
+    for key, raw in zip(keys, values):
+        raw = _stored_values(raw, fields)
+        parts = [name + _NON_FINITE.get(value, value) for name, value in zip(names, raw) if value is not None]
+        if parts:
+            members.append(dumps(key) + b':{' + b','.join(parts) + b'}')
+    return members
+
+
+def load_json(rd, pattern: str = '*', fields: list = None, keys: list = None) -> bytes:
+    '''
+    Returns records of the NEO database as a JSON object keyed by close-approach date, the body
+    dumps(load_records(...)) would give. The body is put together from the stored JSON values,
+    so no record is decoded or encoded again.
+
+    Args:
+        rd: Redis client for the NEO database
+        pattern (str): Redis glob pattern, used when keys is not given
+        fields (list): fields to fetch, None for all of them
+        keys (list): keys to fetch, in the order the records should be returned
+    Returns:
+        body (bytes): UTF-8 encoded JSON
+    '''
+    if keys is None:
+        keys = load_keys(rd, pattern)
+    fields = tuple(FIELDS if fields is None else fields)
+    members = []
+    for batch, replies in iter_replies(rd, keys, None if fields == tuple(FIELDS) else fields):
+        members.extend(_encode_stored(batch, replies, fields))
+    return b'{' + b','.join(members) + b'}'
+
+
+async def aload_keys(ard, pattern: str = '*') -> list:
+    '''
+    Async version of load_keys for a redis.asyncio client.
+    '''
+    return [key.decode('utf-8') for key in await ard.keys(pattern)]
+
+
+async def aload_records(ard, pattern: str = '*', fields: list = None, keys: list = None) -> dict:
+    '''
+    Async version of load_records. The pipelines of the batches are sent concurrently.
+    '''
+    if keys is None:
+        keys = await aload_keys(ard, pattern)
+    records = {}
+    for batch, replies in await aload_replies(ard, keys, fields):
+        records.update(_decode(batch, replies, fields))
+    return records
+
+
+async def aload_json(ard, pattern: str = '*', fields: list = None, keys: list = None) -> bytes:
+    '''
+    Async version of load_json.
+    '''
+    if keys is None:
+        keys = await aload_keys(ard, pattern)
+    fields = tuple(FIELDS if fields is None else fields)
+    members = []
+    for batch, replies in await aload_replies(ard, keys, None if fields == tuple(FIELDS) else fields):
+        members.extend(_encode_stored(batch, replies, fields))
+    return b'{' + b','.join(members) + b'}'
+
+
+async def aiter_replies(ard, keys: list, fields: list = None):
+    '''
+    Async version of iter_replies; one batch is fetched at a time, for callers that only keep
+    part of each batch.
+    '''
+    for batch in _batches(keys):
+        pipe = ard.pipeline(transaction=False)
+        _queue_reads(pipe, batch, fields)
+        yield batch, await pipe.execute()
+
+
+async def aload_replies(ard, keys: list, fields: list = None) -> list:
+    '''
+    Async version of iter_replies; the pipelines of the batches are sent concurrently.
+
+    Returns:
+        batches (list): the keys of every batch with their replies
+    '''
+    batches = _batches(keys)
+
+    async def fetch(batch):
+        pipe = ard.pipeline(transaction=False)
+        _queue_reads(pipe, batch, fields)
+        return await pipe.execute()
+
+    return list(zip(batches, await asyncio.gather(*(fetch(batch) for batch in batches))))
@@ -0,0 +1,303 @@
+import logging
+import os
+import sys
+import threading
+import numpy as np
+from catalog import (DATA_VERSION_KEY, ATTRIBUTES, chronological, iter_replies, aload_replies, aiter_replies, load_keys,
+                     aload_keys, get_data_version)
+from serialization import loads
+from utils import parse_timestamp_fields, parse_timestamps
+
+# Columnar view of the numeric part of the catalog. The numeric fields of every NEO are read
+# once per data version into numpy arrays, so filters, sorts and aggregates over the whole
+# catalog run as array operations instead of a Python loop over records.
+
+NUMERIC_FIELDS = ['CA DistanceNominal (au)', 'CA DistanceMinimum (au)', 'V relative(km/s)',
+                  'V infinity(km/s)', 'H(mag)', 'Minimum Diameter', 'Maximum Diameter', 'Rarity',
+                  'Uncertainty (min)']
+# numeric fields the table parses from the keys instead of reading them from Redis
+KEY_FIELDS = ['Uncertainty (min)']
+STORED_NUMERIC_FIELDS = [field for field in NUMERIC_FIELDS if field not in KEY_FIELDS]
+# the numeric fields of one NEO as a row of a structured array, each named by its short alias.
+# Bulk reads decode the stored values straight into these rows, without a record per NEO
+ROW_DTYPE = np.dtype([(ATTRIBUTES[field], np.float64) for field in NUMERIC_FIELDS])
+
+# memory cap of the table kept by a process; over it, the query routes read only the rows they
+# keep with scan_table
+TABLE_MAX_BYTES = int(os.environ.get("TABLE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# approximate size of one row of the table with its key string, to check the cap before loading
+ROW_BYTES = 200
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _stored_float(value) -> float:
+    # a stored number is JSON text float() reads as it is; null, strings and the rest are decoded first
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return _to_float(loads(value))
+
+
+def decode_rows(replies: list, fields: list) -> np.ndarray:
+    '''
+    Decodes HMGET replies of numeric fields into rows of ROW_DTYPE.
+
+    Args:
+        replies (list): HMGET replies, one per NEO
+        fields (list): the numeric fields asked for, in the order of the replies
+    Returns:
+        rows (ndarray): one row per reply; fields not asked for, missing or not numbers are NaN
+    '''
+    rows = np.full(len(replies), np.nan, dtype=ROW_DTYPE)
+    for index, field in enumerate(fields):
+        rows[ATTRIBUTES[field]] = [_stored_float(reply[index]) for reply in replies]
+    return rows
+
+
+def records_to_rows(keys: list, records: dict) -> np.ndarray:
+    '''
+    Returns the numeric fields of records (NEORecords or dicts) as rows of ROW_DTYPE, in the order of keys.
+    '''
+    rows = np.full(len(keys), np.nan, dtype=ROW_DTYPE)
+    for field in STORED_NUMERIC_FIELDS:
+        rows[ATTRIBUTES[field]] = [_to_float(records.get(key, {}).get(field)) for key in keys]
+    return rows
+
+
+def _found(batch: list, replies: list, fields: list) -> tuple:
+    # keys deleted since they were listed have no values and are left out
+    present = [index for index, reply in enumerate(replies) if any(value is not None for value in reply)]
+    return [batch[index] for index in present], decode_rows([replies[index] for index in present], fields)
+
+
+def load_rows(rd, keys: list, fields: list = STORED_NUMERIC_FIELDS) -> tuple:
+    '''
+    Reads numeric fields of NEOs from Redis into rows of ROW_DTYPE.
+
+    Args:
+        rd: Redis client for the NEO database
+        keys (list): keys of the NEOs
+        fields (list): numeric fields to read
+    Returns:
+        keys (list): keys of the NEOs found, in the given order
+        rows (ndarray): their rows
+    '''
+    found, parts = [], []
+    for batch, replies in iter_replies(rd, keys, fields):
+        batch_keys, rows = _found(batch, replies, fields)
+        found.extend(batch_keys)
+        parts.append(rows)
+    return found, np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE)
+
+
+async def aload_rows(ard, keys: list, fields: list = STORED_NUMERIC_FIELDS) -> tuple:
+    '''
+    Async version of load_rows for a redis.asyncio client.
+    '''
+    found, parts = [], []
+    for batch, replies in await aload_replies(ard, keys, fields):
+        batch_keys, rows = _found(batch, replies, fields)
+        found.extend(batch_keys)
+        parts.append(rows)
+    return found, np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE)
+
+
+class Table:
+    """Numeric columns of the catalog, one row per NEO in close-approach order."""
+
+    def __init__(self, keys: list, rows: np.ndarray, version: int = 0):
+        self.version = version
+        self.keys = np.array(keys, dtype=object)
+        # the keys are the close-approach timestamps, parsed for the whole catalog at once
+        parts = parse_timestamp_fields(keys)
+        self.year = parts['year'].astype(np.int32)
+        self.month = parts['month'].astype(np.int32)
+        self.day = parts['day'].astype(np.int32)
+        self.epoch, uncertainty = parse_timestamps(keys)
+        # a contiguous array per field, since the queries scan one field over every NEO
+        self.columns = {field: np.ascontiguousarray(rows[ATTRIBUTES[field]]) for field in STORED_NUMERIC_FIELDS}
+        self.columns['Uncertainty (min)'] = uncertainty
+
+    def __len__(self):
+        return len(self.keys)
+
+    def date_number(self) -> np.ndarray:
+        """Close-approach dates as YYYYMMDD integers, for date range filters."""
+        return self.year * 10000 + self.month * 100 + self.day
+
+    def nbytes(self) -> int:
+        """Memory used by the arrays and the key strings."""
+        arrays = [self.year, self.month, self.day, self.epoch, self.keys, *self.columns.values()]
+        return sum(array.nbytes for array in arrays) + sum(sys.getsizeof(key) for key in self.keys)
+
+
+def close_distance(columns: dict) -> np.ndarray:
+    '''
+    Returns the close-approach distance of every row of the table's columns: the nominal
+    distance, or the minimum one where the nominal distance is missing or 0.
+    '''
+    nominal = columns['CA DistanceNominal (au)']
+    return np.where(np.isnan(nominal) | (nominal == 0), columns['CA DistanceMinimum (au)'], nominal)
+
+
+def build_table(records: dict, version: int = 0) -> Table:
+    '''
+    Builds the columnar table from records holding the numeric fields.
+
+    Args:
+        records (dict): records keyed by close-approach date
+        version (int): data version the records were read at
+    Returns:
+        table (Table): the numeric columns in close-approach order
+    '''
+    keys = chronological(records)
+    return Table(keys, records_to_rows(keys, records), version)
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def load_table(rd, mdb) -> Table:
+    '''
+    Returns the columnar table of the current data version, reading it from Redis the first
+    time that version is asked for. The version is read before the records, so a load that
+    races with an ingest is replaced on the next call. A table over TABLE_MAX_BYTES is
+    returned but not kept.
+
+    Args:
+        rd: Redis client for the NEO database
+        mdb: Redis client for the metadata database
+    Returns:
+        table (Table): the numeric columns of the catalog
+    '''
+    global _table
+    version = get_data_version(mdb)
+    with _lock:
+        if _table is not None and _table.version == version:
+            return _table
+    # read without the lock, so requests served from a kept table are not held up by a load.
+    # Concurrent loads of a new version may overlap; the first one done is kept
+    table = Table(*load_rows(rd, chronological(load_keys(rd))), version)
+    logging.info(f"Built columnar table of {len(table)} NEOs for data version {version}")
+    if table.nbytes() > TABLE_MAX_BYTES:
+        logging.warning(f"Columnar table of {table.nbytes()} bytes is over TABLE_MAX_BYTES, not kept")
+        return table
+    with _lock:
+        # data versions only go up, so an older kept table is replaced and a newer one is not
+        if _table is None or _table.version < version:
+            _table = table
+    return table
+
+
+def resident_table(rd, mdb) -> Table:
+    '''
+    Returns the table kept in this process for the current data version, loading it if the
+    catalog is estimated to fit under TABLE_MAX_BYTES. Once it is loaded, a call only reads
+    the data version from Redis.
+
+    Args:
+        rd: Redis client for the NEO database
+        mdb: Redis client for the metadata database
+    Returns:
+        table (Table): the numeric columns of the catalog, or None if it is too large to keep
+    '''
+    version = get_data_version(mdb)
+    with _lock:
+        if _table is not None and _table.version == version:
+            return _table
+    if rd.dbsize() * ROW_BYTES > TABLE_MAX_BYTES:
+        return None
+    return load_table(rd, mdb)
+
+
+def _kept(batch: list, replies: list, fields: list, keep) -> tuple:
+    batch_keys, rows = _found(batch, replies, fields)
+    # keep may return the rows in any order; the table stays in close-approach order
+    kept = np.sort(keep(Table(batch_keys, rows)))
+    return [batch_keys[index] for index in kept], rows[kept]
+
+
+def scan_table(rd, fields: list, keep) -> Table:
+    '''
+    Builds a table of only the NEOs a query keeps, for a catalog too large to keep whole. The
+    fields the query reads are fetched one batch at a time, and only the rows keep selects
+    from each batch stay in memory.
+
+    Args:
+        rd: Redis client for the NEO database
+        fields (list): numeric fields the query reads
+        keep: function of a Table that returns the indices of the rows to keep. Every row the
+            query could return must be kept from its batch, e.g. the top n of each batch for a top n.
+    Returns:
+        table (Table): the kept rows in close-approach order; fields not read are NaN
+    '''
+    found, parts = [], []
+    for batch, replies in iter_replies(rd, chronological(load_keys(rd)), fields):
+        batch_keys, rows = _kept(batch, replies, fields, keep)
+        found.extend(batch_keys)
+        parts.append(rows)
+    return Table(found, np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE))
+
+
+def query_table(rd, mdb, fields: list, keep) -> Table:
+    '''
+    Returns the table a query runs over: the resident table, or when the catalog is too large
+    to keep, the rows keep selects read with scan_table. The query is then run over the
+    returned table either way.
+
+    Args:
+        rd: Redis client for the NEO database
+        mdb: Redis client for the metadata database
+        fields (list): numeric fields the query reads
+        keep: function of a Table that returns the indices of the rows to keep, see scan_table
+    Returns:
+        table (Table): numeric columns of the catalog or of the rows the query may return
+    '''
+    table = resident_table(rd, mdb)
+    if table is None:
+        table = scan_table(rd, fields, keep)
+    return table
+
+
+async def aload_table(ard, amdb) -> Table:
+    '''
+    Async version of load_table for redis.asyncio clients.
+    '''
+    global _table
+    version = int(await amdb.get(DATA_VERSION_KEY) or 0)
+    table = _table
+    if table is None or table.version != version:
+        table = Table(*await aload_rows(ard, chronological(await aload_keys(ard))), version)
+        if table.nbytes() <= TABLE_MAX_BYTES:
+            with _lock:
+                # as in load_table, a coroutine that read an older version does not replace a newer table
+                if _table is None or _table.version < version:
+                    _table = table
+    return table
+
+
+async def aquery_table(ard, amdb, fields: list, keep) -> Table:
+    '''
+    Async version of query_table for redis.asyncio clients.
+    '''
+    version = int(await amdb.get(DATA_VERSION_KEY) or 0)
+    table = _table
+    if table is not None and table.version == version:
+        return table
+    if await ard.dbsize() * ROW_BYTES <= TABLE_MAX_BYTES:
+        return await aload_table(ard, amdb)
+    found, parts = [], []
+    async for batch, replies in aiter_replies(ard, chronological(await aload_keys(ard)), fields):
+        batch_keys, rows = _kept(batch, replies, fields, keep)
+        found.extend(batch_keys)
+        parts.append(rows)
+    return Table(found, np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE))
@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+import time
+import redis
+import redis.asyncio
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from hotqueue import HotQueue
+import metrics
+from shards import ShardedCatalog, AsyncShardedCatalog
+from replicas import Replica, ReplicaRouter
+
+# REDIS_IP is the name the jobs and worker modules used to read
+REDIS_HOST = os.environ.get("REDIS_HOST", os.environ.get("REDIS_IP", "redis-db"))
+REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
+# "host:port" of every node the NEO catalog is split over, comma separated (see shards.py). When
+# set the catalog lives only on these nodes, and REDIS_HOST keeps the queue, jobs, results and
+# metadata; a single node moves the catalog to an instance of its own
+REDIS_CATALOG_NODES = [node.strip() for node in os.environ.get("REDIS_CATALOG_NODES", "").split(",") if node.strip()]
+# "host:port" of every read replica of REDIS_HOST, comma separated (see replicas.py). Read-only
+# catalog access is spread over them; everything else stays on REDIS_HOST
+REDIS_REPLICAS = [node.strip() for node in os.environ.get("REDIS_REPLICAS", "").split(",") if node.strip()]
+
+# pool and socket tuning
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "32"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "10"))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "5"))
+REDIS_KEEPALIVE = os.environ.get("REDIS_KEEPALIVE", "1") == "1"
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_RETRIES = int(os.environ.get("REDIS_RETRIES", "3"))
+REDIS_BACKOFF_BASE = float(os.environ.get("REDIS_BACKOFF_BASE", "0.05"))
+REDIS_BACKOFF_CAP = float(os.environ.get("REDIS_BACKOFF_CAP", "1"))
+# connect and socket timeout of the replicas; a slow replica is left out rather than waited for
+REDIS_REPLICA_TIMEOUT = float(os.environ.get("REDIS_REPLICA_TIMEOUT", "0.5"))
+
+# Redis databases
+NEO_DB = 0
+QUEUE_DB = 1
+JOBS_DB = 2
+RESULTS_DB = 3
+META_DB = 4
+
+
+class _TimedMixin:
+    """Reports the time of every send and read to metrics. A single command or a whole
+    pipeline is one send, so the sends count the round trips."""
+
+    def send_packed_command(self, command, check_health=True):
+        start = time.perf_counter()
+        try:
+            return super().send_packed_command(command, check_health)
+        finally:
+            metrics.record_redis(self.db, time.perf_counter() - start, True)
+
+    def read_response(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            metrics.record_redis(self.db, time.perf_counter() - start, False)
+
+
+class TimedConnection(_TimedMixin, redis.Connection):
+    """redis.Connection that reports its round trips to metrics."""
+
+
+_pools = {}
+_clients = {}
+_queues = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def _address(node: int, replica: int = None) -> tuple:
+    if replica is not None:
+        address = REDIS_REPLICAS[replica]
+    elif node is not None:
+        address = REDIS_CATALOG_NODES[node]
+    else:
+        return REDIS_HOST, REDIS_PORT
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+def get_pool(db: int, node: int = None, replica: int = None) -> redis.ConnectionPool:
+    '''
+    Returns the connection pool shared by every client of a database, creating it on first use.
+
+    Args:
+        db (int): Redis database number
+        node (int): index in REDIS_CATALOG_NODES for a catalog node, None for REDIS_HOST
+        replica (int): index in REDIS_REPLICAS for a read replica of REDIS_HOST
+    Returns:
+        pool (ConnectionPool): the pool for that database
+    '''
+    if replica is not None:
+        key = (db, 'replica', replica)
+    else:
+        key = db if node is None else (db, node)
+    pool = _pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(key)
+            if pool is None:
+                host, port = _address(node, replica)
+                if replica is None:
+                    timeouts = {'socket_timeout': REDIS_SOCKET_TIMEOUT, 'socket_connect_timeout': REDIS_CONNECT_TIMEOUT,
+                                'retry': Retry(ExponentialBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+                                'retry_on_error': [redis.exceptions.ConnectionError, redis.exceptions.TimeoutError]}
+                else:
+                    # the router falls back to the primary, so a replica is not retried
+                    timeouts = {'socket_timeout': REDIS_REPLICA_TIMEOUT, 'socket_connect_timeout': REDIS_REPLICA_TIMEOUT}
+                pool = redis.BlockingConnectionPool(
+                    connection_class=TimedConnection,
+                    host=host,
+                    port=port,
+                    db=db,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    socket_keepalive=REDIS_KEEPALIVE,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                    **timeouts)
+                _pools[key] = pool
+    return pool
+
+
+def get_redis(db: int) -> redis.Redis:
+    '''
+    Returns the Redis client for a database. No connection is opened until the first command.
+
+    Args:
+        db (int): Redis database number
+    Returns:
+        client (Redis): client backed by the shared pool
+    '''
+    client = _clients.get(db)
+    if client is None:
+        client = _clients.setdefault(db, redis.Redis(connection_pool=get_pool(db)))
+    return client
+
+
+def get_catalog():
+    '''
+    Returns the client of the NEO catalog: the client of db 0, or a ShardedCatalog over the
+    nodes in REDIS_CATALOG_NODES.
+
+    Returns:
+        client (Redis or ShardedCatalog): client for the catalog
+    '''
+    if not REDIS_CATALOG_NODES:
+        return get_redis(NEO_DB)
+    client = _clients.get('catalog')
+    if client is None:
+        nodes = [redis.Redis(connection_pool=get_pool(NEO_DB, node)) for node in range(len(REDIS_CATALOG_NODES))]
+        client = _clients.setdefault('catalog', ShardedCatalog(nodes))
+    return client
+
+
+def get_read_router() -> ReplicaRouter:
+    '''
+    Returns the router of read-only catalog access over REDIS_REPLICAS. With no replicas, or
+    with the catalog split over REDIS_CATALOG_NODES, every read goes to the primary.
+
+    Returns:
+        router (ReplicaRouter): the router shared by the process
+    '''
+    router = _clients.get('reader')
+    if router is None:
+        replicas = []
+        if REDIS_REPLICAS and REDIS_CATALOG_NODES:
+            # the replicas copy REDIS_HOST, which no longer holds the catalog
+            logging.warning("REDIS_REPLICAS is ignored when REDIS_CATALOG_NODES is set")
+        elif REDIS_REPLICAS:
+            replicas = [Replica(name, redis.Redis(connection_pool=get_pool(NEO_DB, replica=index)),
+                                redis.Redis(connection_pool=get_pool(META_DB, replica=index)))
+                        for index, name in enumerate(REDIS_REPLICAS)]
+        router = _clients.setdefault('reader', ReplicaRouter(get_catalog(), get_redis(META_DB), replicas))
+    return router
+
+
+def read_catalog():
+    '''
+    Returns a client for the read-only catalog access of one request or job, on a replica at
+    the current data version or on the primary. Writes must use the primary (get_catalog).
+
+    Returns:
+        client (Reader): client that picks its replica on first use
+    '''
+    return get_read_router().reader()
+
+
+def get_async_redis(db: int, node: int = None) -> redis.asyncio.Redis:
+    '''
+    Returns the redis.asyncio client for a database, used by the async API. It has its own
+    pool with the same settings since asyncio connections cannot be shared with threads.
+
+    Args:
+        db (int): Redis database number
+        node (int): index in REDIS_CATALOG_NODES for a catalog node, None for REDIS_HOST
+    Returns:
+        client (redis.asyncio.Redis): async client backed by a pool for that database
+    '''
+    key = db if node is None else (db, node)
+    client = _async_clients.get(key)
+    if client is None:
+        host, port = _address(node)
+        pool = redis.asyncio.BlockingConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_keepalive=REDIS_KEEPALIVE,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL)
+        client = _async_clients.setdefault(key, redis.asyncio.Redis(connection_pool=pool))
+    return client
+
+
+def get_async_catalog():
+    '''
+    Async version of get_catalog, used by the async API.
+    '''
+    if not REDIS_CATALOG_NODES:
+        return get_async_redis(NEO_DB)
+    client = _async_clients.get('catalog')
+    if client is None:
+        nodes = [get_async_redis(NEO_DB, node) for node in range(len(REDIS_CATALOG_NODES))]
+        client = _async_clients.setdefault('catalog', AsyncShardedCatalog(nodes))
+    return client
+
+
+def get_queue(name: str = "queue") -> HotQueue:
+    '''
+    Returns the HotQueue with the given name, backed by the shared pool of the queue database.
+
+    Args:
+        name (str): queue name
+    Returns:
+        queue (HotQueue): the job queue
+    '''
+    queue = _queues.get(name)
+    if queue is None:
+        queue = _queues.setdefault(name, HotQueue(name, connection_pool=get_pool(QUEUE_DB)))
+    return queue
+
+
+def reset() -> None:
+    '''
+    Drops every pool and client so they are created again on next use. Called in each
+    gunicorn worker after fork so no socket is shared with the parent process.
+    '''
+    with _lock:
+        for pool in _pools.values():
+            pool.disconnect()
+        _pools.clear()
+        _clients.clear()
+        _queues.clear()
+        _async_clients.clear()
+
+
+class _Lazy:
+    """Stands in for a client until it is first used, then forwards to the shared one."""
+
+    def __init__(self, factory, arg):
+        self._factory = factory
+        self._arg = arg
+
+    def __getattr__(self, name):
+        return getattr(self._factory(self._arg), name)
+
+    def __len__(self):
+        return len(self._factory(self._arg))
+
+
+def lazy_redis(db: int) -> redis.Redis:
+    """Module level handle to the client of `db` that is created on first use."""
+    return _Lazy(get_redis, db)
+
+
+def lazy_catalog():
+    """Module level handle to the catalog client (see get_catalog) that is created on first use."""
+    return _Lazy(lambda _: get_catalog(), None)
+
+
+def lazy_queue(name: str = "queue") -> HotQueue:
+    """Module level handle to the queue `name` that is created on first use."""
+    return _Lazy(get_queue, name)
@@ -0,0 +1,27 @@
+# Gunicorn configuration for serving NEO_api in production.
+# Run with: gunicorn -c gunicorn.conf.py NEO_api:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# worker processes and threads per worker are tunable from the environment
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# with preload the app is imported once in the master before forking
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+
+def post_fork(server, worker):
+    """Give every worker its own Redis pools instead of ones inherited from the master."""
+    import connections
+    connections.reset()
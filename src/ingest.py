@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import time
+import typing
+from utils import create_min_diam_column, create_max_diam_column, parse_timestamps
+from catalog import bump_data_version, load_records, save_records, FIELDS
+from rollups import rollup_changes, queue_rollup, month_extremes
+from columns import NUMERIC_FIELDS
+from objects import queue_objects, prune_objects
+
+if typing.TYPE_CHECKING:
+    # pandas is imported when a csv is loaded, so API processes start without it
+    import pandas as pd
+
+# number of csv rows parsed and written to Redis at a time
+CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "5000"))
+
+# key in the metadata database holding the last committed chunk
+CHECKPOINT_KEY = "ingest_checkpoint"
+# seconds between data version bumps while a load runs. Every bump drops the cached responses
+# and makes each API and worker process read the columnar table again, so a long load bumps at
+# most this often, and once more when it stops; 0 bumps after every chunk
+VERSION_BUMP_SECONDS = float(os.environ.get("INGEST_VERSION_SECONDS", "30"))
+
+
+def _file_signature(path: str) -> str:
+    '''
+    Builds a signature of the csv file so a checkpoint is only reused for the same file.
+
+    Args:
+        path (str): path to the csv file
+    Returns:
+        signature (str): file size and modification time
+    '''
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def load_checkpoint(mdb, path: str) -> dict:
+    '''
+    Returns the checkpoint of an interrupted ingest of the given file.
+
+    Args:
+        mdb: Redis client for the metadata database
+        path (str): path to the csv file
+    Returns:
+        checkpoint (dict): chunk and row counts already committed, or None
+    '''
+    raw = mdb.get(CHECKPOINT_KEY)
+    if raw is None:
+        return None
+    checkpoint = json.loads(raw)
+    if checkpoint.get('path') != path or checkpoint.get('signature') != _file_signature(path):
+        logging.warning("Ignoring checkpoint left by a different file")
+        return None
+    return checkpoint
+
+
+def build_records(chunk: 'pd.DataFrame') -> list:
+    '''
+    Parses one chunk of the csv into the records stored in Redis.
+
+    Args:
+        chunk (DataFrame): rows of the csv
+    Returns:
+        records (list): list of dictionaries, one per NEO
+    '''
+    # create a minimum and maximum diameter column for use in later routes
+    chunk['Minimum Diameter'] = chunk['Diameter'].apply(create_min_diam_column)
+    chunk['Maximum Diameter'] = chunk['Diameter'].apply(create_max_diam_column)
+    # close-approach time as epoch seconds and its uncertainty in minutes, parsed for the whole chunk at once
+    chunk['Epoch'], chunk['Uncertainty (min)'] = parse_timestamps(chunk['Close-Approach (CA) Date'].to_numpy())
+    return chunk[FIELDS].to_dict('records')
+
+
+def _checkpoint(path: str, signature: str, chunk: int, rows: int, rolled_up: int) -> str:
+    return json.dumps({'path': path, 'signature': signature, 'chunk': chunk, 'rows': rows,
+                       'rolled_up': rolled_up})
+
+
+def ingest_csv(path: str, rd, mdb, chunksize: int = CHUNK_SIZE, resume: bool = True, progress=None) -> dict:
+    '''
+    Streams the csv into Redis chunk by chunk so memory stays bounded by the chunk size.
+    Each chunk is written with one pipeline and then recorded as a checkpoint, so a crashed
+    ingest can resume after the last committed chunk. Records are keyed by their
+    close-approach date, so replaying a chunk after a crash is harmless.
+
+    The rollups of a chunk are added in one transaction together with a checkpoint marking
+    the chunk as rolled up, before its records are written. A replayed chunk is therefore
+    never added to the rollups twice. A record that overwrites a stored one with other values
+    takes the stored values out of the rollups, so they follow a reload of a changed file.
+
+    The data version is bumped at most every VERSION_BUMP_SECONDS while chunks are committed,
+    and when the load ends or is interrupted after committing a chunk. Until then, responses
+    cached before the last bump can still be served.
+
+    Args:
+        path (str): path to the csv file
+        rd: Redis client for the NEO database
+        mdb: Redis client for the metadata database
+        chunksize (int): number of rows per chunk
+        resume (bool): whether to continue from an existing checkpoint
+        progress (callable): called with the summary dict after every chunk
+    Returns:
+        summary (dict): rows and chunks loaded, elapsed seconds, rows per second
+    '''
+    checkpoint = load_checkpoint(mdb, path) if resume else None
+    skip_rows = checkpoint['rows'] if checkpoint else 0
+    rolled_up = checkpoint.get('rolled_up', checkpoint['chunk']) if checkpoint else 0
+    signature = _file_signature(path)
+
+    summary = {'rows': skip_rows,
+               'chunks': checkpoint['chunk'] if checkpoint else 0,
+               'resumed_from': skip_rows,
+               'seconds': 0.0,
+               'rows_per_second': 0.0}
+    if checkpoint:
+        logging.info(f"Resuming ingest of {path} after row {skip_rows}")
+
+    start = time.perf_counter()
+    # pandas is only needed to load data, so API processes do not import it at startup
+    import pandas as pd
+    # skip the rows committed before the crash but keep the header line
+    reader = pd.read_csv(path, chunksize=chunksize, skiprows=range(1, skip_rows + 1))
+    last_bump, changed = time.monotonic(), False
+    try:
+        for chunk in reader:
+            records = build_records(chunk)
+            number = summary['chunks'] + 1
+
+            # the stored values of the keys the chunk overwrites, for the rollups and the object index
+            keyed = {record['Close-Approach (CA) Date']: record for record in records}
+            previous = load_records(rd, fields=['Object'] + NUMERIC_FIELDS, keys=list(keyed))
+            # set before the writes, so a chunk that fails halfway is still followed by a bump
+            changed = True
+
+            if number > rolled_up:
+                added, removed = rollup_changes(keyed, previous)
+                tx = mdb.pipeline(transaction=True)
+                queue_rollup(mdb, tx, added, removed,
+                             extremes=lambda period, aliases: month_extremes(rd, period, aliases, keyed))
+                tx.set(CHECKPOINT_KEY, _checkpoint(path, signature, summary['chunks'], summary['rows'], number))
+                tx.execute()
+                rolled_up = number
+
+            pipe = rd.pipeline(transaction=False)
+            save_records(pipe, records)
+            pipe.execute()
+            # the object index is written before the next version bump, like the records it points to
+            index = mdb.pipeline(transaction=False)
+            moved = queue_objects(index, records, previous)
+            index.execute()
+            prune_objects(mdb, moved)
+
+            summary['rows'] += len(records)
+            summary['chunks'] = number
+            if time.monotonic() - last_bump >= VERSION_BUMP_SECONDS:
+                # the data changed so cached responses must not be served any more
+                bump_data_version(mdb)
+                last_bump, changed = time.monotonic(), False
+            mdb.set(CHECKPOINT_KEY, _checkpoint(path, signature, summary['chunks'], summary['rows'], rolled_up))
+
+            elapsed = time.perf_counter() - start
+            summary['seconds'] = round(elapsed, 3)
+            summary['rows_per_second'] = round((summary['rows'] - skip_rows) / elapsed, 1) if elapsed else 0.0
+            logging.info(f"Committed chunk {summary['chunks']}: {summary['rows']} rows loaded")
+            if progress is not None:
+                progress(dict(summary))
+    finally:
+        # the chunks committed since the last bump, also by a load that failed or was stopped
+        if changed:
+            bump_data_version(mdb)
+
+    # the file was fully loaded so there is nothing left to resume
+    mdb.delete(CHECKPOINT_KEY)
+    return summary
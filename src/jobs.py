@@ -1,16 +1,35 @@
 import json
-import uuid
-import redis
 import os
-from hotqueue import HotQueue
+import time
+import uuid
+from connections import lazy_redis, lazy_catalog, get_queue, QUEUE_DB, JOBS_DB, RESULTS_DB, META_DB
+
+# Redis clients, created on first use from the shared pools in connections.py
+rd = lazy_catalog()
+qdb = lazy_redis(QUEUE_DB)
+jdb = lazy_redis(JOBS_DB)
+rdb = lazy_redis(RESULTS_DB)
+mdb = lazy_redis(META_DB)
 
+# priority classes, highest first; every class has one queue per kind of job
+PRIORITIES = ('high', 'normal', 'low')
+KINDS = ('1', '2', 'ingest')
+# single-month plots are interactive; multi-year hexbins and loads can wait behind them
+DEFAULT_PRIORITY = {'1': 'normal', '2': 'high', 'ingest': 'normal'}
+# the single queue of earlier versions, still drained as part of the normal class
+LEGACY_QUEUE = "queue"
 
-REDIS_IP = os.environ.get("REDIS_IP", "redis-db")
-# Initialize Redis client
-rd = redis.Redis(host=REDIS_IP, port=6379, db=0)
-q = HotQueue("queue", host=REDIS_IP, port=6379, db=1)
-jdb = redis.Redis(host=REDIS_IP, port=6379, db=2)
-rdb = redis.Redis(host=REDIS_IP, port=6379, db=3)
+# statuses of jobs that will not run again
+FINISHED = ('complete', 'failed', 'cancelled', 'timed out')
+# a running job is cancelled by setting this key in the metadata database; the worker checks it
+CANCEL_PREFIX = "cancel:"
+CANCEL_TTL = 86400
+
+# "weighted" serves every class with jobs in proportion to its weight, "strict" always serves
+# the highest class with jobs
+QUEUE_SCHEDULING = os.environ.get("QUEUE_SCHEDULING", "weighted")
+QUEUE_WEIGHTS = dict((name, int(weight)) for name, weight in (
+    item.split(':') for item in os.environ.get("QUEUE_WEIGHTS", "high:6,normal:3,low:1").split(',')))
 
 def _generate_jid():
     """
@@ -34,19 +53,189 @@ def _save_job(jid, job_dict):
     jdb.set(jid, json.dumps(job_dict))
     return
 
-def _queue_job(jid):
-    """Add a job to the redis queue."""
-    q.put(jid)
+def queue_name(priority, kind):
+    """Name of the queue of jobs of `kind` in priority class `priority`."""
+    return f"queue:{priority}:{kind}"
+
+def _queue_job(jid, priority, kind):
+    """Add a job to the redis queue of its priority and kind."""
+    get_queue(queue_name(priority, kind)).put(jid)
     return
 
-def add_job(start, end, kind, status="submitted"):
+def _prioritize(job_dict, priority):
+    """Record the priority class and queueing time of a job, defaulting the class by kind."""
+    job_dict['priority'] = priority or DEFAULT_PRIORITY.get(str(job_dict['kind']), 'normal')
+    job_dict['queued'] = time.time()
+    return job_dict
+
+def add_job(start, end, kind, status="submitted", priority=None):
     """Add a job to the redis queue."""
     jid = _generate_jid()
-    job_dict = _instantiate_job(jid, status, start, end, kind)
+    job_dict = _prioritize(_instantiate_job(jid, status, start, end, kind), priority)
+    _save_job(jid, job_dict)
+    _queue_job(jid, job_dict['priority'], kind)
+    return job_dict
+
+def add_ingest_job(path, resume=True, status="submitted", priority=None):
+    """Add a job that loads the csv at `path` into Redis to the redis queue."""
+    jid = _generate_jid()
+    job_dict = _prioritize({'id': jid,
+                            'status': status,
+                            'kind': 'ingest',
+                            'path': path,
+                            'resume': resume,
+                            'rows_loaded': 0,
+                            'throughput': 0.0,
+                            'errors': []}, priority)
     _save_job(jid, job_dict)
-    _queue_job(jid)
+    _queue_job(jid, job_dict['priority'], 'ingest')
     return job_dict
 
+def cancel_requested(jid):
+    """Return whether job `jid` has been asked to stop."""
+    return bool(mdb.exists(CANCEL_PREFIX + jid))
+
+def _dequeue(job_dict):
+    """Take a submitted job off its queue. Returns False when the worker has already taken it."""
+    name = queue_name(job_dict['priority'], job_dict['kind']) if 'priority' in job_dict else LEGACY_QUEUE
+    queue = get_queue(name)
+    return bool(qdb.lrem(queue.key, 0, queue.serializer.dumps(job_dict['id'])))
+
+def cancel_job(jid):
+    """
+    Cancel job `jid`. A queued job is taken off its queue and marked cancelled; a running job is
+    asked to stop, which the worker notices within a second and records as cancelled.
+    Returns (job dictionary or None if there is no such job, one of "removed", "signalled" or "finished").
+    """
+    job_dict = get_job_by_id(jid)
+    if job_dict is None or job_dict['status'] in FINISHED:
+        return job_dict, 'finished'
+    # a job the worker has already taken is no longer on the queue and is signalled instead
+    if job_dict['status'] == 'submitted' and _dequeue(job_dict):
+        job_dict['status'] = 'cancelled'
+        _save_job(jid, job_dict)
+        return job_dict, 'removed'
+    mdb.set(CANCEL_PREFIX + jid, 1, ex=CANCEL_TTL)
+    return job_dict, 'signalled'
+
+def promote_job(job_dict, priority):
+    """
+    Move a queued job up to priority class `priority`, to the back of that class's queue. A job
+    that is already in that class or above, or that the worker has taken, is left as it is.
+    Returns the job dictionary.
+    """
+    current = job_dict.get('priority', 'normal')
+    if job_dict['status'] != 'submitted' or PRIORITIES.index(priority) >= PRIORITIES.index(current):
+        return job_dict
+    if _dequeue(job_dict):
+        job_dict['priority'] = priority
+        _save_job(job_dict['id'], job_dict)
+        _queue_job(job_dict['id'], priority, job_dict['kind'])
+    return job_dict
+
+def queue_depths():
+    """
+    Return the number of jobs waiting in every queue, as (metric, labels, value) gauges for /metrics.
+    """
+    names = [(priority, kind) for priority in PRIORITIES for kind in KINDS]
+    pipe = qdb.pipeline(transaction=False)
+    for priority, kind in names:
+        pipe.llen(get_queue(queue_name(priority, kind)).key)
+    pipe.llen(get_queue(LEGACY_QUEUE).key)
+    depths = pipe.execute()
+    gauges = [('neo_queue_depth', {'priority': priority, 'kind': kind}, depth)
+              for (priority, kind), depth in zip(names, depths)]
+    gauges.append(('neo_queue_depth', {'priority': 'normal', 'kind': 'any'}, depths[-1]))
+    return gauges
+
+def queue_priority(name):
+    """Priority class of the queue called `name`."""
+    return 'normal' if name == LEGACY_QUEUE else name.split(':')[1]
+
+def requeue(name, jids):
+    """Put jobs taken from queue `name` back at its head, in order, to run after higher priority work."""
+    queue = get_queue(name)
+    qdb.lpush(queue.key, *[queue.serializer.dumps(jid) for jid in reversed(jids)])
+    for jid in jids:
+        update_job(jid, status="submitted", preempted=True)
+
+class JobScheduler:
+    """
+    Chooses the queue the worker takes its next job from. Classes are served by smooth weighted
+    round robin over QUEUE_WEIGHTS (or strictly by priority), and the kinds within a class take
+    turns, so a backlog of one kind never holds back another.
+    """
+
+    def __init__(self, weights=None, strict=None):
+        self.weights = weights or QUEUE_WEIGHTS
+        self.strict = QUEUE_SCHEDULING == 'strict' if strict is None else strict
+        self.credit = dict.fromkeys(PRIORITIES, 0)
+        self.turn = dict.fromkeys(PRIORITIES, 0)
+
+    def order(self):
+        """Return the queue names to try, in order, for the next job."""
+        if self.strict:
+            classes = list(PRIORITIES)
+        else:
+            for priority in PRIORITIES:
+                self.credit[priority] += self.weights.get(priority, 1)
+            classes = sorted(PRIORITIES, key=lambda priority: -self.credit[priority])
+        names = []
+        for priority in classes:
+            turn = self.turn[priority]
+            names += [queue_name(priority, kind) for kind in KINDS[turn:] + KINDS[:turn]]
+            if priority == 'normal':
+                names.append(LEGACY_QUEUE)
+        return names
+
+    def served(self, names, name):
+        """Update the credits and turns after a job was taken from queue `name` of `names`."""
+        priority = queue_priority(name)
+        kind = None if name == LEGACY_QUEUE else name.split(':')[2]
+        if not self.strict:
+            classes = list(dict.fromkeys(queue_priority(tried) for tried in names))
+            served = classes.index(priority)
+            # the classes tried first had no jobs, so they do not save up credit while idle, and
+            # the served class only pays for the classes that may have been waiting with it
+            for idle in classes[:served]:
+                self.credit[idle] = 0
+            self.credit[priority] -= sum(self.weights.get(p, 1) for p in classes[served:])
+        if kind is not None:
+            self.turn[priority] = (KINDS.index(kind) + 1) % len(KINDS)
+
+    def waiting_above(self, priority):
+        """Return whether a class above `priority` has jobs waiting, in one round trip."""
+        higher = PRIORITIES[:PRIORITIES.index(priority)]
+        if not higher:
+            return False
+        pipe = qdb.pipeline(transaction=False)
+        for above in higher:
+            for kind in KINDS:
+                pipe.llen(get_queue(queue_name(above, kind)).key)
+        if 'normal' in higher:
+            pipe.llen(get_queue(LEGACY_QUEUE).key)
+        return any(pipe.execute())
+
+    def get(self, block=False, timeout=0):
+        """
+        Take the next job id from the queues, in one round trip. With `block` wait up to
+        `timeout` seconds for one (0 waits forever, which the socket timeout of the queue
+        connection cuts short, so callers wait in shorter steps). Returns (queue name, job id), or None.
+        """
+        names = self.order()
+        keys = [get_queue(name).key for name in names]
+        if block:
+            popped = qdb.blmpop(timeout, len(keys), *keys, direction='LEFT')
+        else:
+            popped = qdb.lmpop(len(keys), *keys, direction='LEFT')
+        if popped is None:
+            self.credit = dict.fromkeys(PRIORITIES, 0)
+            return None
+        key, (message,) = popped
+        name = names[keys.index(key.decode('utf-8'))]
+        self.served(names, name)
+        return name, get_queue(name).serializer.loads(message)
+
 def get_job_by_id(jid):
     """Return job dictionary given jid."""
     job_data = jdb.get(jid)
@@ -63,6 +252,15 @@ def update_job_status(jid, status):
     else:
         raise Exception()
 
+def update_job(jid, **fields):
+    """Update the fields of job with job id `jid`, e.g. progress counters."""
+    job_dict = get_job_by_id(jid)
+    if job_dict:
+        job_dict.update(fields)
+        _save_job(jid, job_dict)
+    else:
+        raise Exception()
+
 def store_job_result(job_id: str, result):
     """Stores job result data into the results Redis database."""
     try:
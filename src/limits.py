@@ -0,0 +1,107 @@
+import logging
+import os
+import signal
+import threading
+import time
+
+# Time limits and cancellation of worker jobs. A job that runs past its soft limit is
+# interrupted with JobTimedOut, and a cancelled job with JobCancelled, wherever it is in Python
+# code, so the worker records it and moves on to the next job. A job still running at its hard
+# limit (stuck in C code, or ignoring the interrupt) makes the worker exit after recording it,
+# so Docker or Kubernetes starts a fresh worker.
+
+
+def _seconds_by_kind(value: str, name: str) -> dict:
+    limits = {}
+    for item in filter(None, (item.strip() for item in value.split(','))):
+        kind, _, seconds = item.partition(':')
+        try:
+            limits[kind.strip()] = float(seconds)
+        except ValueError:
+            raise ValueError(f"Invalid {name} item {item!r}, expected <kind>:<seconds> as in 1:120,2:60") from None
+    return limits
+
+# seconds per kind of job, e.g. "1:120,2:60,ingest:3600"; a kind that is not listed has no limit,
+# and an empty value turns the limits off
+JOB_SOFT_TIMEOUTS = _seconds_by_kind(os.environ.get("JOB_SOFT_TIMEOUTS", "1:120,2:60,ingest:3600"), "JOB_SOFT_TIMEOUTS")
+JOB_HARD_TIMEOUTS = _seconds_by_kind(os.environ.get("JOB_HARD_TIMEOUTS", "1:180,2:90,ingest:3900"), "JOB_HARD_TIMEOUTS")
+# how often a running job checks whether it was cancelled
+CANCEL_POLL_SECONDS = float(os.environ.get("CANCEL_POLL_SECONDS", "1"))
+# exit status of a worker that gave up on a job at its hard limit
+HARD_TIMEOUT_EXIT = 70
+
+
+class JobInterrupted(BaseException):
+    '''
+    Raised inside a job that has to stop. A BaseException, like KeyboardInterrupt, so the
+    `except Exception` blocks of the job code do not swallow it.
+    '''
+    status = None
+
+
+class JobCancelled(JobInterrupted):
+    status = 'cancelled'
+
+
+class JobTimedOut(JobInterrupted):
+    status = 'timed out'
+
+
+class job_limits:
+    '''
+    Context manager enforcing the limits of a job in the main thread of the worker.
+
+    Args:
+        kind (str): kind of the job, selecting its soft and hard limits
+        cancelled (callable): returns True once the job has been cancelled, polled every
+            CANCEL_POLL_SECONDS; None for work that cannot be cancelled on its own
+        on_hard_timeout (callable): called before the worker exits at the hard limit
+    '''
+
+    def __init__(self, kind: str, cancelled=None, on_hard_timeout=None):
+        self.soft = JOB_SOFT_TIMEOUTS.get(str(kind))
+        self.hard = JOB_HARD_TIMEOUTS.get(str(kind))
+        self.cancelled = cancelled
+        self.on_hard_timeout = on_hard_timeout
+        self._done = threading.Event()
+
+    def _interrupt(self, signum, frame):
+        # a signal sent just as the job finished is ignored
+        if self._done.is_set():
+            return
+        if signum == signal.SIGUSR1:
+            raise JobCancelled("Job cancelled")
+        raise JobTimedOut(f"Job ran past its time limit of {self.soft:g} s")
+
+    def _watch(self, main: int) -> None:
+        start = time.monotonic()
+        while not self._done.wait(CANCEL_POLL_SECONDS):
+            if self.hard is not None and time.monotonic() - start > self.hard:
+                logging.critical(f"Job still running after its hard limit of {self.hard:g} s, restarting the worker")
+                if self.on_hard_timeout is not None:
+                    self.on_hard_timeout()
+                os._exit(HARD_TIMEOUT_EXIT)
+            try:
+                cancelled = self.cancelled is not None and self.cancelled()
+            except Exception as e:
+                logging.warning(f"Could not check for cancellation: {e}")
+                continue
+            if cancelled:
+                signal.pthread_kill(main, signal.SIGUSR1)
+                # the job may not notice at once; keep watching for the hard limit
+                self.cancelled = None
+
+    def __enter__(self):
+        self._handlers = {signum: signal.signal(signum, self._interrupt) for signum in (signal.SIGALRM, signal.SIGUSR1)}
+        if self.soft is not None:
+            signal.setitimer(signal.ITIMER_REAL, self.soft)
+        if self.hard is not None or self.cancelled is not None:
+            threading.Thread(target=self._watch, args=(threading.get_ident(),), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        for signum, handler in self._handlers.items():
+            signal.signal(signum, handler)
+        return False
@@ -0,0 +1,309 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextvars import ContextVar
+import redis
+from flask import g, request
+
+# Instrumentation shared by the API and the worker: latency histograms per route, Redis round
+# trips and JSON time per request, and worker phase timings. Every process keeps its own
+# registry and publishes a snapshot of it to the metadata database every few seconds, so the
+# /metrics route of any API process can report the sum over all gunicorn workers and workers.
+
+METRICS_PREFIX = "metrics:"
+METRICS_PUBLISH_SECONDS = float(os.environ.get("METRICS_PUBLISH_SECONDS", "5"))
+# snapshots of processes that stopped publishing expire after this many seconds
+METRICS_TTL = int(os.environ.get("METRICS_TTL", "120"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'neo_http_request_duration_seconds': ('histogram', 'Time to handle a request.', LATENCY_BUCKETS),
+    'neo_redis_roundtrips_per_request': ('histogram', 'Redis round trips (commands or pipelines) made by a request.', COUNT_BUCKETS),
+    'neo_redis_seconds_per_request': ('histogram', 'Time a request spent sending to and reading from Redis.', LATENCY_BUCKETS),
+    'neo_json_encode_seconds_per_request': ('histogram', 'Time a request spent serializing JSON.', LATENCY_BUCKETS),
+    'neo_json_decode_seconds_per_request': ('histogram', 'Time a request spent parsing stored JSON records.', LATENCY_BUCKETS),
+    'neo_redis_roundtrips_total': ('counter', 'Redis round trips by database.', None),
+    'neo_worker_phase_seconds': ('histogram', 'Time spent in each phase of a worker job.', PHASE_BUCKETS),
+    'neo_worker_jobs_total': ('counter', 'Jobs run by the worker by kind.', None),
+    'neo_worker_jobs_stopped_total': ('counter', 'Jobs the worker stopped because they were cancelled or timed out.', None),
+    'neo_worker_batch_size': ('histogram', 'Jobs the worker took from the queue at once.', COUNT_BUCKETS),
+    'neo_queue_wait_seconds': ('histogram', 'Time a job waited in its queue before a worker took it.', WAIT_BUCKETS),
+    'neo_queue_depth': ('gauge', 'Jobs waiting in each queue when /metrics was read.', None),
+    'neo_catalog_reads_total': ('counter', 'Readers of the catalog by the replica or primary they were sent to.', None),
+    'neo_warmup_jobs_total': ('counter', 'Plot jobs queued after a load of the NEO data to precompute popular results.', None),
+    'neo_jobs_reused_total': ('counter', 'Job requests answered with the job of the same parameters on the current data.', None),
+}
+
+
+class Registry:
+    """Counters and histograms of one process, keyed by metric name and label values."""
+
+    def __init__(self):
+        self._counters = {}
+        # per series: one count per bucket plus the +Inf bucket, then the sum
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        '''
+        Adds amount to a counter.
+        '''
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        '''
+        Records one value in a histogram.
+
+        Args:
+            name (str): metric name from METRICS
+            value (float): observed value, e.g. seconds
+            labels: label values of the series
+        '''
+        buckets = METRICS[name][2]
+        index = len(buckets)
+        for position, bound in enumerate(buckets):
+            if value <= bound:
+                index = position
+                break
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> dict:
+        '''
+        Returns the current values as a JSON-serializable dict, the form published to Redis.
+        '''
+        with self._lock:
+            return {'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                    'histograms': [[name, dict(labels), list(series)]
+                                   for (name, labels), series in self._histograms.items()]}
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """Redis and JSON time spent by the request being handled."""
+
+    __slots__ = ('roundtrips', 'redis_seconds', 'encode_seconds', 'decode_seconds')
+
+    def __init__(self):
+        self.roundtrips = 0
+        self.redis_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+
+
+_request_stats = ContextVar('request_stats', default=None)
+
+
+def current() -> RequestStats:
+    """Returns the stats of the request handled in this context, None outside a request."""
+    return _request_stats.get()
+
+
+def record_redis(db: int, seconds: float, roundtrip: bool) -> None:
+    '''
+    Called by the Redis connections for every send and read.
+
+    Args:
+        db (int): database of the connection
+        seconds (float): time the send or read took
+        roundtrip (bool): whether this starts a round trip, i.e. it is a send
+    '''
+    if roundtrip:
+        registry.inc('neo_redis_roundtrips_total', db=str(db))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.roundtrips += roundtrip
+        stats.redis_seconds += seconds
+
+
+def observe_phase(kind: str, phase: str, seconds: float) -> None:
+    """Records the time of one phase (fetch, filter, render, store, ingest) of a worker job."""
+    registry.observe('neo_worker_phase_seconds', seconds, kind=kind, phase=phase)
+
+
+class phase_timer:
+    """Context manager timing one phase of a worker job."""
+
+    def __init__(self, kind: str, phase: str):
+        self.kind = kind
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_phase(self.kind, self.phase, time.perf_counter() - self.start)
+        return False
+
+
+def instrument(app, mdb) -> None:
+    '''
+    Registers the request hooks that time every request of a Flask app and record its Redis
+    round trips and JSON time under the route template, and starts publishing the registry.
+    Register it before the other after_request hooks so their time is included.
+
+    Args:
+        app (Flask): the app
+        mdb: Redis client for the metadata database, where the snapshots are published
+    '''
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _request_stats.set(RequestStats())
+
+    @app.after_request
+    def _finish_request(response):
+        token = g.pop('metrics_token', None)
+        if token is None:
+            return response
+        stats = _request_stats.get()
+        _request_stats.reset(token)
+        labels = {'route': request.url_rule.rule if request.url_rule else 'unmatched',
+                  'method': request.method}
+        registry.observe('neo_http_request_duration_seconds', time.perf_counter() - g.metrics_start,
+                         status=str(response.status_code), **labels)
+        registry.observe('neo_redis_roundtrips_per_request', stats.roundtrips, **labels)
+        registry.observe('neo_redis_seconds_per_request', stats.redis_seconds, **labels)
+        registry.observe('neo_json_encode_seconds_per_request', stats.encode_seconds, **labels)
+        registry.observe('neo_json_decode_seconds_per_request', stats.decode_seconds, **labels)
+        start_publisher(mdb)
+        return response
+
+
+def _snapshot_key() -> str:
+    return f"{METRICS_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+def publish(mdb) -> None:
+    '''
+    Writes the snapshot of this process to the metadata database, expiring after METRICS_TTL.
+    '''
+    try:
+        mdb.set(_snapshot_key(), json.dumps(registry.snapshot()), ex=METRICS_TTL)
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"Could not publish metrics: {e}")
+
+
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+
+def start_publisher(mdb) -> None:
+    '''
+    Starts the thread that publishes this process's snapshot every METRICS_PUBLISH_SECONDS.
+    It is started on first use in each process, so gunicorn workers forked from a preloaded
+    master each get their own.
+    '''
+    global _publisher_pid
+    if _publisher_pid == os.getpid():
+        return
+    with _publisher_lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_PUBLISH_SECONDS)
+            publish(mdb)
+
+    threading.Thread(target=run, name='metrics-publisher', daemon=True).start()
+
+
+def collect(mdb) -> list:
+    '''
+    Reads the snapshots published by every process, with the live one of this process.
+
+    Returns:
+        snapshots (list): snapshot dicts, only this process's if Redis cannot be read
+    '''
+    own = _snapshot_key()
+    snapshots = [registry.snapshot()]
+    try:
+        keys = [key for key in mdb.scan_iter(match=METRICS_PREFIX + '*', count=1000)
+                if key.decode('utf-8') != own]
+        for raw in (mdb.mget(keys) if keys else []):
+            if raw is not None:
+                snapshots.append(json.loads(raw))
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"Could not read the metrics of other processes: {e}")
+    return snapshots
+
+
+def _label_text(labels: dict, extra: tuple = ()) -> str:
+    items = sorted(labels.items()) + list(extra)
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshots: list, gauges: list = ()) -> str:
+    '''
+    Sums snapshots and renders them in the Prometheus text exposition format.
+
+    Args:
+        snapshots (list): snapshot dicts from Registry.snapshot or collect
+        gauges (list): (name, labels, value) of values read when the metrics are rendered, e.g. queue depths
+    Returns:
+        text (str): the /metrics body
+    '''
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, series in snapshot.get('histograms', []):
+            if name not in METRICS or len(series) != len(METRICS[name][2]) + 2:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            total = histograms.get(key)
+            histograms[key] = list(series) if total is None else [a + b for a, b in zip(total, series)]
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_label_text(dict(labels))} {_number(value)}")
+            continue
+        if kind == 'gauge':
+            for series_name, labels, value in gauges:
+                if series_name == name:
+                    lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+            continue
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            labels = dict(labels)
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_label_text(labels, (('le', bound if bound == '+Inf' else _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_number(series[-1])}")
+            lines.append(f"{name}_count{_label_text(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,156 @@
+import math
+
+# Index of the NEO catalog by object designation, kept in the metadata database next to the
+# rollups and written by the ingest with every chunk. Designations are normalized (outer
+# parentheses dropped, spaces collapsed, upper case), so "(2020 AB)" is found as "2020 ab".
+# - OBJECT_PREFIX + designation: sorted set of the keys of the object's close approaches,
+#   scored by close-approach time, so the history of an object comes back in time order
+# - OBJECTS_KEY: every designation with score 0, so ZRANGEBYLEX finds a prefix in O(log n + k)
+OBJECT_PREFIX = "object:"
+OBJECTS_KEY = "objects"
+
+# designations deleted per command when the data is cleared
+CLEAR_BATCH_SIZE = 1000
+
+
+def normalize(designation: str) -> str:
+    '''
+    Returns the designation an object is indexed under.
+
+    Args:
+        designation (str): designation as in the csv, e.g. "(2020 AB)", or as typed by a user
+    Returns:
+        designation (str): e.g. "2020 AB"
+    '''
+    designation = ' '.join(str(designation).split())
+    if designation.startswith('(') and designation.endswith(')'):
+        designation = designation[1:-1].strip()
+    return designation.upper()
+
+
+def _designation(record) -> str:
+    designation = record.get('Object')
+    if not isinstance(designation, str) or not designation.strip():
+        return None
+    return normalize(designation)
+
+
+def queue_objects(pipe, records: list, previous: dict = None) -> list:
+    '''
+    Queues the index entries of a chunk of records on a pipeline of the metadata database.
+    Adding an entry twice changes nothing, so a replayed chunk is harmless. A key that was
+    stored under another object before is removed from that object's approaches.
+
+    Args:
+        pipe: pipeline of the metadata database
+        records (list): records of the chunk, as built by the ingest
+        previous (dict): records with the Object field the keys of the chunk held before, if any
+    Returns:
+        moved (list): designations that lost an approach, to check with prune_objects
+    '''
+    approaches = {}
+    moved = set()
+    for record in records:
+        key = record['Close-Approach (CA) Date']
+        designation = _designation(record)
+        old = _designation(previous[key]) if previous and key in previous else None
+        if old is not None and old != designation:
+            pipe.zrem(OBJECT_PREFIX + old, key)
+            moved.add(old)
+        if designation is None:
+            continue
+        epoch = record.get('Epoch')
+        # a close-approach time that could not be parsed sorts first
+        score = epoch if isinstance(epoch, (int, float)) and math.isfinite(epoch) else 0
+        approaches.setdefault(designation, {})[key] = score
+    for designation, keys in approaches.items():
+        pipe.zadd(OBJECT_PREFIX + designation, keys)
+    if approaches:
+        pipe.zadd(OBJECTS_KEY, dict.fromkeys(approaches, 0))
+    return sorted(moved - set(approaches))
+
+
+def prune_objects(mdb, designations: list) -> None:
+    '''
+    Drops the designations that have no approaches left from the prefix search, after a reload
+    moved their keys to other objects.
+
+    Args:
+        mdb: Redis client for the metadata database
+        designations (list): designations returned by queue_objects
+    '''
+    if not designations:
+        return
+    pipe = mdb.pipeline(transaction=False)
+    for designation in designations:
+        pipe.zcard(OBJECT_PREFIX + designation)
+    empty = [designation for designation, count in zip(designations, pipe.execute()) if not count]
+    if empty:
+        mdb.zrem(OBJECTS_KEY, *empty)
+
+
+def clear_objects(mdb) -> None:
+    '''
+    Deletes the object index, used when the NEO data is deleted.
+    '''
+    designations = [designation.decode('utf-8') for designation in mdb.zrange(OBJECTS_KEY, 0, -1)]
+    pipe = mdb.pipeline(transaction=False)
+    for start in range(0, len(designations), CLEAR_BATCH_SIZE):
+        pipe.delete(*(OBJECT_PREFIX + designation for designation in designations[start:start + CLEAR_BATCH_SIZE]))
+    pipe.delete(OBJECTS_KEY)
+    pipe.execute()
+
+
+def object_keys(mdb, designation: str, offset: int = 0, limit: int = None) -> tuple:
+    '''
+    Returns a page of the close approaches of one object.
+
+    Args:
+        mdb: Redis client for the metadata database
+        designation (str): designation of the object, normalized here
+        offset (int): number of approaches to skip
+        limit (int): maximum number of approaches to return, None for all
+    Returns:
+        keys (list): catalog keys of the approaches, in time order
+        total (int): number of approaches of the object, 0 if it is unknown
+    '''
+    key = OBJECT_PREFIX + normalize(designation)
+    if limit == 0:
+        # a stop of offset - 1 would be -1, the end of the set, for offset 0
+        return [], mdb.zcard(key)
+    pipe = mdb.pipeline(transaction=False)
+    pipe.zrange(key, offset, -1 if limit is None else offset + limit - 1)
+    pipe.zcard(key)
+    keys, total = pipe.execute()
+    return [key.decode('utf-8') for key in keys], total
+
+
+def _lex_range(prefix: str) -> tuple:
+    if not prefix:
+        return '-', '+'
+    # every member starting with the prefix sorts between the prefix and the prefix followed by 0xff
+    prefix = prefix.encode('utf-8')
+    return b'[' + prefix, b'[' + prefix + b'\xff'
+
+
+def search_prefix(mdb, prefix: str, offset: int = 0, limit: int = None) -> list:
+    '''
+    Returns the designations starting with a prefix and their number of close approaches.
+
+    Args:
+        mdb: Redis client for the metadata database
+        prefix (str): start of the designation, normalized here; empty for every object
+        offset (int): number of designations to skip
+        limit (int): maximum number of designations to return, None for all
+    Returns:
+        objects (list): {'object': ..., 'approaches': ...} in lexicographic order
+    '''
+    # the opening parenthesis of a designation like "(2020 AB)" is not indexed
+    low, high = _lex_range(normalize(prefix).lstrip('(') if prefix else '')
+    designations = mdb.zrangebylex(OBJECTS_KEY, low, high, start=offset, num=-1 if limit is None else limit)
+    designations = [designation.decode('utf-8') for designation in designations]
+    pipe = mdb.pipeline(transaction=False)
+    for designation in designations:
+        pipe.zcard(OBJECT_PREFIX + designation)
+    return [{'object': designation, 'approaches': count} for designation, count in zip(designations, pipe.execute())]
+
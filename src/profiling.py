@@ -0,0 +1,90 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from flask import g, request
+
+# Opt-in cProfile of single requests. With PROFILE_REQUESTS=1 a request with ?profile=1 is
+# profiled and answered with the profile report instead of its body. PROFILE_SAMPLE_RATE
+# profiles that fraction of all requests without changing their response. Every profile is
+# written to PROFILE_DIR as a .prof file (open with snakeviz or pstats) and summarized in the log.
+
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/neo-profiles")
+# number of functions listed in the report
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "30"))
+
+# only one profiler can run at a time in a process, requests arriving meanwhile are not profiled
+_active = threading.Lock()
+
+
+def report(profile: cProfile.Profile, top: int = PROFILE_TOP) -> str:
+    '''
+    Returns the functions of a profile with the highest cumulative time as text.
+    '''
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(top)
+    return out.getvalue()
+
+
+def _wanted() -> tuple:
+    if PROFILE_REQUESTS and request.args.get('profile') == '1':
+        return True, True
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True, False
+    return False, False
+
+
+def profile_requests(app) -> None:
+    '''
+    Registers the hooks that profile requests as configured by PROFILE_REQUESTS and
+    PROFILE_SAMPLE_RATE. Register it after the other hooks so the profile covers the view and
+    the after_request hooks of the app run outside it.
+
+    Args:
+        app (Flask): the app
+    '''
+    if not PROFILE_REQUESTS and PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    @app.before_request
+    def _start_profile():
+        wanted, explicit = _wanted()
+        if not wanted or not _active.acquire(blocking=False):
+            return
+        g.profile = cProfile.Profile()
+        g.profile_explicit = explicit
+        g.profile.enable()
+
+    @app.after_request
+    def _stop_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        try:
+            profile.disable()
+        finally:
+            _active.release()
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        name = f"{route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'}-{time.time_ns()}.prof"
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError as e:
+            logging.warning(f"Could not write profile {path}: {e}")
+            path = None
+        text = report(profile)
+        logging.info(f"Profile of {request.method} {request.full_path} written to {path}\n{text}")
+
+        if g.pop('profile_explicit', False):
+            response = app.response_class(text, mimetype='text/plain')
+        if path is not None:
+            response.headers['X-Profile-File'] = path
+        return response
@@ -0,0 +1,320 @@
+import operator
+import re
+from datetime import datetime
+import numpy as np
+from catalog import FIELD_ALIASES, MONTHS, resolve_fields
+from columns import NUMERIC_FIELDS, STORED_NUMERIC_FIELDS, close_distance
+from utils import parse_date, parse_timestamps, to_epoch
+
+# The query logic behind the /data and /now routes. The functions only work on a columnar table
+# or keys that were already loaded, so the Flask app (NEO_api.py) and the async app (async_api.py)
+# share them. The routes filter the whole catalog on the table (the *_rows functions); the fields
+# the client asked for are then loaded for the selected page of keys only.
+
+def _int_arg(args, name: str, default):
+    value = args.get(name)
+    if value is None:
+        return default
+    if not value.isnumeric():
+        raise ValueError(f"Invalid {name} entered: {value}")
+    return int(value)
+
+
+def parse_projection(args) -> tuple:
+    '''
+    Parses the fields=, offset= and limit= query parameters shared by the query routes.
+
+    Args:
+        args (MultiDict): query arguments
+    Returns:
+        fields (list): stored field names to return, None for all
+        offset (int): number of matching NEOs to skip
+        limit (int): maximum number of NEOs to return, None for no limit
+    Raises:
+        ValueError: if a parameter is invalid
+    '''
+    fields = args.get('fields')
+    fields = resolve_fields(fields.split(',')) if fields else None
+    return fields, _int_arg(args, 'offset', 0), _int_arg(args, 'limit', None)
+
+
+def distance_rows(table, min_dist: float = None, max_dist: float = None) -> tuple:
+    '''
+    Returns the rows of the columnar table whose close-approach distance is between the optional
+    bounds. The nominal distance is used, or the minimum one where the nominal distance is missing or 0.
+
+    Args:
+        table (Table): columnar table of the catalog
+        min_dist (float): minimum distance in AU
+        max_dist (float): maximum distance in AU
+    Returns:
+        rows (ndarray): matching rows, in time order
+        distances (ndarray): their distances in AU
+    '''
+    distance = close_distance(table.columns)
+    keep = ~np.isnan(distance)
+    if min_dist is not None:
+        keep &= distance >= min_dist
+    if max_dist is not None:
+        keep &= distance <= max_dist
+    rows = np.flatnonzero(keep)
+    return rows, distance[rows]
+
+
+def distance_results(keys: list, distances, objects: dict) -> list:
+    '''
+    Returns the entries of /data/distance_query for a page of distance_rows.
+
+    Args:
+        keys (list): keys of the page
+        distances (ndarray): their distances
+        objects (dict): records with the Object field of the page, keyed by close-approach date
+    Returns:
+        results (list): {'date', 'object', 'distance_au'} per NEO
+    '''
+    return [{'date': key, 'object': objects.get(key, {}).get('Object', 'Unknown'), 'distance_au': float(distance)}
+            for key, distance in zip(keys, distances)]
+
+
+def velocity_rows(table, min_velocity: float, max_velocity: float) -> np.ndarray:
+    '''
+    Returns the rows of the columnar table whose relative velocity is within the range, in time order.
+    '''
+    velocity = table.columns['V relative(km/s)']
+    return np.flatnonzero((velocity >= min_velocity) & (velocity <= max_velocity))
+
+
+def diameter_rows(table, max_diameter: float) -> np.ndarray:
+    '''
+    Returns the rows of the columnar table whose maximum diameter is at most the given value, in
+    time order. A diameter of 0 counts as unknown.
+    '''
+    diameter = table.columns['Maximum Diameter']
+    return np.flatnonzero((diameter != 0) & (diameter <= max_diameter))
+
+
+def biggest_rows(table, num_neo: int) -> np.ndarray:
+    '''
+    Returns the rows of the columnar table with the lowest H magnitude, biggest first.
+    NEOs without one come last, and ties are in time order.
+
+    Args:
+        table (Table): columnar table of the catalog
+        num_neo (int): number of NEOs to return
+    Returns:
+        rows (ndarray): rows of the biggest NEOs
+    '''
+    if num_neo <= 0:
+        return np.empty(0, dtype=np.intp)
+    magnitude = table.columns['H(mag)']
+    magnitude = np.where(np.isnan(magnitude), np.inf, magnitude)
+    rows = np.arange(len(magnitude))
+    if num_neo < len(magnitude):
+        # every row tied with the last one kept, so ties are broken by time order below
+        rows = np.flatnonzero(magnitude <= np.partition(magnitude, num_neo - 1)[num_neo - 1])
+    return rows[np.lexsort((rows, magnitude[rows]))][:num_neo]
+
+
+def timeliest_keys(keys: list, num_neo: int, current_time: datetime) -> list:
+    '''
+    Returns the keys of the NEOs that approach soonest after the given time. Only the keys
+    are needed since they are the close-approach timestamps, and they are parsed all at once.
+
+    Args:
+        keys (list): close-approach date keys
+        num_neo (int): number of NEOs to return
+        current_time (datetime): naive UTC time to compare against
+    Returns:
+        pairs (list): (cleaned timestamp without the uncertainty part, key) pairs, soonest first
+    '''
+    keys = np.asarray(keys, dtype=object)
+    epoch, _ = parse_timestamps(keys)
+    # if date of timestamp is greater than current time, keep it (NaN never is)
+    future = np.flatnonzero(epoch >= to_epoch(current_time))
+    if num_neo < len(future):
+        future = future[np.argpartition(epoch[future], num_neo)[:num_neo]]
+    # sort the kept keys by timestamp, ties in key order
+    future = future[np.lexsort((keys[future].astype(str), epoch[future]))]
+    return [(key.split("\\")[0].split('±')[0].rstrip(), key) for key in keys[future]]
+
+
+# comparison operators of the where= parameter of /data/query, longest first for the regex
+OPERATORS = {'<=': operator.le, '>=': operator.ge, '!=': operator.ne,
+             '=': operator.eq, '<': operator.lt, '>': operator.gt}
+CLAUSE = re.compile(r'^\s*(.+?)\s*(<=|>=|!=|=|<|>)\s*(.+?)\s*$')
+# columns of the table that are not stored fields
+PERIOD_COLUMNS = ['date', 'year', 'month']
+AGGREGATES = ['count', 'sum', 'mean', 'min', 'max']
+GROUPS = ['year', 'month']
+_SHORT_NAMES = {field: alias for alias, field in FIELD_ALIASES.items()}
+
+
+def _numeric_column(name: str) -> str:
+    name = name.strip()
+    if name.lower() in PERIOD_COLUMNS:
+        return name.lower()
+    field = resolve_fields([name])[0]
+    if field not in NUMERIC_FIELDS:
+        raise ValueError(f"Field is not numeric: {name}")
+    return field
+
+
+def parse_query(args) -> dict:
+    '''
+    Parses the parameters of /data/query into a plan.
+
+    where: comma separated clauses such as velocity>10,h<=22,date>=2025-Jan-01 that must
+        all hold. Any numeric field (or its alias) can be compared, as well as date, year and month.
+    sort: column to order by, prefixed with - for descending. Defaults to date.
+    group: year or month, to return aggregates per period instead of records.
+    agg: comma separated aggregates such as count,mean:velocity,max:h. Defaults to count.
+    fields, offset, limit: as for the other query routes.
+
+    Args:
+        args (MultiDict): query arguments
+    Returns:
+        plan (dict): parsed parameters
+    Raises:
+        ValueError: if a parameter is invalid
+    '''
+    fields, offset, limit = parse_projection(args)
+    plan = {'where': [], 'sort': 'date', 'descending': False, 'group': None, 'aggs': [],
+            'fields': fields, 'offset': offset, 'limit': limit}
+
+    for clause in filter(None, args.get('where', '').split(',')):
+        match = CLAUSE.match(clause)
+        if match is None:
+            raise ValueError(f"Invalid clause: {clause}")
+        name, op, value = match.groups()
+        column = _numeric_column(name)
+        if column == 'date':
+            # compared as YYYYMMDD numbers
+            value = float(parse_date(value).strftime('%Y%m%d'))
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"Invalid value in clause: {clause}")
+        plan['where'].append((column, op, value))
+
+    sort = args.get('sort')
+    if sort:
+        plan['descending'] = sort.startswith('-')
+        plan['sort'] = _numeric_column(sort.lstrip('-'))
+
+    group = args.get('group')
+    if group:
+        if group not in GROUPS:
+            raise ValueError(f"Invalid group: {group}")
+        plan['group'] = group
+        for spec in (args.get('agg') or 'count').split(','):
+            name, _, field = spec.partition(':')
+            if name not in AGGREGATES:
+                raise ValueError(f"Invalid aggregate: {spec}")
+            if name == 'count':
+                plan['aggs'].append(('count', None))
+            elif not field:
+                raise ValueError(f"Aggregate needs a field: {spec}")
+            else:
+                plan['aggs'].append((name, _numeric_column(field)))
+    return plan
+
+
+def plan_fields(plan: dict) -> list:
+    '''
+    Returns the stored numeric fields the filter, sort and aggregates of a plan read.
+    '''
+    columns = [column for column, _, _ in plan['where']] + [plan['sort']] + [column for _, column in plan['aggs']]
+    return [field for field in STORED_NUMERIC_FIELDS if field in columns]
+
+
+def _column(table, column: str) -> np.ndarray:
+    if column == 'date':
+        return table.date_number()
+    if column == 'year':
+        return table.year
+    if column == 'month':
+        return table.month
+    return table.columns[column]
+
+
+def select(table, plan: dict) -> np.ndarray:
+    '''
+    Runs the filter and sort of a plan over the columnar table in one pass.
+
+    Args:
+        table (Table): numeric columns of the catalog
+        plan (dict): plan from parse_query
+    Returns:
+        rows (ndarray): indices of the matching rows in result order
+    '''
+    mask = np.ones(len(table), dtype=bool)
+    for column, op, value in plan['where']:
+        # NaN compares false, so NEOs missing the field never match a bound
+        mask &= OPERATORS[op](_column(table, column), value)
+    rows = np.flatnonzero(mask)
+
+    if plan['sort'] == 'date':
+        # the table is already in close-approach order
+        return rows[::-1] if plan['descending'] else rows
+    values = _column(table, plan['sort'])[rows]
+    # a stable sort keeps ties in time order, and NaN sorts last either way
+    order = np.argsort(-values if plan['descending'] else values, kind='stable')
+    return rows[order]
+
+
+def _group_min_max(values, valid, inverse, size, ufunc, start) -> np.ndarray:
+    out = np.full(size, start)
+    ufunc.at(out, inverse[valid], values[valid])
+    out[np.isinf(out)] = np.nan
+    return out
+
+
+def aggregate(table, rows: np.ndarray, plan: dict) -> list:
+    '''
+    Computes the aggregates of a plan for the selected rows, grouped by year or month.
+
+    Args:
+        table (Table): numeric columns of the catalog
+        rows (ndarray): selected row indices
+        plan (dict): plan from parse_query with a group
+    Returns:
+        groups (list): one dictionary per period in time order, e.g.
+            {'period': '2025-Jan', 'count': 12, 'mean_velocity': 9.8}
+    '''
+    if plan['group'] == 'year':
+        periods = table.year[rows]
+    else:
+        periods = table.year[rows] * 100 + table.month[rows]
+    codes, inverse = np.unique(periods, return_inverse=True)
+    size = len(codes)
+
+    if plan['group'] == 'year':
+        labels = [str(code) for code in codes]
+    else:
+        labels = [f"{code // 100}-{MONTHS[code % 100 - 1]}" for code in codes]
+    groups = [{'period': label} for label in labels]
+
+    for name, column in plan['aggs']:
+        if name == 'count':
+            result = np.bincount(inverse, minlength=size)
+            key = 'count'
+        else:
+            values = _column(table, column)[rows].astype(np.float64)
+            valid = ~np.isnan(values)
+            sums = np.bincount(inverse, weights=np.where(valid, values, 0.0), minlength=size)
+            if name == 'sum':
+                result = sums
+            elif name == 'mean':
+                counts = np.bincount(inverse, weights=valid, minlength=size)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = sums / counts
+            elif name == 'min':
+                result = _group_min_max(values, valid, inverse, size, np.minimum, np.inf)
+            else:
+                result = _group_min_max(values, valid, inverse, size, np.maximum, -np.inf)
+            key = f"{name}_{_SHORT_NAMES.get(column, column)}"
+        for group, value in zip(groups, result.tolist()):
+            # periods without a value for the field have no mean, min or max
+            group[key] = None if value != value else value
+    return groups
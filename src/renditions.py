@@ -0,0 +1,99 @@
+import io
+import logging
+import os
+
+# The worker saves each plot in several renditions from the one drawn figure, and /results serves
+# the one a client asks for with ?size=, so a dashboard listing many jobs can show small previews
+# without downloading the full images. Each rendition is one key in the results database.
+# name: (format, dots per inch, colors of the palette the image is reduced to, None to keep them all)
+RENDITIONS = {'thumb': ('png', 24, 32),
+              'standard': ('png', 100, None),
+              'hidpi': ('png', 200, None),
+              'svg': ('svg', None, None)}
+# served when no size is asked for; it is the image /results always served
+DEFAULT_RENDITION = 'standard'
+MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def _configured(value: str) -> list:
+    names = []
+    for name in (name.strip() for name in value.split(',')):
+        if name in RENDITIONS and name not in names:
+            names.append(name)
+        elif name:
+            logging.warning(f"Ignoring unknown plot rendition {name!r}, known: {', '.join(RENDITIONS)}")
+    # /results tells a job without a result from one without the asked rendition by the default one
+    if DEFAULT_RENDITION not in names:
+        names.append(DEFAULT_RENDITION)
+    return names
+
+
+# renditions the worker saves; svg is off by default since a scatter plot of a busy month makes a large file
+PLOT_RENDITIONS = _configured(os.environ.get("PLOT_RENDITIONS", "thumb,standard,hidpi"))
+
+
+def rendition_key(jobid: str, name: str) -> str:
+    '''
+    Returns the key of a rendition of a job's plot in the results database. The default rendition
+    keeps the key the plot always had, so the results of older jobs are still served.
+    '''
+    if name == DEFAULT_RENDITION:
+        return f"{jobid}_output_plot"
+    return f"{jobid}_output_plot_{name}"
+
+
+def _reduce_palette(image: bytes, colors: int) -> bytes:
+    from PIL import Image
+    reduced = Image.open(io.BytesIO(image)).convert('RGB').quantize(colors)
+    out = io.BytesIO()
+    reduced.save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+
+def render(figure, names: list = None) -> dict:
+    '''
+    Saves a drawn figure in each rendition. The plot is built once per job; only the saving is
+    repeated for each rendition.
+
+    Args:
+        figure: matplotlib figure
+        names (list): renditions to save, PLOT_RENDITIONS by default
+    Returns:
+        images (dict): file bytes keyed by rendition name
+    '''
+    images = {}
+    for name in PLOT_RENDITIONS if names is None else names:
+        file_format, dpi, colors = RENDITIONS[name]
+        out = io.BytesIO()
+        figure.savefig(out, format=file_format, dpi=dpi or 'figure')
+        images[name] = out.getvalue() if colors is None else _reduce_palette(out.getvalue(), colors)
+    return images
+
+
+def store(rdb, jobid: str, images: dict) -> None:
+    '''
+    Stores the renditions of a job's plot in the results database with one round trip.
+
+    Args:
+        rdb: Redis client for the results database
+        jobid (str): id of the job
+        images (dict): file bytes keyed by rendition name, from render
+    '''
+    pipe = rdb.pipeline(transaction=False)
+    for name, image in images.items():
+        pipe.set(rendition_key(jobid, name), image)
+    pipe.execute()
+
+
+def mimetype(name: str) -> str:
+    '''
+    Returns the content type of a rendition.
+    '''
+    return MIMETYPES[RENDITIONS[name][0]]
+
+
+def extension(name: str) -> str:
+    '''
+    Returns the file extension of a rendition.
+    '''
+    return RENDITIONS[name][0]
@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+import time
+import redis
+import metrics
+from catalog import get_data_version
+
+# Read-only catalog traffic can be spread over replicas of the primary Redis (REDIS_REPLICAS in
+# connections.py). Writes never go to a replica. A replica copies every database of the primary,
+# the data version in the metadata database included, and applies the writes in the order the
+# primary made them. So a replica that reports the primary's data version holds all of that
+# version's data, and one that reports an older version is still catching up with a reload or a
+# delete; it is skipped until it has caught up. Without a usable replica, reads go to the primary.
+
+# how long a replica known to be at the current data version is used before it is asked again;
+# the check doubles as its health check
+REPLICA_CHECK_SECONDS = float(os.environ.get("REPLICA_CHECK_SECONDS", "1"))
+# how long an unreachable replica is left out before it is tried again
+REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", "5"))
+
+
+class Replica:
+    '''
+    One replica and what the router last learned about it.
+
+    Args:
+        name (str): "host:port" of the replica, used in logs and metrics
+        catalog: Redis client for the NEO database of the replica
+        meta: Redis client for the metadata database of the replica
+    '''
+
+    def __init__(self, name: str, catalog, meta):
+        self.name = name
+        self.catalog = catalog
+        self.meta = meta
+        self.version = None
+        self.checked = 0.0
+        self.down_until = 0.0
+
+
+class Reader:
+    '''
+    Client for the catalog reads of one request or job. The replica or primary is picked on the
+    first command and kept, so every command of the reader sees the same copy of the data. A
+    replica that fails a read is left out like one that fails its check, and the read and the
+    ones after it go to the primary.
+    '''
+
+    def __init__(self, router):
+        self._router = router
+        self._replica = None
+        self._client = None
+
+    def _failover(self, error: Exception):
+        replica = self._replica
+        logging.warning(f"Read from replica {replica.name} failed, leaving it out for {REPLICA_RETRY_SECONDS:g} s: {error}")
+        replica.version = None
+        replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        metrics.registry.inc('neo_catalog_reads_total', target='primary')
+        self._replica, self._client = None, self._router.primary
+
+    def _call(self, name: str, args: tuple, kwargs: dict):
+        if self._replica is None:
+            return getattr(self._client, name)(*args, **kwargs)
+        try:
+            result = getattr(self._client, name)(*args, **kwargs)
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            self._failover(e)
+            return getattr(self._client, name)(*args, **kwargs)
+        if name == 'pipeline':
+            return _Pipeline(self, result, args, kwargs)
+        return result
+
+    def __getattr__(self, name):
+        if self._client is None:
+            self._replica, self._client = self._router._pick()
+        if not callable(getattr(self._client, name)):
+            return getattr(self._client, name)
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
+
+
+class _Pipeline:
+    # pipeline of a Reader on a replica; its commands are recorded so they can be sent again to
+    # the primary when the replica fails the execute
+    def __init__(self, reader: Reader, pipe, args: tuple, kwargs: dict):
+        self._reader = reader
+        self._pipe = pipe
+        self._args = args
+        self._kwargs = kwargs
+        self._commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            getattr(self._pipe, name)(*args, **kwargs)
+            return self
+        return command
+
+    def execute(self):
+        try:
+            return self._pipe.execute()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            if self._reader._replica is not None:
+                self._reader._failover(e)
+            pipe = self._reader._client.pipeline(*self._args, **self._kwargs)
+            for name, args, kwargs in self._commands:
+                getattr(pipe, name)(*args, **kwargs)
+            return pipe.execute()
+
+
+class ReplicaRouter:
+    '''
+    Sends read-only catalog access round-robin to the replicas that are reachable and at the
+    data version of the primary, and to the primary when there is none.
+
+    Args:
+        primary: catalog client of the primary (a Redis client or a ShardedCatalog)
+        mdb: Redis client for the metadata database of the primary
+        replicas (list): Replica for every replica, empty to always read from the primary
+    '''
+
+    def __init__(self, primary, mdb, replicas: list):
+        self.primary = primary
+        self.mdb = mdb
+        self.replicas = replicas
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _usable(self, replica: Replica, version: int, now: float) -> bool:
+        if now < replica.down_until:
+            return False
+        if replica.version == version and now - replica.checked < REPLICA_CHECK_SECONDS:
+            return True
+        try:
+            replica.version = get_data_version(replica.meta)
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            logging.warning(f"Replica {replica.name} is unreachable, leaving it out for {REPLICA_RETRY_SECONDS:g} s: {e}")
+            replica.version = None
+            replica.down_until = now + REPLICA_RETRY_SECONDS
+            return False
+        replica.checked = now
+        if replica.version != version:
+            logging.debug(f"Replica {replica.name} is at data version {replica.version}, the primary at {version}")
+        return replica.version == version
+
+    def _pick(self) -> tuple:
+        if not self.replicas:
+            return None, self.primary
+        version = get_data_version(self.mdb)
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._usable(replica, version, now):
+                metrics.registry.inc('neo_catalog_reads_total', target=replica.name)
+                return replica, replica.catalog
+        metrics.registry.inc('neo_catalog_reads_total', target='primary')
+        return None, self.primary
+
+    def pick(self):
+        '''
+        Returns the client the next catalog read should use.
+
+        Returns:
+            client: catalog client of a replica at the current data version, or of the primary
+        '''
+        return self._pick()[1]
+
+    def reader(self) -> Reader:
+        '''
+        Returns a Reader over this router. Picking waits for the first command, so a request
+        answered from a cache does not read the data version for nothing.
+        '''
+        return Reader(self)
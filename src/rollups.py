@@ -0,0 +1,341 @@
+import math
+import re
+from datetime import datetime
+import numpy as np
+from catalog import FIELD_ALIASES, MONTHS, load_keys, load_records
+from columns import NUMERIC_FIELDS
+
+# Monthly rollups of the numeric fields, kept in the metadata database and updated by every
+# ingest chunk. A record written over a stored one with other values is taken out of the
+# rollups with its old values and added with the new ones. Each month is a hash "rollup:YYYY-MM" holding the NEO count and, per column,
+# the number of values, their sum, sum of squares, min, max and fixed-bin histogram counts.
+# A sorted set indexes the months by YYYYMM so a date window is a range of buckets.
+
+ROLLUP_PREFIX = "rollup:"
+PERIODS_KEY = "rollup:periods"
+
+COLUMNS = {field: alias for alias, field in FIELD_ALIASES.items() if field in NUMERIC_FIELDS}
+
+# fixed bin edges per column; values outside the edges are counted in the first or last bin
+_DISTANCE_EDGES = np.linspace(0, 0.05, 21)
+_VELOCITY_EDGES = np.linspace(0, 50, 21)
+_DIAMETER_EDGES = np.logspace(-3, 4, 15)
+BIN_EDGES = {'distance': _DISTANCE_EDGES,
+             'distance_min': _DISTANCE_EDGES,
+             'velocity': _VELOCITY_EDGES,
+             'v_infinity': _VELOCITY_EDGES,
+             'h': np.linspace(10, 35, 26),
+             'min_diameter': _DIAMETER_EDGES,
+             'max_diameter': _DIAMETER_EDGES,
+             'rarity': np.arange(-0.5, 9.5, 1.0),
+             'uncertainty': np.logspace(0, 5, 11)}
+
+
+def period_of(key: str) -> str:
+    """Returns the "YYYY-MM" month of a close-approach date key."""
+    return f"{key[:4]}-{MONTHS.index(key[5:8]) + 1:02d}"
+
+
+def bin_index(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Returns the histogram bin of each value, clipped into the first and last bin."""
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def rollup_delta(records: dict) -> dict:
+    '''
+    Computes the rollup increments of a batch of records.
+
+    Args:
+        records (dict): records keyed by close-approach date
+    Returns:
+        delta (dict): per "YYYY-MM" month, a dict of counts, sums, sums of squares, min, max
+            and histogram bin counts named like "velocity:sum" or "h:bin:12"
+    '''
+    if not records:
+        return {}
+    # imported here so API processes, which only read the rollups, start without pandas
+    import pandas as pd
+    frame = pd.DataFrame.from_dict(records, orient='index')
+    frame = frame.reindex(columns=NUMERIC_FIELDS).apply(pd.to_numeric, errors='coerce')
+    periods = pd.Series([period_of(key) for key in frame.index], index=frame.index)
+
+    delta = {period: {'count': int(count)} for period, count in periods.value_counts().items()}
+    for field, alias in COLUMNS.items():
+        values = frame[field]
+        valid = values.notna()
+        if not valid.any():
+            continue
+        values = values[valid]
+        groups = values.groupby(periods[valid])
+        stats = groups.agg(['count', 'sum', 'min', 'max'])
+        stats['sumsq'] = (values ** 2).groupby(periods[valid]).sum()
+        for period, row in stats.iterrows():
+            bucket = delta[period]
+            bucket[f'{alias}:n'] = int(row['count'])
+            bucket[f'{alias}:sum'] = float(row['sum'])
+            bucket[f'{alias}:sumsq'] = float(row['sumsq'])
+            bucket[f'{alias}:min'] = float(row['min'])
+            bucket[f'{alias}:max'] = float(row['max'])
+
+        bins = pd.Series(bin_index(values.to_numpy(), BIN_EDGES[alias]), index=values.index)
+        for (period, index), count in bins.groupby([periods[valid], bins]).size().items():
+            delta[period][f'{alias}:bin:{index}'] = int(count)
+    return delta
+
+
+def _numbers(record) -> tuple:
+    # the numeric values of a record as rollup_delta reads them, None for missing ones
+    values = []
+    for field in NUMERIC_FIELDS:
+        try:
+            value = float(record.get(field))
+        except (TypeError, ValueError):
+            value = math.nan
+        values.append(None if math.isnan(value) else value)
+    return tuple(values)
+
+
+def rollup_changes(records: dict, previous: dict) -> tuple:
+    '''
+    Computes the rollup updates of writing records over the stored ones. Records whose numeric
+    values are the ones stored change nothing, so loading the same file twice counts no NEO twice.
+
+    Args:
+        records (dict): records about to be written, keyed by close-approach date
+        previous (dict): the stored records of the keys that already exist, with their numeric fields
+    Returns:
+        added (dict): rollup_delta of the records that are new or whose values changed
+        removed (dict): rollup_delta of the stored records they replace
+    '''
+    changed = {key: record for key, record in records.items()
+               if key not in previous or _numbers(record) != _numbers(previous[key])}
+    return rollup_delta(changed), rollup_delta({key: dict(previous[key]) for key in changed if key in previous})
+
+
+def subtract_bucket(bucket: dict, removed: dict) -> tuple:
+    '''
+    Takes the values of overwritten records out of the stored bucket of their month. Counts,
+    sums and histogram bins are subtracted. A min or max cannot be, so the columns whose
+    extreme may have been a removed value are returned to be read again.
+
+    Args:
+        bucket (dict): stored fields of the month
+        removed (dict): rollup_delta of the overwritten records of the month
+    Returns:
+        bucket (dict): the fields of the month without the removed values
+        stale (set): aliases of the columns whose min and max must be read again
+    '''
+    subtracted = dict(bucket)
+    stale = set()
+    for name, value in removed.items():
+        old = subtracted.get(name)
+        if old is None:
+            continue
+        if name.endswith(':min'):
+            if value <= old:
+                stale.add(name.split(':')[0])
+        elif name.endswith(':max'):
+            if value >= old:
+                stale.add(name.split(':')[0])
+        else:
+            subtracted[name] = old - value
+    # a bin or a column left without values is dropped, as if it had never had any
+    emptied = {name.split(':')[0] for name, value in subtracted.items() if name.endswith(':n') and not value}
+    subtracted = {name: value for name, value in subtracted.items()
+                  if name.split(':')[0] not in emptied and not (':bin:' in name and not value)}
+    return subtracted, stale - emptied
+
+
+def month_extremes(rd, period: str, aliases: set, records: dict) -> dict:
+    '''
+    Reads the min and max of columns over the stored records of one month, with the values of
+    the records about to be written in place of the stored ones.
+
+    Args:
+        rd: Redis client for the NEO database
+        period (str): "YYYY-MM" month
+        aliases (set): short names of the columns
+        records (dict): records about to be written, keyed by close-approach date
+    Returns:
+        extremes (dict): fields like "h:min" and "h:max" of the columns that have values
+    '''
+    fields = [field for field, alias in COLUMNS.items() if alias in aliases]
+    year, month = period.split('-')
+    keys = [key for key in load_keys(rd, f"{year}-{MONTHS[int(month) - 1]}-*") if key not in records]
+    month_records = {key: dict(record) for key, record in load_records(rd, fields=fields, keys=keys).items()}
+    month_records.update((key, record) for key, record in records.items() if period_of(key) == period)
+    delta = rollup_delta(month_records).get(period, {})
+    return {name: value for name, value in delta.items()
+            if name.endswith((':min', ':max')) and name.split(':')[0] in aliases}
+
+
+def merge_bucket(bucket: dict, delta: dict) -> dict:
+    '''
+    Adds the increments of one month to its stored bucket.
+
+    Args:
+        bucket (dict): stored fields of the month, empty if it has none yet
+        delta (dict): increments of the month from rollup_delta
+    Returns:
+        merged (dict): the new fields of the month
+    '''
+    merged = dict(bucket)
+    for name, value in delta.items():
+        old = merged.get(name)
+        if old is None:
+            merged[name] = value
+        elif name.endswith(':min'):
+            merged[name] = min(old, value)
+        elif name.endswith(':max'):
+            merged[name] = max(old, value)
+        else:
+            merged[name] = old + value
+    return merged
+
+
+def queue_rollup(mdb, pipe, delta: dict, removed: dict = None, extremes=None) -> None:
+    '''
+    Queues the update of the buckets touched by a delta on a pipeline of the metadata database.
+    The buckets are read, merged and written back whole, one HSET per month, which is safe
+    because only one ingest runs at a time.
+
+    Args:
+        mdb: Redis client for the metadata database, to read the stored buckets
+        pipe: pipeline (usually a transaction) of the metadata database
+        delta (dict): increments from rollup_delta
+        removed (dict): rollup_delta of overwritten records, taken out before the delta is added
+        extremes: called with a month and the aliases of the columns whose min and max are
+            stale after the removal; returns their fields, e.g. with month_extremes
+    '''
+    removed = removed or {}
+    periods = list(dict.fromkeys([*removed, *delta]))
+    reads = mdb.pipeline(transaction=False)
+    for period in periods:
+        reads.hgetall(ROLLUP_PREFIX + period)
+    for period, raw in zip(periods, reads.execute()):
+        bucket = {name.decode('utf-8'): float(value) for name, value in raw.items()}
+        bucket, stale = subtract_bucket(bucket, removed.get(period, {}))
+        for alias in stale:
+            bucket.pop(f'{alias}:min', None)
+            bucket.pop(f'{alias}:max', None)
+        bucket = merge_bucket(bucket, delta.get(period, {}))
+        if stale and extremes is not None:
+            bucket.update(extremes(period, stale))
+        # written whole, so the min and max of a column left without values are dropped
+        pipe.delete(ROLLUP_PREFIX + period)
+        pipe.hset(ROLLUP_PREFIX + period, mapping=bucket)
+    if periods:
+        pipe.zadd(PERIODS_KEY, {period: int(period.replace('-', '')) for period in periods})
+
+
+def clear_rollups(mdb) -> None:
+    '''
+    Deletes every rollup bucket, used when the NEO data is deleted.
+    '''
+    periods = [period.decode('utf-8') for period in mdb.zrange(PERIODS_KEY, 0, -1)]
+    pipe = mdb.pipeline(transaction=True)
+    for period in periods:
+        pipe.delete(ROLLUP_PREFIX + period)
+    pipe.delete(PERIODS_KEY)
+    pipe.execute()
+
+
+def parse_period(value: str, end: bool = False) -> int:
+    '''
+    Parses a window bound given as a year ("2025") or a month ("2025-Jan").
+
+    Args:
+        value (str): the bound
+        end (bool): whether it is the end of the window, so a year means its December
+    Returns:
+        period (int): the month as YYYYMM
+    Raises:
+        ValueError: if the bound is not a year or a month
+    '''
+    value = value.strip()
+    if re.fullmatch(r'\d{4}', value):
+        return int(value) * 100 + (12 if end else 1)
+    try:
+        month = datetime.strptime(value, "%Y-%b")
+    except ValueError:
+        raise ValueError(f"Invalid period: {value} (use YYYY or YYYY-Mon)")
+    return month.year * 100 + month.month
+
+
+def load_buckets(mdb, start: int = None, end: int = None) -> dict:
+    '''
+    Reads the rollup buckets of the months in a window.
+
+    Args:
+        mdb: Redis client for the metadata database
+        start (int): first month as YYYYMM, None for no bound
+        end (int): last month as YYYYMM, None for no bound
+    Returns:
+        buckets (dict): "YYYY-MM" month to its fields, in time order
+    '''
+    periods = [period.decode('utf-8') for period in
+               mdb.zrangebyscore(PERIODS_KEY, '-inf' if start is None else start, '+inf' if end is None else end)]
+    pipe = mdb.pipeline(transaction=False)
+    for period in periods:
+        pipe.hgetall(ROLLUP_PREFIX + period)
+    buckets = {}
+    for period, raw in zip(periods, pipe.execute()):
+        buckets[period] = {name.decode('utf-8'): float(value) for name, value in raw.items()}
+    return buckets
+
+
+def period_counts(buckets: dict, group: str = 'month') -> list:
+    '''
+    Returns the NEO count of every year or month in the buckets.
+
+    Args:
+        buckets (dict): buckets from load_buckets
+        group (str): "year" or "month"
+    Returns:
+        counts (list): {'period': ..., 'count': ...} in time order, months named like "2025-Jan"
+    '''
+    counts = {}
+    for period, bucket in buckets.items():
+        year, month = period.split('-')
+        label = year if group == 'year' else f"{year}-{MONTHS[int(month) - 1]}"
+        counts[label] = counts.get(label, 0) + int(bucket.get('count', 0))
+    return [{'period': label, 'count': count} for label, count in counts.items()]
+
+
+def column_stats(buckets: dict, alias: str, histogram: bool = True) -> dict:
+    '''
+    Combines the buckets of a window into the statistics of one column.
+
+    Args:
+        buckets (dict): buckets from load_buckets
+        alias (str): short name of the column, e.g. "velocity"
+        histogram (bool): whether to include the histogram
+    Returns:
+        stats (dict): n, mean, std, min and max, and the histogram edges and counts
+    '''
+    n = total = squares = 0.0
+    low, high = math.inf, -math.inf
+    bins = np.zeros(len(BIN_EDGES[alias]) - 1, dtype=np.int64)
+    for bucket in buckets.values():
+        count = bucket.get(f'{alias}:n', 0)
+        if not count:
+            continue
+        n += count
+        total += bucket[f'{alias}:sum']
+        squares += bucket[f'{alias}:sumsq']
+        low = min(low, bucket[f'{alias}:min'])
+        high = max(high, bucket[f'{alias}:max'])
+        if histogram:
+            for index in range(len(bins)):
+                bins[index] += int(bucket.get(f'{alias}:bin:{index}', 0))
+
+    stats = {'column': alias, 'n': int(n), 'mean': None, 'std': None, 'min': None, 'max': None}
+    if n:
+        mean = total / n
+        stats.update({'mean': mean,
+                      'std': math.sqrt(max(squares / n - mean * mean, 0.0)),
+                      'min': low,
+                      'max': high})
+    if histogram:
+        stats['histogram'] = {'edges': BIN_EDGES[alias].tolist(), 'counts': bins.tolist()}
+    return stats
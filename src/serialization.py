@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import time
+import zlib
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+import metrics
+
+# Optional fast serializer and compressors, the stdlib is used when they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+# bodies larger than this are compressed while they are being sent
+STREAM_MIN_BYTES = int(os.environ.get("STREAM_MIN_BYTES", str(1024 * 1024)))
+STREAM_CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "3"))
+
+
+def dumps(obj) -> bytes:
+    '''
+    Serializes an object to JSON bytes with orjson, or with the json module if orjson is missing.
+    Keys are kept in insertion order instead of being sorted. Inside a request the time is
+    added to the request's JSON encode time.
+
+    Args:
+        obj: object to serialize
+    Returns:
+        body (bytes): UTF-8 encoded JSON
+    '''
+    stats = metrics.current()
+    if stats is None:
+        return _encode(obj)
+    start = time.perf_counter()
+    body = _encode(obj)
+    stats.encode_seconds += time.perf_counter() - start
+    return body
+
+
+def _default(obj):
+    # objects with a public JSON shape of their own, such as catalog.NEORecord
+    to_json = getattr(obj, 'to_json', None)
+    if to_json is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_json()
+
+
+def _encode(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def loads(data):
+    '''
+    Parses JSON text or bytes. Stored records may contain NaN, which orjson rejects,
+    so those fall back to the json module.
+    '''
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider so jsonify and returned dicts/lists use dumps above."""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def available_encodings() -> list:
+    """Content encodings this server can produce, best first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def negotiate_encoding() -> str:
+    '''
+    Picks the content encoding for the current request from its Accept-Encoding header.
+
+    Returns:
+        encoding (str): "zstd", "br" or "gzip", or None to send the body uncompressed
+    '''
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def _compressor(encoding: str):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    if encoding == 'br':
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    '''
+    Compresses a whole body with the given content encoding.
+    '''
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_stream(body: bytes, encoding: str):
+    '''
+    Compresses a body piece by piece so the first bytes go out before the whole body is compressed.
+
+    Args:
+        body (bytes): uncompressed body
+        encoding (str): content encoding
+    Yields:
+        chunk (bytes): compressed data
+    '''
+    compressor = _compressor(encoding)
+    for start in range(0, len(body), STREAM_CHUNK_BYTES):
+        piece = body[start:start + STREAM_CHUNK_BYTES]
+        chunk = compressor.process(piece) if encoding == 'br' else compressor.compress(piece)
+        if chunk:
+            yield chunk
+    yield compressor.finish() if encoding == 'br' else compressor.flush()
+
+
+def compress_response(response):
+    '''
+    after_request hook that compresses JSON and text bodies the client accepts compressed.
+    Bodies above STREAM_MIN_BYTES are compressed while they are streamed out.
+    '''
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype.startswith('text/') or response.mimetype == 'application/json')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.headers['Content-Encoding'] = encoding
+    if len(body) >= STREAM_MIN_BYTES:
+        response.response = compress_stream(body, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(body, encoding))
+    return response
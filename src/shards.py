@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from redis.crc import key_slot, REDIS_CLUSTER_HASH_SLOTS
+
+# The NEO catalog (db 0) can be split over several Redis nodes. Every key belongs to the
+# partition of its close-approach year, and a partition lives on one node: the node is chosen
+# from the Redis Cluster hash slot of the year, the slot a "{2025}" hash tag would select. The
+# keys themselves are unchanged. A year's records, and therefore /data/<year> and every job
+# over one year, stay on one node. Commands for many keys and pattern scans are sent to the
+# nodes involved at the same time and their replies merged (scatter-gather).
+
+# threads sending commands to the nodes at once, shared by every sharded client of a process
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def partition(key: str) -> str:
+    '''
+    Returns the partition of a catalog key, its close-approach year.
+    '''
+    return key[:4]
+
+
+def node_index(key: str, nodes: int) -> int:
+    '''
+    Returns the index of the node that holds a key.
+
+    Args:
+        key (str): catalog key, e.g. "2025-Jan-01 00:00 ± < 00:01"
+        nodes (int): number of nodes
+    Returns:
+        index (int): node index
+    '''
+    return key_slot(partition(key).encode('utf-8')) * nodes // REDIS_CLUSTER_HASH_SLOTS
+
+
+def _pattern_partition(pattern: str):
+    # "2025-*" names one year; a pattern with a wildcard in the year may match any node
+    year = partition(pattern)
+    if len(year) == 4 and not any(char in year for char in '*?[\\'):
+        return year
+    return None
+
+
+def _scatter(calls: list) -> list:
+    global _executor
+    if len(calls) == 1:
+        return [calls[0]()]
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='shard')
+    # each call runs in the caller's context, so its round trips count towards the request's metrics
+    futures = [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+class ShardedPipeline:
+    '''
+    Pipeline over the nodes of a ShardedCatalog. Commands are queued on the pipeline of the node
+    of their key (the first argument), and execute returns the replies in the order the commands
+    were queued.
+    '''
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._pipes = {}
+        self._order = []
+
+    def __getattr__(self, command):
+        def queue(key, *args, **kwargs):
+            index = self._catalog.index_of(key)
+            pipe = self._pipes.get(index)
+            if pipe is None:
+                pipe = self._pipes[index] = self._catalog.nodes[index].pipeline(transaction=False)
+            self._order.append((index, len(pipe)))
+            getattr(pipe, command)(key, *args, **kwargs)
+            return self
+        return queue
+
+    def __len__(self):
+        return len(self._order)
+
+    def _gather(self, replies: dict) -> list:
+        order, self._order, self._pipes = self._order, [], {}
+        return [replies[index][position] for index, position in order]
+
+    def execute(self) -> list:
+        indices = list(self._pipes)
+        replies = _scatter([self._pipes[index].execute for index in indices])
+        return self._gather(dict(zip(indices, replies)))
+
+
+class AsyncShardedPipeline(ShardedPipeline):
+    '''
+    ShardedPipeline over redis.asyncio nodes; the pipelines of the nodes are sent concurrently.
+    '''
+
+    async def execute(self) -> list:
+        indices = list(self._pipes)
+        replies = await asyncio.gather(*(self._pipes[index].execute() for index in indices))
+        return self._gather(dict(zip(indices, replies)))
+
+
+class ShardedCatalog:
+    '''
+    Stands in for the Redis client of the NEO database when the catalog is split over several
+    nodes. It has the commands the catalog code uses: pipelines, keys, dbsize, flushdb and ping.
+
+    Args:
+        nodes (list): Redis clients of the nodes, in the order of REDIS_CATALOG_NODES
+    '''
+    pipeline_class = ShardedPipeline
+
+    def __init__(self, nodes: list):
+        self.nodes = nodes
+
+    def index_of(self, key) -> int:
+        '''
+        Returns the index of the node that holds a key.
+        '''
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        return node_index(key, len(self.nodes))
+
+    def nodes_for(self, pattern: str) -> list:
+        '''
+        Returns the nodes that can hold keys matching a pattern: the node of its year, or all of them.
+        '''
+        year = _pattern_partition(pattern)
+        if year is None:
+            return self.nodes
+        return [self.nodes[self.index_of(year)]]
+
+    def pipeline(self, transaction: bool = False) -> ShardedPipeline:
+        # a transaction cannot span nodes; the catalog code only uses plain pipelines
+        if transaction:
+            raise ValueError("Transactions are not supported on a sharded catalog")
+        return self.pipeline_class(self)
+
+    def keys(self, pattern: str = '*') -> list:
+        replies = _scatter([lambda node=node: node.keys(pattern) for node in self.nodes_for(pattern)])
+        return [key for reply in replies for key in reply]
+
+    def dbsize(self) -> int:
+        return sum(_scatter([node.dbsize for node in self.nodes]))
+
+    def flushdb(self) -> bool:
+        return all(_scatter([node.flushdb for node in self.nodes]))
+
+    def ping(self) -> bool:
+        return all(_scatter([node.ping for node in self.nodes]))
+
+
+class AsyncShardedCatalog(ShardedCatalog):
+    '''
+    ShardedCatalog over redis.asyncio nodes, used by the async API.
+    '''
+    pipeline_class = AsyncShardedPipeline
+
+    async def keys(self, pattern: str = '*') -> list:
+        replies = await asyncio.gather(*(node.keys(pattern) for node in self.nodes_for(pattern)))
+        return [key for reply in replies for key in reply]
+
+    async def dbsize(self) -> int:
+        return sum(await asyncio.gather(*(node.dbsize() for node in self.nodes)))
+
+    async def flushdb(self) -> bool:
+        return all(await asyncio.gather(*(node.flushdb() for node in self.nodes)))
+
+    async def ping(self) -> bool:
+        return all(await asyncio.gather(*(node.ping() for node in self.nodes)))
@@ -0,0 +1,268 @@
+import heapq
+import logging
+import threading
+import numpy as np
+from columns import load_table, aload_table, close_distance
+
+# Nearest-neighbor search over the features the worker plots: close-approach distance,
+# relative velocity and absolute magnitude. The features are standardized (z-scores) and put
+# in a KD-tree, so a query visits a few leaves instead of scanning the catalog. Weights are
+# applied at query time, so one tree serves every weighting.
+
+FEATURES = ['distance', 'velocity', 'h']
+LEAF_SIZE = 32
+DEFAULT_K = 10
+
+
+class KDTree:
+    """KD-tree over the rows of a 2-d array, split at the median of the widest dimension."""
+
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(points))
+        # per node: split dimension (-1 for a leaf), split value, children and row range
+        self.dim, self.split, self.left, self.right, self.start, self.end = [], [], [], [], [], []
+        if len(points):
+            self._build(points, 0, len(points))
+        # leaves are contiguous slices of the reordered points
+        self.points = points[self.index]
+
+    def _node(self, dim, split, start, end) -> int:
+        self.dim.append(dim)
+        self.split.append(split)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.dim) - 1
+
+    def _build(self, points: np.ndarray, start: int, end: int) -> int:
+        rows = self.index[start:end]
+        block = points[rows]
+        spread = block.max(axis=0) - block.min(axis=0)
+        dim = int(np.argmax(spread))
+        if end - start <= self.leaf_size or spread[dim] == 0:
+            return self._node(-1, 0.0, start, end)
+
+        middle = (end - start) // 2
+        order = np.argpartition(block[:, dim], middle)
+        self.index[start:end] = rows[order]
+        node = self._node(dim, float(points[self.index[start + middle], dim]), start, end)
+        self.left[node] = self._build(points, start, start + middle)
+        self.right[node] = self._build(points, start + middle, end)
+        return node
+
+    def _leaf_distances(self, node: int, target: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        start, end = self.start[node], self.end[node]
+        return ((self.points[start:end] - target) ** 2) @ weights
+
+    def knn(self, target: np.ndarray, k: int, weights: np.ndarray, exclude: int = None) -> list:
+        '''
+        Finds the k rows closest to target in weighted squared Euclidean distance.
+
+        Args:
+            target (ndarray): point to search around
+            k (int): number of rows to return
+            weights (ndarray): weight of each dimension
+            exclude (int): row to leave out, e.g. the NEO the search started from
+        Returns:
+            pairs (list): (squared distance, row) pairs, closest first
+        '''
+        best = []  # max-heap of (-distance, row)
+
+        def search(node, lower):
+            if len(best) == k and lower >= -best[0][0]:
+                return
+            dim = self.dim[node]
+            if dim < 0:
+                distances = self._leaf_distances(node, target, weights)
+                if len(best) == k:
+                    candidates = np.flatnonzero(distances < -best[0][0])
+                else:
+                    candidates = range(len(distances))
+                for offset in candidates:
+                    row = int(self.index[self.start[node] + offset])
+                    if row == exclude:
+                        continue
+                    item = (-float(distances[offset]), row)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                return
+            diff = target[dim] - self.split[node]
+            near, far = (self.left[node], self.right[node]) if diff < 0 else (self.right[node], self.left[node])
+            search(near, lower)
+            search(far, max(lower, weights[dim] * diff * diff))
+
+        if k > 0 and self.dim:
+            search(0, 0.0)
+        return sorted((-distance, row) for distance, row in best)
+
+    def radius(self, target: np.ndarray, radius: float, weights: np.ndarray, exclude: int = None) -> list:
+        '''
+        Finds every row within radius of target in weighted Euclidean distance.
+
+        Returns:
+            pairs (list): (squared distance, row) pairs, closest first
+        '''
+        limit = radius * radius
+        found = []
+
+        def search(node, lower):
+            if lower > limit:
+                return
+            dim = self.dim[node]
+            if dim < 0:
+                distances = self._leaf_distances(node, target, weights)
+                for offset in np.flatnonzero(distances <= limit):
+                    row = int(self.index[self.start[node] + offset])
+                    if row != exclude:
+                        found.append((float(distances[offset]), row))
+                return
+            diff = target[dim] - self.split[node]
+            near, far = (self.left[node], self.right[node]) if diff < 0 else (self.right[node], self.left[node])
+            search(near, lower)
+            search(far, max(lower, weights[dim] * diff * diff))
+
+        if self.dim:
+            search(0, 0.0)
+        return sorted(found)
+
+
+class SimilarityIndex:
+    """KD-tree over the standardized features of every NEO that has all of them."""
+
+    def __init__(self, table):
+        self.version = table.version
+        columns = table.columns
+        # the distance /data/distance_query reports, so both routes agree on every NEO
+        features = np.column_stack([close_distance(columns), columns['V relative(km/s)'], columns['H(mag)']])
+        valid = np.isfinite(features).all(axis=1)
+
+        features = features[valid]
+        self.keys = table.keys[valid]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.mean = features.mean(axis=0) if len(features) else np.zeros(len(FEATURES))
+        std = features.std(axis=0) if len(features) else np.ones(len(FEATURES))
+        self.std = np.where(std > 0, std, 1.0)
+        # standardized features in row order, the tree keeps its own reordered copy
+        self.points = (features - self.mean) / self.std
+        self.tree = KDTree(self.points)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def normalize(self, values) -> np.ndarray:
+        """Standardizes raw feature values in the order of FEATURES."""
+        return (np.asarray(values, dtype=np.float64) - self.mean) / self.std
+
+
+def _float_arg(args, name: str):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} entered: {value}")
+
+
+def parse_weights(value: str) -> np.ndarray:
+    '''
+    Parses weights=velocity:2,h:0.5 into one weight per feature, 1 for the ones not given.
+
+    Raises:
+        ValueError: if a feature or weight is invalid
+    '''
+    weights = np.ones(len(FEATURES))
+    for item in filter(None, (value or '').split(',')):
+        name, _, weight = item.partition(':')
+        if name.strip() not in FEATURES:
+            raise ValueError(f"Unknown feature: {name} (use {', '.join(FEATURES)})")
+        try:
+            weights[FEATURES.index(name.strip())] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight: {item}")
+        if weights[FEATURES.index(name.strip())] < 0:
+            raise ValueError(f"Invalid weight: {item}")
+    return weights
+
+
+def search(index: SimilarityIndex, args) -> list:
+    '''
+    Runs the k-NN or radius search described by the query parameters of /data/similar.
+
+    key: close-approach date of the NEO to search around, or
+    distance, velocity, h: feature values to search around
+    k: number of neighbors (default 10), or radius: maximum weighted distance in standard deviations
+    weights: per feature weights, e.g. velocity:2,h:0.5
+
+    Args:
+        index (SimilarityIndex): the index of the current data
+        args (MultiDict): query arguments
+    Returns:
+        neighbors (list): (key, weighted distance) pairs, closest first
+    Raises:
+        ValueError: if the parameters are invalid
+    '''
+    weights = parse_weights(args.get('weights'))
+    key = args.get('key')
+    exclude = None
+    if key:
+        if key not in index.rows:
+            raise ValueError(f"No NEO with all features at {key}")
+        exclude = index.rows[key]
+        target = index.points[exclude]
+    else:
+        values = [_float_arg(args, name) for name in FEATURES]
+        if any(value is None for value in values):
+            raise ValueError(f"Give a key or all of {', '.join(FEATURES)}")
+        target = index.normalize(values)
+
+    radius = _float_arg(args, 'radius')
+    if radius is not None:
+        pairs = index.tree.radius(target, radius, weights, exclude)
+    else:
+        k = args.get('k', str(DEFAULT_K))
+        if not k.isnumeric():
+            raise ValueError(f"Invalid k entered: {k}")
+        pairs = index.tree.knn(target, int(k), weights, exclude)
+    return [(str(index.keys[row]), float(np.sqrt(distance))) for distance, row in pairs]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def load_index(rd, mdb) -> SimilarityIndex:
+    '''
+    Returns the similarity index of the current data version, building it from the columnar
+    table the first time that version is asked for.
+    '''
+    global _index
+    table = load_table(rd, mdb)
+    with _lock:
+        if _index is not None and _index.version == table.version:
+            return _index
+        index = SimilarityIndex(table)
+        logging.info(f"Built similarity index of {len(index)} NEOs for data version {table.version}")
+        # data versions only go up, so an older kept index is replaced and a newer one is not
+        if _index is None or _index.version < index.version:
+            _index = index
+        return index
+
+
+async def aload_index(ard, amdb) -> SimilarityIndex:
+    '''
+    Async version of load_index for redis.asyncio clients.
+    '''
+    global _index
+    table = await aload_table(ard, amdb)
+    index = _index
+    if index is None or index.version != table.version:
+        index = SimilarityIndex(table)
+        with _lock:
+            if _index is None or _index.version < index.version:
+                _index = index
+    return index
@@ -1,7 +1,11 @@
-import pandas as pd
 import numpy as np
 from datetime import datetime
 
+def _missing(value) -> bool:
+    """True for None and NaN, the empty cells of a csv read by pandas (pd.isna without importing pandas)."""
+    return value is None or value != value
+
+
 def create_min_diam_column(row):
     '''
     This function extracts the minimum diameter from the diameter column
@@ -11,7 +15,7 @@ def create_min_diam_column(row):
             min (int) : The minimum diameter of the NEO
     '''
     
-    if not pd.isna(row):
+    if not _missing(row):
         if "±" in str(row):
             parts = str(row).split("±")
             max_num = parts[1].split()
@@ -35,7 +39,7 @@ def create_max_diam_column(row):
             min (int) : The maximum diameter of the NEO
     '''
     
-    if not pd.isna(row):
+    if not _missing(row):
         if "±" in str(row):
             parts = str(row).split("±")
             max_num = parts[1].split()
@@ -90,4 +94,115 @@ def parse_date(date_str: str) -> datetime:
         # logging.debug("Parsing date and converting to datetime...") 
         return datetime.strptime(date_str.strip(), "%Y-%b-%d")
     except ValueError:
-        raise ValueError(f"Unrecognized date format: {date_str}")
\ No newline at end of file
+        raise ValueError(f"Unrecognized date format: {date_str}")
+
+MONTH_ABBREVIATIONS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+# month abbreviations packed into one integer each, sorted for searchsorted
+_MONTH_CODES = np.array(sorted((ord(m[0]) << 16) | (ord(m[1]) << 8) | ord(m[2]) for m in MONTH_ABBREVIATIONS))
+_MONTH_NUMBERS = np.array([MONTH_ABBREVIATIONS.index(chr(code >> 16) + chr((code >> 8) & 255) + chr(code & 255)) + 1
+                           for code in _MONTH_CODES])
+
+
+def _digits(codes: np.ndarray, columns) -> tuple:
+    '''
+    Reads a number written in the given character columns of each row.
+
+    Returns:
+        number (ndarray): the numbers, garbage where a character is not a digit
+        ok (ndarray): whether every character was a digit
+    '''
+    number = np.zeros(len(codes), dtype=np.int64)
+    ok = np.ones(len(codes), dtype=bool)
+    for column in columns:
+        digit = codes[:, column] - 48
+        ok &= (digit >= 0) & (digit <= 9)
+        number = number * 10 + digit
+    return number, ok
+
+
+def parse_timestamp_fields(values) -> dict:
+    '''
+    Splits a whole column of CNEOS timestamps ("2025-Jan-01 00:00 ±  00:13") into numeric parts
+    in one pass. The date and time have fixed positions and the uncertainty ("HH:MM",
+    "D_HH:MM" or "< HH:MM") is read from the end of the string, so no string is split or
+    parsed on its own.
+
+    Args:
+        values (list): timestamp strings
+    Returns:
+        fields (dict): int arrays year, month, day, hour and minute, a float array uncertainty
+            in minutes (NaN when there is none) and a bool array valid
+    '''
+    strings = np.asarray(values, dtype=str)
+    count = len(strings)
+    width = max(strings.dtype.itemsize // 4, 17)
+    codes = strings.astype(f'U{width}').view(np.uint32).reshape(count, width).astype(np.int64)
+    lengths = np.char.str_len(strings) if count else np.zeros(0, dtype=np.int64)
+    rows = np.arange(count)
+
+    year, ok_year = _digits(codes, range(0, 4))
+    day, ok_day = _digits(codes, range(9, 11))
+    hour, ok_hour = _digits(codes, range(12, 14))
+    minute, ok_minute = _digits(codes, range(15, 17))
+    packed = (codes[:, 5] << 16) | (codes[:, 6] << 8) | codes[:, 7]
+    position = np.clip(np.searchsorted(_MONTH_CODES, packed), 0, len(_MONTH_CODES) - 1)
+    ok_month = _MONTH_CODES[position] == packed
+    month = np.where(ok_month, _MONTH_NUMBERS[position], 1)
+
+    valid = (ok_year & ok_day & ok_hour & ok_minute & ok_month & (lengths >= 17)
+             & (codes[:, 4] == ord('-')) & (codes[:, 8] == ord('-')) & (codes[:, 14] == ord(':'))
+             & (day >= 1) & (day <= 31) & (hour < 24) & (minute < 60))
+
+    # uncertainty, counted back from the end of the string
+    end = lengths[:, None] + np.arange(-5, 0)[None, :]
+    tail = np.take_along_axis(codes, np.clip(end, 0, width - 1), axis=1)
+    tail_hours = (tail[:, 0] - 48) * 10 + tail[:, 1] - 48
+    tail_minutes = (tail[:, 3] - 48) * 10 + tail[:, 4] - 48
+    has_uncertainty = (np.char.find(strings, '±') >= 0) & (tail[:, 2] == ord(':')) & (lengths >= 23)
+    has_uncertainty &= ((tail[:, [0, 1, 3, 4]] >= 48) & (tail[:, [0, 1, 3, 4]] <= 57)).all(axis=1)
+
+    # optional "D_" days in front of the hours
+    days = np.zeros(count, dtype=np.int64)
+    separator = codes[rows, np.clip(lengths - 6, 0, width - 1)] == ord('_')
+    scale = np.ones(count, dtype=np.int64)
+    reading = separator.copy()
+    for back in range(7, 10):
+        digit = codes[rows, np.clip(lengths - back, 0, width - 1)] - 48
+        reading &= (digit >= 0) & (digit <= 9) & (lengths - back >= 17)
+        days += np.where(reading, digit * scale, 0)
+        scale *= 10
+
+    uncertainty = np.where(has_uncertainty, days * 1440 + tail_hours * 60 + tail_minutes, np.nan)
+    return {'year': year, 'month': month, 'day': day, 'hour': hour, 'minute': minute,
+            'uncertainty': uncertainty.astype(np.float64), 'valid': valid}
+
+
+def parse_timestamps(values) -> tuple:
+    '''
+    Parses a whole column of CNEOS timestamps into epoch seconds and uncertainties.
+
+    Args:
+        values (list): timestamp strings such as "2025-Jan-01 00:00 ±  1_02:30"
+    Returns:
+        epoch (ndarray): seconds since 1970-01-01 UTC as floats, NaN for invalid timestamps
+        uncertainty (ndarray): uncertainty in minutes, NaN when there is none
+    '''
+    fields = parse_timestamp_fields(values)
+    valid = fields['valid']
+    months = np.where(valid, (fields['year'] - 1970) * 12 + fields['month'] - 1, 0)
+    first = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    next_first = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    # reject days past the end of the month, e.g. Feb-30
+    valid = valid & (fields['day'] <= next_first - first)
+
+    epoch = ((first + fields['day'] - 1) * 86400 + fields['hour'] * 3600 + fields['minute'] * 60).astype(np.float64)
+    epoch[~valid] = np.nan
+    uncertainty = np.where(valid, fields['uncertainty'], np.nan)
+    return epoch, uncertainty
+
+
+def to_epoch(moment: datetime) -> float:
+    '''
+    Converts a naive UTC datetime to epoch seconds, comparable with parse_timestamps.
+    '''
+    return (moment - datetime(1970, 1, 1)).total_seconds()
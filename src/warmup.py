@@ -0,0 +1,125 @@
+import calendar
+import logging
+import os
+from datetime import date
+import metrics
+from catalog import DATA_VERSION_KEY, MONTHS, get_data_version
+from jobs import add_job, get_job_by_id, PRIORITIES, FINISHED
+
+# The plots asked for most are the monthly scatter plots (kind 2) and the yearly hexbins (kind 1)
+# of the coming months and years. After every load of the NEO data the worker queues a low
+# priority job for each of them, so their results are ready before anyone asks. Every plot job is
+# also remembered by its parameters for the data version it was queued on, and POST /jobs with
+# the same parameters on the same data returns that job instead of drawing the plot again.
+
+# number of months, from the current one, that get a kind 2 plot after a load; 0 for none
+WARMUP_MONTHS = int(os.environ.get("WARMUP_MONTHS", "24"))
+# number of years, from the current one, that get a kind 1 hexbin after a load; 0 for none
+WARMUP_YEARS = int(os.environ.get("WARMUP_YEARS", "10"))
+# priority class of the warm-up jobs, so they only use the worker when users are not waiting
+WARMUP_PRIORITY = os.environ.get("WARMUP_PRIORITY", "low")
+if WARMUP_PRIORITY not in PRIORITIES:
+    logging.warning(f"WARMUP_PRIORITY must be one of {', '.join(PRIORITIES)}, using low")
+    WARMUP_PRIORITY = 'low'
+
+# hash of the metadata database: 'version' holds the data version of the entries, every other
+# field is "<kind>|<start>|<end>" with the id of the job queued with those parameters
+MEMO_KEY = "jobs:memo"
+# data version the warm-up jobs were last queued for
+WARMED_KEY = "jobs:warmed"
+
+# a job that ended like this is not reused; the next request queues a new one
+UNUSABLE = tuple(status for status in FINISHED if status != 'complete')
+
+
+def popular_params(today: date) -> list:
+    '''
+    Returns the parameters of the warm-up jobs.
+
+    Args:
+        today (date): the current date; the first month and year warmed are its own
+    Returns:
+        params (list): (start, end, kind) of every job, the months before the years
+    '''
+    params = []
+    for offset in range(WARMUP_MONTHS):
+        year, month = divmod(today.year * 12 + today.month - 1 + offset, 12)
+        last = calendar.monthrange(year, month + 1)[1]
+        params.append((f"{year}-{MONTHS[month]}-01", f"{year}-{MONTHS[month]}-{last:02d}", '2'))
+    for year in range(today.year, today.year + WARMUP_YEARS):
+        params.append((f"{year}-Jan-01", f"{year}-Dec-31", '1'))
+    return params
+
+
+def _field(start: str, end: str, kind: str) -> str:
+    return f"{kind}|{start}|{end}"
+
+
+def find_job(mdb, start: str, end: str, kind: str):
+    '''
+    Returns the job queued with the same parameters on the current data version.
+
+    Args:
+        mdb: Redis client for the metadata database
+        start (str): start date of the job, as given to POST /jobs
+        end (str): end date of the job
+        kind (str): kind of the job
+    Returns:
+        job (dict): the job, None if there is none or it failed, was cancelled or timed out
+    '''
+    pipe = mdb.pipeline(transaction=False)
+    pipe.hmget(MEMO_KEY, ['version', _field(start, end, kind)])
+    pipe.get(DATA_VERSION_KEY)
+    (version, jobid), current = pipe.execute()
+    if jobid is None or int(version or -1) != int(current or 0):
+        return None
+    job = get_job_by_id(jobid.decode('utf-8'))
+    if job is None or job['status'] in UNUSABLE:
+        return None
+    return job
+
+
+def remember_job(mdb, job: dict, version: int = None) -> None:
+    '''
+    Records a plot job by its parameters for the current data version. The entries of older
+    versions are dropped with the first entry of a new one.
+
+    Args:
+        mdb: Redis client for the metadata database
+        job (dict): the job, as returned by add_job
+        version (int): data version the job was queued on, read when not given
+    '''
+    version = get_data_version(mdb) if version is None else version
+    pipe = mdb.pipeline(transaction=False)
+    if int(mdb.hget(MEMO_KEY, 'version') or -1) != version:
+        pipe.delete(MEMO_KEY)
+        pipe.hset(MEMO_KEY, 'version', version)
+    pipe.hset(MEMO_KEY, _field(job['start'], job['end'], job['kind']), job['id'])
+    pipe.execute()
+
+
+def queue_warmup(mdb, today: date = None) -> list:
+    '''
+    Queues the warm-up jobs for the current data version, once per version. Parameters that
+    already have a job on this version are skipped.
+
+    Args:
+        mdb: Redis client for the metadata database
+        today (date): the current date, today by default
+    Returns:
+        jobs (list): the jobs queued
+    '''
+    version = get_data_version(mdb)
+    # the first caller for a version queues the jobs; a second worker finishing a load skips them
+    if int(mdb.set(WARMED_KEY, version, get=True) or -1) == version:
+        return []
+    queued = []
+    for start, end, kind in popular_params(today or date.today()):
+        if find_job(mdb, start, end, kind) is not None:
+            continue
+        job = add_job(start, end, kind, priority=WARMUP_PRIORITY)
+        remember_job(mdb, job, version)
+        queued.append(job)
+    metrics.registry.inc('neo_warmup_jobs_total', len(queued))
+    logging.info(f"Queued {len(queued)} warm-up jobs for data version {version}")
+    return queued
@@ -1,189 +1,477 @@
 import json
-import redis
 import logging
 import socket
 import os
-import matplotlib.pyplot as plt
-from hotqueue import HotQueue
-from jobs import update_job_status, store_job_result
-from utils import clean_to_date_only, parse_date
+import time
+from datetime import timedelta
+import numpy as np
+from jobs import (update_job_status, update_job, store_job_result, get_job_by_id, cancel_requested, JobScheduler,
+                  queue_name, queue_priority, requeue, LEGACY_QUEUE, CANCEL_PREFIX)
+from limits import job_limits, JobInterrupted, JobCancelled, JobTimedOut
+from utils import parse_date, parse_timestamps, to_epoch
+from ingest import ingest_csv
+from catalog import load_keys, chronological
+from columns import Table, load_rows, resident_table
+import metrics
+import renditions
+from warmup import queue_warmup
+from metrics import phase_timer
+from connections import (lazy_redis, lazy_catalog, read_catalog, get_queue, JOBS_DB, RESULTS_DB, META_DB,
+                         REDIS_SOCKET_TIMEOUT)
 
-REDIS_IP = os.environ.get("REDIS_IP", "redis-db")
-rd = redis.Redis(host=REDIS_IP, port=6379, db=0)
-q = HotQueue("queue", host=REDIS_IP, port=6379, db=1)
-jdb = redis.Redis(host=REDIS_IP, port=6379, db=2)
+# Redis clients, created on first use from the shared pools in connections.py
+rd = lazy_catalog()
+# chooses the priority and kind queue each batch is taken from, see jobs.py
+scheduler = JobScheduler()
+jdb = lazy_redis(JOBS_DB)
 
 # Results data base
-rdb = redis.Redis(host=REDIS_IP, port=6379, db=3)
+rdb = lazy_redis(RESULTS_DB)
+# Metadata database (ingest checkpoints)
+mdb = lazy_redis(META_DB)
 
 # Set logging
-log_level_str = os.environ.get("LOG_LEVEL", "DEBUG").upper()
+log_level_str = os.environ.get("LOG_LEVEL", "INFO").upper()
 log_level = getattr(logging, log_level_str, logging.ERROR)
 
 format_str=f'[%(asctime)s {socket.gethostname()}] %(filename)s:%(funcName)s:%(lineno)s - %(levelname)s: %(message)s'
 logging.basicConfig(level=log_level, format=format_str)
 logging.getLogger("matplotlib").setLevel(logging.WARNING)
 
+# catalog fields read by the plotting jobs
+PLOT_FIELDS = ['V relative(km/s)', 'CA DistanceNominal (au)', 'CA DistanceMinimum (au)', 'H(mag)', 'Rarity']
+# lists returned by plot_data
+PLOT_COLUMNS = ['velocities', 'distances', 'mags', 'raritys', 'days']
 
-@q.worker
-def do_work(jobid: str) -> None:
+# ids of the batch being run, so a job stuck past its hard time limit can put the others back
+_batch = []
+
+# jobs taken from the queue at once: the plot jobs of a batch share one read of the catalog
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "16"))
+# seconds to wait for more jobs once the first job of a batch has arrived
+BATCH_WINDOW = float(os.environ.get("BATCH_WINDOW", "0.05"))
+# seconds an idle worker waits in one blocking read of the queues. It must stay below the socket
+# timeout of the queue connection, or an empty queue looks like a dead Redis to the client
+QUEUE_WAIT_SECONDS = float(os.environ.get("QUEUE_WAIT_SECONDS", str(min(5.0, REDIS_SOCKET_TIMEOUT / 2))))
+
+
+def run_ingest(jobid: str, job_data: dict) -> None:
     """
-    This worker function to generate a relative velocity vs. distance, hexbin plot and stores the image in Redis
+    This function loads the csv named by an ingest job into Redis and records the progress in the job
         Args:
             jobid (str) : The jobid as a string
+            job_data (dict) : The job dictionary
         Returns:
             None
     """
-    try:
-        logging.info(f"Starting job {jobid}")
-        # update job status to reflect its start
-        update_job_status(jobid, "in progress")
+    def report(summary):
+        # record progress after every committed chunk so /jobs/<id> can be polled
+        update_job(jobid, rows_loaded=summary['rows'], throughput=summary['rows_per_second'],
+                   chunks=summary['chunks'], seconds=summary['seconds'])
 
+    try:
+        summary = ingest_csv(job_data['path'], rd, mdb, resume=job_data.get('resume', True), progress=report)
+    except FileNotFoundError:
+        logging.error(f"NEO file not found for job {jobid}")
+        update_job(jobid, status="failed", errors=['NEO file not found'])
+        return
     except Exception as e:
-        logging.error(f"Error processing job {jobid}: {str(e)}")
-        update_job_status(jobid, "failed")
-    
+        logging.error(f"Error loading data for job {jobid}: {e}")
+        update_job(jobid, status="failed", errors=[f"Error fetching data: {e}"])
+        return
+
+    report(summary)
+    # every csv row is keyed by a unique close approach date
+    if rd.dbsize() == summary['rows']:
+        update_job_status(jobid, "complete")
+        logging.info(f"Job {jobid} loaded {summary['rows']} rows.")
+        if summary['rows']:
+            # the popular plots of the new data are drawn at low priority before anyone asks for them
+            try:
+                queue_warmup(mdb)
+            except Exception as e:
+                logging.error(f"Could not queue the warm-up jobs after job {jobid}: {e}")
+    else:
+        logging.error(f"Job {jobid} failed to load all data into redis")
+        update_job(jobid, status="failed", errors=['failed to load all data into redis'])
+
+
+def plot_data(table, start: float, end: float) -> dict:
+    """
+    This function selects the NEOs of a columnar table that approach in a time range and have every value the plots use
+        Args:
+            table (Table) : numeric columns of the catalog, from columns.py
+            start (float) : start of the range in epoch seconds
+            end (float) : end of the range in epoch seconds, excluded
+        Returns:
+            data (dict) : lists named by PLOT_COLUMNS, and the number of NEOs skipped for missing values
+    """
+    rows = np.flatnonzero((table.epoch >= start) & (table.epoch < end))
+    columns = table.columns
+    velocity = columns['V relative(km/s)'][rows]
+    nominal = columns['CA DistanceNominal (au)'][rows]
+    # the minimum distance when the nominal one is missing
+    distance = np.where(np.isnan(nominal), columns['CA DistanceMinimum (au)'][rows], nominal)
+    mag = columns['H(mag)'][rows]
+    rarity = columns['Rarity'][rows]
+    valid = np.isfinite(velocity) & np.isfinite(distance) & np.isfinite(mag) & np.isfinite(rarity)
+    return {'velocities': velocity[valid].tolist(),
+            'distances': distance[valid].tolist(),
+            'mags': mag[valid].tolist(),
+            'raritys': rarity[valid].tolist(),
+            'days': table.day[rows][valid].tolist(),
+            'skipped': int(len(rows) - valid.sum())}
+
+
+def next_batch(size: int = BATCH_SIZE, window: float = BATCH_WINDOW) -> tuple:
+    """
+    This function waits for a job and takes up to size jobs from the queue the scheduler chose for it,
+    waiting at most window seconds for more
+        Args:
+            size (int) : largest number of jobs to take
+            window (float) : seconds to wait for more jobs after the first one
+        Returns:
+            jobids (list) : the job ids, in queue order
+            name (str) : the queue they were taken from
+    """
+    # a worker that finds every queue empty starts the weighted round robin afresh, and waits in
+    # short blocking reads until a job arrives
+    taken = scheduler.get()
+    while taken is None:
+        taken = scheduler.get(block=True, timeout=QUEUE_WAIT_SECONDS)
+    name, jobid = taken
+    # a batch keeps to one queue, and its jobs share a kind
+    queue = get_queue(name)
+    jobids = [jobid]
+    deadline = time.monotonic() + window
+    while len(jobids) < size:
+        jobid = queue.get()
+        if jobid is None:
+            remaining = deadline - time.monotonic()
+            # a BLPOP timeout of 0 waits forever
+            if remaining < 0.001:
+                break
+            jobid = queue.get(block=True, timeout=remaining)
+            if jobid is None:
+                break
+        jobids.append(jobid)
+    return jobids, name
+
+
+def fail_job(jobid: str, error: str) -> None:
+    """
+    This function marks a job as failed with an error message
+        Args:
+            jobid (str) : The jobid as a string
+            error (str) : The error to record in the job
+        Returns:
+            None
+    """
+    logging.error(f"Job {jobid} failed: {error}")
+    try:
+        update_job(jobid, status="failed", errors=[error])
+    except Exception:
+        logging.error(f"Job {jobid} not found in Redis")
+
+
+def stop_job(jobid: str, reason: JobInterrupted) -> None:
+    """
+    This function records a job that was cancelled or ran out of time
+        Args:
+            jobid (str) : The jobid as a string
+            reason (JobInterrupted) : why the job stopped; its status is recorded
+        Returns:
+            None
+    """
+    logging.warning(f"Job {jobid} {reason.status}: {reason}")
+    try:
+        update_job(jobid, status=reason.status, errors=[str(reason)])
+    except Exception:
+        logging.error(f"Job {jobid} not found in Redis")
+    mdb.delete(CANCEL_PREFIX + jobid)
+    metrics.registry.inc('neo_worker_jobs_stopped_total', status=reason.status)
+
+
+def abandon_batch(jobid: str) -> None:
+    """
+    This function is called when a job is still running at its hard time limit, just before the worker exits.
+    It records the job as timed out and puts the jobs of its batch that have not finished back on their queues.
+        Args:
+            jobid (str) : The jobid as a string
+        Returns:
+            None
+    """
+    stop_job(jobid, JobTimedOut("Job ran past its hard time limit"))
+    for other in _batch:
+        job_data = get_job_by_id(other)
+        if other != jobid and job_data and job_data['status'] == 'in progress':
+            requeue(queue_name(job_data['priority'], job_data['kind']) if 'priority' in job_data else LEGACY_QUEUE, [other])
+    metrics.publish(mdb)
+
+
+def limits_of(jobid: str, kind: str) -> job_limits:
+    """
+    This function returns the time limits and cancellation check of a job, see limits.py
+        Args:
+            jobid (str) : The jobid as a string
+            kind (str) : The kind of job
+        Returns:
+            limits (job_limits) : context manager to run the job in
+    """
+    return job_limits(kind, cancelled=lambda: cancel_requested(jobid), on_hard_timeout=lambda: abandon_batch(jobid))
+
+
+def start_job(jobid: str) -> dict:
+    """
+    This function reads the parameters of a job and marks it as in progress, unless it has been cancelled
+        Args:
+            jobid (str) : The jobid as a string
+        Returns:
+            job_data (dict) : The job dictionary, or None if the job could not be read or was cancelled
+    """
     try:
-        logging.debug("Retrieving start and end dates")
+        logging.info(f"Starting job {jobid}")
         # get raw job data from jobs database
         job_raw = jdb.get(jobid)
         if not job_raw:
             raise ValueError("Job data not found in Redis")
-        
         job_data = json.loads(job_raw)
-        # extract start, end, and kind parameters
-        start_date_str = job_data.get('start')
-        end_date_str = job_data.get('end')
-        kind = job_data.get('kind')
+        # cancelled after the worker took it from the queue
+        if cancel_requested(jobid):
+            stop_job(jobid, JobCancelled("Job cancelled"))
+            return None
+        # update job status to reflect its start
+        update_job_status(jobid, "in progress")
+        # a job put back by requeue already recorded its wait when it was first taken
+        if 'queued' in job_data and not job_data.get('preempted'):
+            metrics.registry.observe('neo_queue_wait_seconds', max(0.0, time.time() - job_data['queued']),
+                                     priority=job_data.get('priority', 'normal'), kind=str(job_data.get('kind')))
+        return job_data
+    except Exception as e:
+        fail_job(jobid, f"Invalid job data: {e}")
+        return None
 
-        # convert date string to datetime object
-        start_date = parse_date(start_date_str)
-        end_date = parse_date(end_date_str)
 
-    except Exception as e:
-        raise ValueError(f"Invalid job data: {str(e)}")
+def load_plot_table(ranges: list):
+    """
+    This function returns the numeric columns of the NEOs the plot jobs of a batch need
+        Args:
+            ranges (list) : (start, end) epoch seconds of each job, end excluded
+        Returns:
+            table (Table) : the resident table of the whole catalog, or a table of the NEOs in any of the ranges
+    """
+    # the worker keeps the numeric columns of the catalog between jobs and reloads them only
+    # when the data version changes, so a batch usually costs one read of the version. The data
+    # is read from a replica at the current version when there is one
+    reader = read_catalog()
+    table = resident_table(reader, mdb)
+    if table is None:
+        # too large to keep: the keys are the close-approach times, so the ranges of every job
+        # are applied to all keys at once and the NEOs in any of them are fetched together
+        keys = np.array(load_keys(reader), dtype=object)
+        epoch, _ = parse_timestamps(keys)
+        wanted = np.zeros(len(keys), dtype=bool)
+        for start, end in ranges:
+            wanted |= (epoch >= start) & (epoch < end)
+        table = Table(*load_rows(reader, chronological(keys[wanted].tolist()), PLOT_FIELDS))
+    return table
 
-    # initialize lists for holding data   
-    velocities = []
-    distances = []
-    mags = []
-    raritys = []
-    days = []
-    processed_count = 0
 
+def render_plot(jobid: str, job_data: dict, data: dict) -> None:
+    """
+    This function draws the plot of a job, stores the image in Redis and marks the job complete
+        Args:
+            jobid (str) : The jobid as a string
+            job_data (dict) : The job dictionary
+            data (dict) : the NEOs of the job, from plot_data
+        Returns:
+            None
+    """
+    start_date_str = job_data.get('start')
+    end_date_str = job_data.get('end')
+    kind = job_data.get('kind')
+    start_date = parse_date(start_date_str)
+    velocities, distances, mags, raritys, days = (data[name] for name in PLOT_COLUMNS)
+
+    phase_start = time.perf_counter()
+    # pyplot takes about a second to import, so the worker loads it with its first plot job
+    import matplotlib.pyplot as plt
+    if kind not in ('1', '2'):
+        raise ValueError('Value for kind is invalid')
+    figure = plt.figure(figsize=(12, 7))
+    # a worker draws many plots, so the figure is released once it is saved, and also when the
+    # job is stopped or fails while drawing or saving it
+    try:
+        # job 1 makes a distance vs velocity graph
+        if kind == '1':
+            # Generate plot
+            hb = plt.hexbin(distances, velocities, 
+                    gridsize=30,
+                    cmap='viridis',
+                    mincnt=1,
+                    edgecolors='none')
+            plt.colorbar(hb, label='NEO Count')
+            plt.title(f'NEO Close Approach Distance vs Relative Velocity: {start_date_str} to {end_date_str}')
+            plt.xlabel('Close Approach Distance (AU)')
+            plt.ylabel('Relative Velocity (km/s)')
 
-    for key in rd.keys('*'):
-        try:
-            # logging.debug("Going through Redis and retrieving data...")
-            key_str = key.decode('utf-8')
-            neo_raw = rd.get(key)
-            if not neo_raw:
-                continue
-        except Exception as e:
-            logging.warning(f"Skipping key {key_str}: {str(e)}")
-            continue
-            
-        neo = json.loads(neo_raw.decode('utf-8'))
-        neo_date_str = neo.get('Close-Approach (CA) Date', '')
-        
-        # skip if missing data
-        if not neo_date_str:
-            continue
+        # job 2 makes a plot of the NEO's for a given month
+        else:
+            # get min and max for use in normalizing data
+            min_mag = min(mags)
+            max_mag = max(mags)
+            norm_mags = [(mag - min_mag) / (max_mag - min_mag) * 100 + 2 for mag in mags]
+            # plot data
+            # size corresponds to magnitude and color to rarity
+            scatter = plt.scatter(days, velocities, s= norm_mags, c = raritys)
+            plt.legend(*scatter.legend_elements(), title = "Rarity")
+            plt.ylim(0,30)
+            plt.xlim(0,31)
+            plt.xticks(range(0,31,1))
+            plt.xlabel('Day of Month')
+            plt.ylabel('V relative (km/s)')
+            plt.title(f"NEO's Approaching {start_date.month}/{start_date.year}")
 
-        # Parse NEO date
-        try:
-            # remove uncertainty part of timestamp and convert to datetime object
-            neo_date = clean_to_date_only(neo_date_str)
-            neo_date = parse_date(neo_date)
-        except ValueError as e:
-            logging.warning(f"Skipping {key_str}: {str(e)}")
-            continue
+        # every rendition (thumbnail, standard, high-DPI, ...) is saved from the one figure, in memory
+        images = renditions.render(figure)
+    finally:
+        plt.close(figure)
+    metrics.observe_phase(kind, 'render', time.perf_counter() - phase_start)
 
-        # Check date range
-        # logging.debug(f"Checking date range of {neo_date}")
-        if start_date <= neo_date <= end_date:
-            try:
-                # extract data
-                velocity = float(neo.get("V relative(km/s)", 0))
-                distance = float(neo.get("CA DistanceNominal (au)", 
-                                neo.get("CA DistanceMinimum (au)", 0)))
-                mag = float(neo.get('H(mag)', 0))
-                rar = float(neo.get('Rarity', 0))
-                velocities.append(velocity)
-                distances.append(distance)
-                mags.append(mag)
-                raritys.append(rar)
-                days.append(int(neo_date.day))
-                processed_count += 1
-            except (ValueError, TypeError) as e:
-                logging.warning(f"Skipping {key_str}: invalid data {str(e)}")
-
-    logging.info(f"Processed {processed_count} NEOs for job {jobid}")
-
-    if not velocities or not distances:
-        raise ValueError("No valid NEO data found in date range")
-    
-    # job 1 makes a distance vs velocity graph
-    if kind == '1':
-        # Generate plot
-        plt.figure(figsize=(12, 7))
-        hb = plt.hexbin(distances, velocities, 
-                gridsize=30,
-                cmap='viridis',
-                mincnt=1,
-                edgecolors='none')
-        plt.colorbar(hb, label='NEO Count')
-        plt.title(f'NEO Close Approach Distance vs Relative Velocity: {start_date_str} to {end_date_str}')
-        plt.xlabel('Close Approach Distance (AU)')
-        plt.ylabel('Relative Velocity (km/s)')
-        
-        # Save plot to image and store in Redis
-        logging.debug("Saving plot to Redis")
-        plt.savefig(f'/app/{jobid}_plot.png')
-    
-    # job 2 makes a plot of the NEO's for a given month
-    elif kind == '2':
-        # get min and max for use in normalizing data
-        min_mag = min(mags)
-        max_mag = max(mags)
-        norm_mags = [(mag - min_mag) / (max_mag - min_mag) * 100 + 2 for mag in mags]
-        # plot data
-        plt.figure(figsize=(12,7))
-        # size corresponds to magnitude and color to rarity
-        scatter = plt.scatter(days, velocities, s= norm_mags, c = raritys)
-        plt.legend(*scatter.legend_elements(), title = "Rarity")
-        plt.ylim(0,30)
-        plt.xlim(0,31)
-        plt.xticks(range(0,31,1))
-        plt.xlabel('Day of Month')
-        plt.ylabel('V relative (km/s)')
-        plt.title(f"NEO's Approaching {start_date.month}/{start_date.year}")
-        plt.savefig(f'/app/{jobid}_plot.png')
+    # save output plot in results database
+    phase_start = time.perf_counter()
+    logging.debug("Saving plot to Redis")
+    renditions.store(rdb, jobid, images)
+    logging.info(f"Saved {', '.join(images)} renditions of the plot to rdb")
+    metrics.observe_phase(kind, 'store', time.perf_counter() - phase_start)
 
-    else:
-        logging.error('Value for kind is invalid')
-    
-    # update job status to complete
+    # update job status to complete once its result can be read
     update_job_status(jobid, "complete")
     logging.info(f"Job {jobid} complete.")
-    # save output plot in results database
+    metrics.registry.inc('neo_worker_jobs_total', kind=kind)
+
+
+def run_plot_jobs(jobs: list, yield_to=None) -> list:
+    """
+    This function selects the NEOs of a group of plot jobs in one pass over the catalog and draws each job's plot
+        Args:
+            jobs (list) : (jobid, job dictionary) of each plot job
+            yield_to (callable) : checked after each plot; when it returns True the remaining jobs are left undone
+        Returns:
+            left (list) : ids of the jobs left undone, in order
+    """
+    ranges = {}
+    for jobid, job_data in jobs:
+        try:
+            logging.debug("Retrieving start and end dates")
+            # convert date string to datetime object
+            start_date = parse_date(job_data.get('start'))
+            end_date = parse_date(job_data.get('end'))
+            ranges[jobid] = (to_epoch(start_date), to_epoch(end_date + timedelta(days=1)))
+        except Exception as e:
+            fail_job(jobid, f"Invalid job data: {e}")
+    jobs = [(jobid, job_data) for jobid, job_data in jobs if jobid in ranges]
+    if not jobs:
+        return []
+
+    # the fetch of a batch with several kinds of plot is recorded once, as kind "batch", and has
+    # the time limits of its kind (none for "batch")
+    kinds = {job_data.get('kind') for _, job_data in jobs}
+    kind = kinds.pop() if len(kinds) == 1 else 'batch'
     try:
-        file_bytes = open(f'/app/{jobid}_plot.png', 'rb').read() # read in image as bytes
-        logging.info('read plot in..')
-    except:
-        if not file_bytes:
-            logging.error('error producing output file')
+        with job_limits(kind), phase_timer(kind, 'fetch'):
+            table = load_plot_table(list(ranges.values()))
+    except JobInterrupted as e:
+        for jobid, _ in jobs:
+            stop_job(jobid, e)
+        return []
+    except Exception as e:
+        for jobid, _ in jobs:
+            fail_job(jobid, f"Error fetching data: {e}")
+        return []
+
+    for done, (jobid, job_data) in enumerate(jobs, 1):
+        try:
+            with limits_of(jobid, job_data.get('kind')):
+                # cancelled while the jobs before it ran
+                if cancel_requested(jobid):
+                    raise JobCancelled("Job cancelled")
+                with phase_timer(job_data.get('kind'), 'filter'):
+                    data = plot_data(table, *ranges[jobid])
+                if data['skipped']:
+                    logging.warning(f"Skipped {data['skipped']} NEOs with missing data in job {jobid}")
+                logging.info(f"Processed {len(data['velocities'])} NEOs for job {jobid}")
+                if not data['velocities'] or not data['distances']:
+                    raise ValueError("No valid NEO data found in date range")
+                render_plot(jobid, job_data, data)
+        except JobInterrupted as e:
+            stop_job(jobid, e)
+        except Exception as e:
+            fail_job(jobid, str(e))
+        if done < len(jobs) and yield_to is not None and yield_to():
+            return [jobid for jobid, _ in jobs[done:]]
+    return []
+
+
+def do_batch(jobids: list, name: str = None) -> None:
+    """
+    This function runs a batch of jobs taken from the queue. Consecutive plot jobs share one read of the catalog,
+    ingest jobs run on their own in queue order, and every job keeps its own status and result.
+        Args:
+            jobids (list) : The job ids, in queue order
+            name (str) : The queue the jobs were taken from. A batch of plot jobs from a queue below the
+                highest priority class stops between plots when a higher class has jobs waiting, and puts
+                the rest back at the head of its queue.
+        Returns:
+            None
+    """
+    metrics.registry.observe('neo_worker_batch_size', len(jobids))
+    _batch[:] = jobids
+    yield_to = None
+    if name is not None and name != LEGACY_QUEUE:
+        priority = queue_priority(name)
+        yield_to = lambda: scheduler.waiting_above(priority)
+    plots = []
+    for jobid in jobids:
+        job_data = start_job(jobid)
+        if job_data is None:
+            continue
+        if job_data.get('kind') == 'ingest':
+            # plot jobs queued before a load are drawn from the data they were queued against
+            run_plot_jobs(plots)
+            plots = []
+            try:
+                with limits_of(jobid, 'ingest'), phase_timer('ingest', 'ingest'):
+                    run_ingest(jobid, job_data)
+            except JobInterrupted as e:
+                # the rows loaded so far stay; the next load resumes after the last committed chunk
+                stop_job(jobid, e)
+                continue
+            metrics.registry.inc('neo_worker_jobs_total', kind='ingest')
         else:
-            logging.error('error reading output file')
-    # set the file bytes as a key in Redis
-    try:
-        # set key value pair to odb where key is name of plot and value is its data in bytes
-        rdb.set(f"{jobid}_output_plot", file_bytes) 
-        logging.info('saved output file to odb')
-    except:
-        logging.error('error pushing output file to Redis')
+            plots.append((jobid, job_data))
+    left = run_plot_jobs(plots, yield_to)
+    if left:
+        logging.info(f"Putting {len(left)} jobs back on {name} for higher priority jobs")
+        requeue(name, left)
+    _batch.clear()
+    metrics.publish(mdb)
+
+
+def do_work(jobid: str) -> None:
+    """
+    This worker function runs one job: a relative velocity vs. distance hexbin plot, a monthly scatter plot,
+    or an ingest job
+        Args:
+            jobid (str) : The jobid as a string
+        Returns:
+            None
+    """
+    do_batch([jobid])
 
 
 if __name__ == "__main__":
     logging.info("Worker started...")
-    do_work()
+    metrics.start_publisher(mdb)
+    while True:
+        do_batch(*next_batch())
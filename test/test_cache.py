@@ -0,0 +1,113 @@
+import pytest
+from flask import Flask, jsonify
+from werkzeug.datastructures import MultiDict
+
+import cache
+from cache import ResponseCache, cached
+
+def test_cache_get_and_put():
+    """Test a stored body is returned with its mimetype."""
+    c = ResponseCache(100)
+    c.put('a', b'12345', 'application/json')
+    assert c.get('a') == (b'12345', 'application/json')
+    assert c.get('b') is None
+    assert c.size == 5
+
+def test_cache_evicts_least_recently_used():
+    """Test the least recently used entry is evicted when the size cap is reached."""
+    c = ResponseCache(10)
+    c.put('a', b'1234', 'text/html')
+    c.put('b', b'1234', 'text/html')
+    c.get('a')
+    c.put('c', b'1234', 'text/html')
+    assert c.get('b') is None
+    assert c.get('a') is not None
+    assert c.size == 8
+
+def test_cache_skips_oversized_body():
+    """Test a body larger than the cap is not stored."""
+    c = ResponseCache(3)
+    c.put('a', b'1234', 'text/html')
+    assert len(c) == 0
+
+@pytest.fixture
+def client(monkeypatch):
+    """Fixture with a small app whose route is cached and counts its calls."""
+    version = {'value': 1}
+    calls = []
+    monkeypatch.setattr(cache, 'current_version', lambda: version['value'])
+    monkeypatch.setattr(cache, 'response_cache', ResponseCache(1000))
+
+    app = Flask(__name__)
+
+    @app.route('/data/<year>')
+    @cached
+    def by_year(year):
+        calls.append(year)
+        return jsonify({'year': year})
+
+    return app.test_client(), version, calls
+
+def test_cached_route_hit(client):
+    """Test a repeated request is answered from the cache with the same ETag."""
+    test_client, _, calls = client
+    first = test_client.get('/data/2025')
+    second = test_client.get('/data/2025')
+    assert second.json == {'year': '2025'}
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert 'must-revalidate' in first.headers['Cache-Control']
+    assert calls == ['2025']
+
+def test_cached_route_not_modified(client):
+    """Test a matching If-None-Match gets a 304."""
+    test_client, _, calls = client
+    etag = test_client.get('/data/2025').headers['ETag']
+    response = test_client.get('/data/2025', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert calls == ['2025']
+
+def test_cached_route_new_version(client):
+    """Test bumping the data version invalidates the cached response and the ETag."""
+    test_client, version, calls = client
+    etag = test_client.get('/data/2025').headers['ETag']
+    version['value'] = 2
+    response = test_client.get('/data/2025', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert calls == ['2025', '2025']
+
+def test_cache_keeps_compressed_variants():
+    """Test compressed variants count towards the size cap and go away with their entry."""
+    c = ResponseCache(20)
+    c.put('a', b'1234567890', 'application/json')
+    c.put_compressed('a', 'gzip', b'12345')
+    assert c.get_compressed('a', 'gzip') == b'12345'
+    assert c.size == 15
+    c.put('b', b'123456789', 'application/json')
+    assert c.get('a') is None
+    assert c.size == 9
+
+def test_precompressed_route(monkeypatch):
+    """Test a precompressed route serves the cached compressed body."""
+    import gzip
+    monkeypatch.setattr(cache, 'current_version', lambda: 1)
+    monkeypatch.setattr(cache, 'response_cache', ResponseCache(100000))
+    app = Flask(__name__)
+
+    @app.route('/data')
+    @cached(precompress=True)
+    def everything():
+        return jsonify({'data': 'x' * 5000})
+
+    test_client = app.test_client()
+    first = test_client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    second = test_client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert second.data == first.data
+    assert gzip.decompress(second.data) == test_client.get('/data').data
+    assert cache.response_cache.get_compressed(cache.cache_key('/data', MultiDict(), 1), 'gzip') == first.data
+
+def test_cache_key_ignores_argument_order():
+    """Test query arguments are normalized in the cache key."""
+    assert cache.cache_key('/q', MultiDict([('min', '1'), ('max', '2')]), 1) == \
+        cache.cache_key('/q', MultiDict([('max', '2'), ('min', '1')]), 1)
@@ -0,0 +1,80 @@
+import pytest
+import redis
+
+import connections
+from connections import get_pool, get_redis, get_queue, lazy_redis, reset, QUEUE_DB
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    """Fixture that starts every test without pools."""
+    reset()
+    yield
+    reset()
+
+def test_lazy_redis_creates_nothing():
+    """Test a lazy handle does not create a pool until it is used."""
+    lazy_redis(5)
+    assert 5 not in connections._pools
+
+def test_lazy_redis_forwards_to_shared_client():
+    """Test a lazy handle forwards to the shared client of its database."""
+    client = lazy_redis(5)
+    assert client.connection_pool is get_pool(5)
+
+def test_clients_share_one_pool_per_db():
+    """Test every client of a database uses the same pool."""
+    assert get_redis(0) is get_redis(0)
+    assert get_redis(0).connection_pool is get_pool(0)
+    assert get_pool(0) is not get_pool(2)
+
+def test_pool_settings():
+    """Test the pool is configured from the connection settings."""
+    pool = get_pool(0)
+    assert isinstance(pool, redis.BlockingConnectionPool)
+    assert pool.max_connections == connections.REDIS_MAX_CONNECTIONS
+    assert pool.connection_kwargs['host'] == connections.REDIS_HOST
+    assert pool.connection_kwargs['port'] == connections.REDIS_PORT
+    assert pool.connection_kwargs['health_check_interval'] == connections.REDIS_HEALTH_CHECK_INTERVAL
+
+def test_queue_uses_queue_pool():
+    """Test the job queue is backed by the pool of the queue database."""
+    queue = get_queue("queue")
+    assert queue is get_queue("queue")
+    assert queue._HotQueue__redis.connection_pool is get_pool(QUEUE_DB)
+
+def test_reset_drops_pools():
+    """Test reset makes the next use create a new pool."""
+    pool = get_pool(0)
+    reset()
+    assert get_pool(0) is not pool
+
+def test_catalog_nodes(monkeypatch):
+    """Test the catalog is split over REDIS_CATALOG_NODES while the other databases stay on REDIS_HOST."""
+    monkeypatch.setattr(connections, 'REDIS_CATALOG_NODES', ['neo-a:6379', 'neo-b:6380'])
+    catalog = connections.get_catalog()
+    assert catalog is connections.get_catalog()
+    assert [(node.connection_pool.connection_kwargs['host'], node.connection_pool.connection_kwargs['port'])
+            for node in catalog.nodes] == [('neo-a', 6379), ('neo-b', 6380)]
+    assert get_pool(QUEUE_DB).connection_kwargs['host'] == connections.REDIS_HOST
+
+def test_catalog_without_nodes():
+    """Test the catalog is the client of db 0 when it is not split."""
+    assert connections.get_catalog() is get_redis(connections.NEO_DB)
+
+def test_replica_pools(monkeypatch):
+    """Test the replicas get pools of their own with the short replica timeout."""
+    monkeypatch.setattr(connections, 'REDIS_REPLICAS', ['neo-replica:6379'])
+    router = connections.get_read_router()
+    assert router is connections.get_read_router()
+    [replica] = router.replicas
+    kwargs = replica.catalog.connection_pool.connection_kwargs
+    assert (kwargs['host'], kwargs['db']) == ('neo-replica', connections.NEO_DB)
+    assert kwargs['socket_connect_timeout'] == connections.REDIS_REPLICA_TIMEOUT
+    assert replica.meta.connection_pool.connection_kwargs['db'] == connections.META_DB
+    assert router.primary is get_redis(connections.NEO_DB)
+
+def test_replicas_ignored_with_catalog_nodes(monkeypatch):
+    """Test the replicas of REDIS_HOST are not read once the catalog is split over nodes."""
+    monkeypatch.setattr(connections, 'REDIS_REPLICAS', ['neo-replica:6379'])
+    monkeypatch.setattr(connections, 'REDIS_CATALOG_NODES', ['neo-a:6379'])
+    assert connections.get_read_router().replicas == []
@@ -0,0 +1,115 @@
+import pytest
+import json
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from ingest import build_records, load_checkpoint, CHECKPOINT_KEY, FIELDS
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Fixture that writes a small CNEOS-style csv."""
+    path = tmp_path / "neo.csv"
+    path.write_text(
+        "Object,Close-Approach (CA) Date,CA DistanceNominal (au),CA DistanceMinimum (au),"
+        "V relative(km/s),V infinity(km/s),H(mag),Diameter,Rarity\n"
+        "(2025 AB),2025-Jan-01 00:00 ±  < 00:01,0.01,0.009,10.5,10.4,24.1,34 m -   76 m,2\n"
+        "(2025 CD),2025-Feb-02 12:30 ±  00:13,0.02,0.019,5.2,5.1,21.0,0.5±0.1 km,1\n"
+    )
+    return str(path)
+
+def test_build_records(csv_file):
+    """Test a chunk is parsed into records with the diameter bounds."""
+    records = build_records(pd.read_csv(csv_file))
+    assert len(records) == 2
+    assert list(records[0].keys()) == FIELDS
+    assert records[0]['Minimum Diameter'] == '34'
+    assert records[0]['Maximum Diameter'] == '76'
+    assert records[1]['Maximum Diameter'] == pytest.approx(0.6)
+
+def test_build_records_missing_diameter(csv_file):
+    """Test a missing diameter gives nan bounds."""
+    chunk = pd.read_csv(csv_file)
+    chunk.loc[0, 'Diameter'] = np.nan
+    records = build_records(chunk)
+    assert np.isnan(records[0]['Minimum Diameter'])
+
+def test_load_checkpoint_same_file(csv_file):
+    """Test a checkpoint written by the same file is reused."""
+    from ingest import _file_signature
+    checkpoint = {'path': csv_file, 'signature': _file_signature(csv_file), 'chunk': 1, 'rows': 1}
+    mdb = MagicMock()
+    mdb.get.return_value = json.dumps(checkpoint)
+    assert load_checkpoint(mdb, csv_file) == checkpoint
+    mdb.get.assert_called_with(CHECKPOINT_KEY)
+
+def test_load_checkpoint_other_file(csv_file):
+    """Test a checkpoint written by another file is ignored."""
+    mdb = MagicMock()
+    mdb.get.return_value = json.dumps({'path': '/other.csv', 'signature': '0:0', 'chunk': 1, 'rows': 1})
+    assert load_checkpoint(mdb, csv_file) is None
+
+def test_load_checkpoint_missing(csv_file):
+    """Test no checkpoint means a fresh ingest."""
+    mdb = MagicMock()
+    mdb.get.return_value = None
+    assert load_checkpoint(mdb, csv_file) is None
+
+def test_reload_moves_object_index(csv_file):
+    """Test a reload that renames the object of a key moves the key in the object index."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from ingest import ingest_csv
+    from objects import object_keys, search_prefix
+    server = fakeredis.FakeServer()
+    rd, mdb = fakeredis.FakeRedis(server=server, db=0), fakeredis.FakeRedis(server=server, db=4)
+    ingest_csv(csv_file, rd, mdb)
+    with open(csv_file, encoding='utf-8') as f:
+        text = f.read()
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        f.write(text.replace('(2025 CD)', '(2025 AB)'))
+    ingest_csv(csv_file, rd, mdb, resume=False)
+    assert object_keys(mdb, '2025 AB')[1] == 2
+    assert object_keys(mdb, '2025 CD') == ([], 0)
+    assert [row['object'] for row in search_prefix(mdb, '')] == ['2025 AB']
+
+def test_reload_with_changed_values_updates_rollups(csv_file):
+    """Test the rollups after reloading a changed file match the rollups of a fresh load of it."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from ingest import ingest_csv
+    from rollups import load_buckets
+    server = fakeredis.FakeServer()
+    rd, mdb = fakeredis.FakeRedis(server=server, db=0), fakeredis.FakeRedis(server=server, db=4)
+    ingest_csv(csv_file, rd, mdb)
+    with open(csv_file, encoding='utf-8') as f:
+        text = f.read()
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        f.write(text.replace(',10.5,10.4,24.1,', ',7.5,10.4,19.0,'))
+    ingest_csv(csv_file, rd, mdb, resume=False)
+    reloaded = load_buckets(mdb)
+    fresh_server = fakeredis.FakeServer()
+    fresh = fakeredis.FakeRedis(server=fresh_server, db=4)
+    ingest_csv(csv_file, fakeredis.FakeRedis(server=fresh_server, db=0), fresh)
+    assert reloaded == load_buckets(fresh)
+    assert reloaded['2025-01']['count'] == 1 and reloaded['2025-01']['h:max'] == 19.0
+
+def test_version_bumped_once_per_interval(csv_file, monkeypatch):
+    """Test a load bumps the data version at most once per interval, and when it stops."""
+    fakeredis = pytest.importorskip('fakeredis')
+    import ingest
+    from catalog import get_data_version
+    server = fakeredis.FakeServer()
+    rd, mdb = fakeredis.FakeRedis(server=server, db=0), fakeredis.FakeRedis(server=server, db=4)
+    monkeypatch.setattr(ingest, 'VERSION_BUMP_SECONDS', 3600)
+    ingest.ingest_csv(csv_file, rd, mdb, chunksize=1)
+    assert get_data_version(mdb) == 1
+    monkeypatch.setattr(ingest, 'VERSION_BUMP_SECONDS', 0)
+    ingest.ingest_csv(csv_file, rd, mdb, chunksize=1, resume=False)
+    assert get_data_version(mdb) == 3
+    monkeypatch.setattr(ingest, 'VERSION_BUMP_SECONDS', 3600)
+
+    def stop(summary):
+        raise RuntimeError("stopped")
+
+    with pytest.raises(RuntimeError):
+        ingest.ingest_csv(csv_file, rd, mdb, chunksize=1, resume=False, progress=stop)
+    assert get_data_version(mdb) == 4
@@ -9,8 +9,10 @@ from jobs import (
     _instantiate_job,
     _save_job,
     add_job,
+    add_ingest_job,
     get_job_by_id,
     update_job_status,
+    update_job,
     store_job_result,
     get_job_result
 )
@@ -131,6 +133,27 @@ def test_update_job_status():
     assert updated['status'] == 'processing'
     assert updated['start'] == start_date
 
+def test_add_ingest_job():
+    """Test adding an ingest job."""
+    job = add_ingest_job('/app/neo.csv')
+
+    assert job['kind'] == 'ingest'
+    assert job['status'] == 'submitted'
+    assert job['rows_loaded'] == 0
+    assert job['errors'] == []
+    assert json.loads(jdb.get(job['id']))['path'] == '/app/neo.csv'
+
+def test_update_job():
+    """Test updating the progress fields of a job."""
+    job = add_ingest_job('/app/neo.csv')
+
+    update_job(job['id'], rows_loaded=500, throughput=1000.0)
+
+    updated = get_job_by_id(job['id'])
+    assert updated['rows_loaded'] == 500
+    assert updated['throughput'] == 1000.0
+    assert updated['status'] == 'submitted'
+
 def test_job_result_storage():
     """Test storing and retrieving job results."""
     test_result = {"output": "success", "data": [1, 2, 3]}
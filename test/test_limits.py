@@ -0,0 +1,47 @@
+import time
+import pytest
+
+import limits
+from limits import job_limits, JobCancelled, JobTimedOut
+
+def test_soft_timeout_interrupts_job(monkeypatch):
+    """Test a job running past its soft limit is interrupted with JobTimedOut."""
+    monkeypatch.setattr(limits, 'JOB_SOFT_TIMEOUTS', {'2': 0.05})
+    start = time.monotonic()
+    with pytest.raises(JobTimedOut):
+        with job_limits('2'):
+            time.sleep(5)
+    assert time.monotonic() - start < 1
+
+def test_cancel_interrupts_job(monkeypatch):
+    """Test a running job is interrupted with JobCancelled once it is cancelled."""
+    monkeypatch.setattr(limits, 'CANCEL_POLL_SECONDS', 0.01)
+    checks = []
+    with pytest.raises(JobCancelled):
+        with job_limits('1', cancelled=lambda: checks.append(1) or len(checks) > 2):
+            time.sleep(5)
+    assert JobCancelled.status == 'cancelled'
+
+def test_limits_end_with_job(monkeypatch):
+    """Test no interrupt reaches the worker after the job has finished."""
+    monkeypatch.setattr(limits, 'JOB_SOFT_TIMEOUTS', {'2': 0.05})
+    with job_limits('2'):
+        pass
+    time.sleep(0.1)
+
+def test_interrupt_not_caught_by_job_code(monkeypatch):
+    """Test the interrupt passes through the except Exception blocks of job code."""
+    monkeypatch.setattr(limits, 'JOB_SOFT_TIMEOUTS', {'ingest': 0.05})
+    with pytest.raises(JobTimedOut):
+        with job_limits('ingest'):
+            try:
+                time.sleep(5)
+            except Exception:
+                pass
+
+def test_seconds_by_kind():
+    """Test an empty value turns the limits off and a malformed item is reported."""
+    assert limits._seconds_by_kind('1:120, 2:60,', 'JOB_SOFT_TIMEOUTS') == {'1': 120.0, '2': 60.0}
+    assert limits._seconds_by_kind('', 'JOB_SOFT_TIMEOUTS') == {}
+    with pytest.raises(ValueError, match='JOB_SOFT_TIMEOUTS'):
+        limits._seconds_by_kind('1=120', 'JOB_SOFT_TIMEOUTS')
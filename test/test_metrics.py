@@ -0,0 +1,78 @@
+import os
+import pytest
+from unittest.mock import MagicMock
+from flask import Flask, jsonify
+
+import metrics
+import profiling
+from metrics import Registry, render, record_redis
+from serialization import dumps
+
+def test_histogram_render():
+    """Test observations are rendered as cumulative Prometheus buckets with sum and count."""
+    registry = Registry()
+    registry.observe('neo_redis_roundtrips_per_request', 1, route='/data', method='GET')
+    registry.observe('neo_redis_roundtrips_per_request', 7, route='/data', method='GET')
+    registry.observe('neo_redis_roundtrips_per_request', 5000, route='/data', method='GET')
+    text = render([registry.snapshot()])
+    assert '# TYPE neo_redis_roundtrips_per_request histogram' in text
+    assert 'neo_redis_roundtrips_per_request_bucket{method="GET",route="/data",le="1"} 1' in text
+    assert 'neo_redis_roundtrips_per_request_bucket{method="GET",route="/data",le="10"} 2' in text
+    assert 'neo_redis_roundtrips_per_request_bucket{method="GET",route="/data",le="+Inf"} 3' in text
+    assert 'neo_redis_roundtrips_per_request_sum{method="GET",route="/data"} 5008' in text
+    assert 'neo_redis_roundtrips_per_request_count{method="GET",route="/data"} 3' in text
+
+def test_render_sums_processes():
+    """Test the snapshots of several processes are added together."""
+    first, second = Registry(), Registry()
+    first.inc('neo_worker_jobs_total', kind='1')
+    second.inc('neo_worker_jobs_total', 2, kind='1')
+    second.inc('neo_worker_jobs_total', kind='ingest')
+    text = render([first.snapshot(), second.snapshot()])
+    assert 'neo_worker_jobs_total{kind="1"} 3' in text
+    assert 'neo_worker_jobs_total{kind="ingest"} 1' in text
+
+@pytest.fixture
+def app(monkeypatch):
+    """Fixture with a small instrumented app whose route makes two Redis round trips."""
+    monkeypatch.setattr(metrics, 'registry', Registry())
+    monkeypatch.setattr(metrics, 'start_publisher', lambda mdb: None)
+    app = Flask(__name__)
+    metrics.instrument(app, MagicMock())
+
+    @app.route('/data/<year>')
+    def by_year(year):
+        record_redis(0, 0.002, True)
+        record_redis(0, 0.001, False)
+        record_redis(4, 0.001, True)
+        return dumps({'year': year})
+
+    return app
+
+def test_request_metrics(app):
+    """Test a request is recorded under its route template with its Redis round trips."""
+    app.test_client().get('/data/2025')
+    text = render([metrics.registry.snapshot()])
+    assert 'neo_http_request_duration_seconds_count{method="GET",route="/data/<year>",status="200"} 1' in text
+    assert 'neo_redis_roundtrips_per_request_sum{method="GET",route="/data/<year>"} 2' in text
+    assert 'neo_redis_roundtrips_total{db="0"} 1' in text
+    assert 'neo_json_encode_seconds_per_request_count{method="GET",route="/data/<year>"} 1' in text
+    assert metrics.current() is None
+
+def test_profile_parameter(monkeypatch, tmp_path):
+    """Test ?profile=1 answers with the profile report and writes the .prof file."""
+    monkeypatch.setattr(profiling, 'PROFILE_REQUESTS', True)
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    app = Flask(__name__)
+    profiling.profile_requests(app)
+
+    @app.route('/data')
+    def data():
+        return jsonify(sorted(range(1000), key=lambda x: -x))
+
+    client = app.test_client()
+    assert client.get('/data').json[0] == 999
+    response = client.get('/data?profile=1')
+    assert response.mimetype == 'text/plain'
+    assert 'cumulative' in response.get_data(as_text=True)
+    assert os.path.exists(response.headers['X-Profile-File'])
@@ -0,0 +1,69 @@
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from objects import normalize, queue_objects, prune_objects, clear_objects, object_keys, search_prefix, OBJECTS_KEY
+
+RECORDS = [{'Object': '(2020 AB)', 'Close-Approach (CA) Date': '2031-Mar-02 10:00 ±  < 00:01', 'Epoch': 1930298400.0},
+           {'Object': '(2020 AB)', 'Close-Approach (CA) Date': '2025-Jan-01 00:00 ±  < 00:01', 'Epoch': 1735689600.0},
+           {'Object': '(2020 AC1)', 'Close-Approach (CA) Date': '2026-May-05 05:05 ±  < 00:01', 'Epoch': 1777957500.0},
+           {'Object': '433 Eros (A898 PA)', 'Close-Approach (CA) Date': '2056-Jan-24 13:22 ±  < 00:01', 'Epoch': 2715859320.0},
+           {'Object': '(2019 ZZ)', 'Close-Approach (CA) Date': '2027-Jul-07 07:07 ±  < 00:01', 'Epoch': float('nan')}]
+
+@pytest.fixture
+def mdb():
+    """Fixture with a fakeredis metadata database holding the index of RECORDS."""
+    client = fakeredis.FakeRedis()
+    pipe = client.pipeline(transaction=False)
+    queue_objects(pipe, RECORDS)
+    pipe.execute()
+    return client
+
+def test_normalize():
+    """Test designations are indexed without their parentheses, in upper case."""
+    assert normalize('(2020 AB)') == '2020 AB'
+    assert normalize(' 2020   ab ') == '2020 AB'
+    assert normalize('433 Eros (A898 PA)') == '433 EROS (A898 PA)'
+
+def test_object_history_in_time_order(mdb):
+    """Test the approaches of an object come back in time order, paged."""
+    assert object_keys(mdb, '2020 ab') == (['2025-Jan-01 00:00 ±  < 00:01', '2031-Mar-02 10:00 ±  < 00:01'], 2)
+    assert object_keys(mdb, '(2020 AB)', offset=1, limit=1) == (['2031-Mar-02 10:00 ±  < 00:01'], 2)
+    assert object_keys(mdb, '2019 ZZ')[1] == 1
+    assert object_keys(mdb, '1999 XX') == ([], 0)
+
+def test_zero_limit_returns_no_approaches(mdb):
+    """Test a limit of 0 returns no approaches at any offset, with the total."""
+    assert object_keys(mdb, '2020 AB', limit=0) == ([], 2)
+    assert object_keys(mdb, '2020 AB', offset=1, limit=0) == ([], 2)
+
+def test_reload_moves_key_to_new_object(mdb):
+    """Test a key stored under another object on a reload leaves the old object's approaches."""
+    moved = dict(RECORDS[2], Object='(2020 AB)')
+    pipe = mdb.pipeline(transaction=False)
+    removed = queue_objects(pipe, [moved], {moved['Close-Approach (CA) Date']: {'Object': '(2020 AC1)'}})
+    pipe.execute()
+    prune_objects(mdb, removed)
+    assert removed == ['2020 AC1']
+    assert object_keys(mdb, '2020 AB')[1] == 3 and object_keys(mdb, '2020 AC1') == ([], 0)
+    assert [row['object'] for row in search_prefix(mdb, '2020')] == ['2020 AB']
+
+def test_replayed_chunk_changes_nothing(mdb):
+    """Test indexing the same records again does not add approaches."""
+    pipe = mdb.pipeline(transaction=False)
+    queue_objects(pipe, RECORDS)
+    pipe.execute()
+    assert object_keys(mdb, '2020 AB')[1] == 2
+    assert mdb.zcard(OBJECTS_KEY) == 4
+
+def test_prefix_search(mdb):
+    """Test a prefix finds the designations starting with it, in lexicographic order and paged."""
+    assert search_prefix(mdb, '2020 a') == [{'object': '2020 AB', 'approaches': 2}, {'object': '2020 AC1', 'approaches': 1}]
+    assert search_prefix(mdb, '(2020 A', offset=1, limit=5) == [{'object': '2020 AC1', 'approaches': 1}]
+    assert [row['object'] for row in search_prefix(mdb, '')] == ['2019 ZZ', '2020 AB', '2020 AC1', '433 EROS (A898 PA)']
+    assert search_prefix(mdb, '2021') == []
+
+def test_clear_objects(mdb):
+    """Test clearing the index removes every entry."""
+    clear_objects(mdb)
+    assert mdb.dbsize() == 0
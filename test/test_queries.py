@@ -0,0 +1,242 @@
+import pytest
+import numpy as np
+from datetime import datetime
+from unittest.mock import MagicMock
+from werkzeug.datastructures import MultiDict
+
+from catalog import resolve_fields, chronological, paginate, load_records, load_json, NEORecord
+from serialization import dumps, loads
+import columns
+from columns import build_table, resident_table, query_table, records_to_rows, decode_rows
+from queries import (
+    parse_projection,
+    parse_query,
+    select,
+    aggregate,
+    timeliest_keys,
+    distance_rows,
+    distance_results,
+    velocity_rows,
+    diameter_rows,
+    biggest_rows,
+    plan_fields
+)
+
+@pytest.fixture
+def records():
+    """Fixture with three NEO records keyed by close-approach date."""
+    return {
+        '2027-Mar-03 06:15 ±  00:02': {'Object': '(2027 EF)', 'CA DistanceNominal (au)': 0.05,
+                                       'V relative(km/s)': 'n/a', 'H(mag)': 26.3, 'Maximum Diameter': None},
+        '2025-Jan-01 00:00 ±  < 00:01': {'Object': '(2025 AB)', 'CA DistanceNominal (au)': 0.01,
+                                         'V relative(km/s)': 10.5, 'H(mag)': 24.1, 'Maximum Diameter': '76'},
+        '2026-Feb-02 12:30 ±  00:13': {'Object': '(2026 CD)', 'CA DistanceNominal (au)': 0.03,
+                                       'V relative(km/s)': 5.2, 'H(mag)': 21.0, 'Maximum Diameter': 0.6},
+    }
+
+def test_resolve_fields_aliases():
+    """Test aliases resolve to stored field names without duplicates."""
+    assert resolve_fields(['date', 'H(mag)', 'h']) == ['Close-Approach (CA) Date', 'H(mag)']
+    assert resolve_fields(None) is None
+    with pytest.raises(ValueError):
+        resolve_fields(['colour'])
+
+def test_chronological_and_paginate():
+    """Test keys are sorted by month rather than alphabetically and then sliced."""
+    keys = chronological(['2025-Mar-01 00:00', '2025-Feb-01 00:00', '2024-Dec-31 23:59'])
+    assert keys == ['2024-Dec-31 23:59', '2025-Feb-01 00:00', '2025-Mar-01 00:00']
+    assert paginate(keys, 1, 1) == ['2025-Feb-01 00:00']
+    assert paginate(keys, 2) == ['2025-Mar-01 00:00']
+
+def test_parse_projection():
+    """Test fields, offset and limit are parsed and invalid values rejected."""
+    args = MultiDict({'fields': 'date,distance', 'offset': '5', 'limit': '10'})
+    assert parse_projection(args) == (['Close-Approach (CA) Date', 'CA DistanceNominal (au)'], 5, 10)
+    assert parse_projection(MultiDict()) == (None, 0, None)
+    with pytest.raises(ValueError):
+        parse_projection(MultiDict({'limit': '-1'}))
+
+def test_load_records_projection():
+    """Test only the requested fields are fetched, in the order of the keys."""
+    rd = MagicMock()
+    pipe = rd.pipeline.return_value
+    pipe.execute.return_value = [[b'21.0'], [None]]
+    result = load_records(rd, fields=['H(mag)'], keys=['b', 'a'])
+    pipe.hmget.assert_any_call('b', ['H(mag)'])
+    rd.keys.assert_not_called()
+    assert result == {'b': {'H(mag)': 21.0}}
+
+def test_neo_record_reads_like_dict():
+    """Test a NEORecord compares, iterates and encodes like the dict of its fields."""
+    record = NEORecord(['H(mag)', 'Object', 'Rarity'], [21.0, '(2026 CD)', None])
+    assert record == {'H(mag)': 21.0, 'Object': '(2026 CD)', 'Rarity': None}
+    assert list(record) == ['H(mag)', 'Object', 'Rarity'] and record.get('V relative(km/s)', 'x') == 'x'
+    with pytest.raises(KeyError):
+        record['Maximum Diameter']
+    assert loads(dumps({'a': record})) == {'a': record.to_json()}
+    assert not hasattr(record, '__dict__')
+
+def test_load_json_matches_load_records():
+    """Test the body built from the stored JSON decodes to what the decoded records encode to."""
+    rd = MagicMock()
+    rd.pipeline.return_value.execute.return_value = [[b'21.0', b'"(2026 CD)"'], [None, None], [b'NaN', b'"\\u00b1"']]
+    fields = ['H(mag)', 'Object']
+    body = load_json(rd, fields=fields, keys=['b', 'c', 'a'])
+    assert loads(body) == loads(dumps(load_records(rd, fields=fields, keys=['b', 'c', 'a'])))
+    assert loads(body) == {'b': {'H(mag)': 21.0, 'Object': '(2026 CD)'}, 'a': {'H(mag)': None, 'Object': '\u00b1'}}
+
+def test_decode_rows():
+    """Test stored values decode into rows, with NaN for missing and non-numeric values."""
+    rows = decode_rows([[b'0.5', b'null'], [None, b'"12"'], [b'"n/a"', b'3']], ['H(mag)', 'Rarity'])
+    assert rows['h'][0] == 0.5 and np.isnan(rows['h'][1:]).all()
+    assert np.isnan(rows['rarity'][0]) and rows['rarity'][1:].tolist() == [12.0, 3.0]
+    assert np.isnan(rows['max_diameter']).all()
+
+def test_timeliest_keys_future_only(records):
+    """Test only future NEOs are returned, soonest first, with cleaned timestamps."""
+    result = timeliest_keys(list(records), 5, datetime(2025, 6, 1))
+    assert result == [('2026-Feb-02 12:30', '2026-Feb-02 12:30 ±  00:13'),
+                      ('2027-Mar-03 06:15', '2027-Mar-03 06:15 ±  00:02')]
+
+def test_timeliest_keys_count(records):
+    """Test the number of NEOs returned is capped by the count."""
+    assert len(timeliest_keys(list(records), 1, datetime(2000, 1, 1))) == 1
+
+@pytest.fixture
+def table(records):
+    """Fixture with the columnar table of the three records."""
+    return build_table(records, version=1)
+
+def test_build_table_order(table):
+    """Test the table rows are in time order with numeric columns."""
+    assert table.keys[0].startswith('2025') and list(table.year) == [2025, 2026, 2027]
+    assert np.isnan(table.columns['V relative(km/s)'][2])
+
+def test_distance_rows_bounds(records, table):
+    """Test distances outside the bounds are dropped and the entries name the object."""
+    rows, distances = distance_rows(table, 0.02, 0.04)
+    keys = table.keys[rows].tolist()
+    assert keys == ['2026-Feb-02 12:30 ±  00:13'] and distances.tolist() == [0.03]
+    assert distance_results(keys, distances, records) == [
+        {'date': '2026-Feb-02 12:30 ±  00:13', 'object': '(2026 CD)', 'distance_au': 0.03}]
+
+def test_distance_rows_no_bounds(records, table):
+    """Test every NEO is returned in time order without bounds."""
+    rows, distances = distance_rows(table)
+    results = distance_results(table.keys[rows].tolist(), distances, records)
+    assert [r['object'] for r in results] == ['(2025 AB)', '(2026 CD)', '(2027 EF)']
+    assert distance_results(['nope'], [0.5], records) == [{'date': 'nope', 'object': 'Unknown', 'distance_au': 0.5}]
+
+def test_velocity_rows_skip_bad_values(table):
+    """Test NEOs in the velocity range are returned and unparseable ones skipped."""
+    assert table.keys[velocity_rows(table, 5, 11)].tolist() == ['2025-Jan-01 00:00 ±  < 00:01',
+                                                                 '2026-Feb-02 12:30 ±  00:13']
+
+def test_diameter_rows(table):
+    """Test NEOs above the diameter or without one are dropped."""
+    assert table.keys[diameter_rows(table, 1)].tolist() == ['2026-Feb-02 12:30 ±  00:13']
+    assert table.keys[diameter_rows(table, 100)].tolist() == ['2025-Jan-01 00:00 ±  < 00:01',
+                                                              '2026-Feb-02 12:30 ±  00:13']
+
+def test_biggest_rows_sorted_by_h(table):
+    """Test the biggest NEOs are the ones with the lowest H magnitude."""
+    assert table.keys[biggest_rows(table, 2)].tolist() == ['2026-Feb-02 12:30 ±  00:13',
+                                                           '2025-Jan-01 00:00 ±  < 00:01']
+    assert table.keys[biggest_rows(table, 5)].tolist()[-1] == '2027-Mar-03 06:15 ±  00:02'
+    assert biggest_rows(table, 0).tolist() == []
+
+def test_parse_query_invalid():
+    """Test unknown fields, non numeric fields and bad groups are rejected."""
+    for args in ({'where': 'colour>1'}, {'where': 'object>1'}, {'where': 'h<abc'},
+                 {'group': 'week'}, {'group': 'year', 'agg': 'mean'}):
+        with pytest.raises(ValueError):
+            parse_query(MultiDict(args))
+
+def test_select_compound_and_sort(table):
+    """Test every clause must hold and rows are sorted with missing values last."""
+    plan = parse_query(MultiDict({'where': 'distance>=0.01,date<2027-Jan-01', 'sort': '-velocity'}))
+    assert list(table.keys[select(table, plan)]) == ['2025-Jan-01 00:00 ±  < 00:01', '2026-Feb-02 12:30 ±  00:13']
+    plan = parse_query(MultiDict({'sort': 'velocity'}))
+    assert list(table.year[select(table, plan)]) == [2026, 2025, 2027]
+
+def test_aggregate_by_year(table):
+    """Test aggregates per period ignore missing values."""
+    plan = parse_query(MultiDict({'group': 'year', 'agg': 'count,mean:velocity,max:h'}))
+    groups = aggregate(table, select(table, plan), plan)
+    assert groups[0] == {'period': '2025', 'count': 1, 'mean_velocity': 10.5, 'max_h': 24.1}
+    assert groups[2]['mean_velocity'] is None
+
+def test_resident_table_reloads_on_new_version(monkeypatch, records):
+    """Test the kept table is reused until the data version changes, and not loaded over the cap."""
+    version = {'value': 1}
+    loads = []
+    monkeypatch.setattr(columns, '_table', None)
+    monkeypatch.setattr(columns, 'get_data_version', lambda mdb: version['value'])
+    monkeypatch.setattr(columns, 'load_keys', lambda rd: list(records))
+    monkeypatch.setattr(columns, 'load_rows', lambda rd, keys: loads.append(1) or (keys, records_to_rows(keys, records)))
+    rd = MagicMock()
+    rd.dbsize.return_value = len(records)
+    first = resident_table(rd, MagicMock())
+    assert resident_table(rd, MagicMock()) is first and len(loads) == 1
+    version['value'] = 2
+    assert resident_table(rd, MagicMock()).version == 2 and len(loads) == 2
+    version['value'] = 3
+    monkeypatch.setattr(columns, 'TABLE_MAX_BYTES', 10)
+    assert resident_table(rd, MagicMock()) is None
+
+def test_load_table_reads_without_lock(monkeypatch, records):
+    """Test the records are read without holding the lock the kept table is swapped under."""
+    monkeypatch.setattr(columns, '_table', None)
+    monkeypatch.setattr(columns, 'get_data_version', lambda mdb: 1)
+    monkeypatch.setattr(columns, 'load_keys', lambda rd: list(records))
+    locked = []
+    monkeypatch.setattr(columns, 'load_rows', lambda rd, keys: locked.append(columns._lock.locked())
+                        or (keys, records_to_rows(keys, records)))
+    assert columns.load_table(MagicMock(), MagicMock()) is columns._table and locked == [False]
+
+def test_query_table_over_cap(monkeypatch, records):
+    """Test a catalog over the cap is read in batches, keeping only the rows a query may return."""
+    monkeypatch.setattr(columns, '_table', None)
+    monkeypatch.setattr(columns, 'TABLE_MAX_BYTES', 10)
+    monkeypatch.setattr(columns, 'get_data_version', lambda mdb: 1)
+    monkeypatch.setattr(columns, 'load_keys', lambda rd: list(records))
+    batches = []
+
+    def iter_replies(rd, keys, fields):
+        for start in range(0, len(keys), 2):
+            batch = keys[start:start + 2]
+            batches.append(fields)
+            yield batch, [[dumps(records[key].get(field)) for field in fields] for key in batch]
+
+    monkeypatch.setattr(columns, 'iter_replies', iter_replies)
+    rd = MagicMock()
+    rd.dbsize.return_value = len(records)
+    table = query_table(rd, MagicMock(), ['H(mag)'], lambda part: biggest_rows(part, 1))
+    assert table.keys.tolist() == ['2026-Feb-02 12:30 ±  00:13', '2027-Mar-03 06:15 ±  00:02']
+    assert table.keys[biggest_rows(table, 1)].tolist() == ['2026-Feb-02 12:30 ±  00:13']
+    assert batches == [['H(mag)'], ['H(mag)']] and columns._table is None
+    plan = parse_query(MultiDict({'where': 'velocity>6', 'sort': '-h'}))
+    assert plan_fields(plan) == ['V relative(km/s)', 'H(mag)']
+    table = query_table(rd, MagicMock(), plan_fields(plan), lambda part: select(part, plan))
+    assert table.keys[select(table, plan)].tolist() == ['2025-Jan-01 00:00 ±  < 00:01']
+
+def test_aload_table_keeps_newer_table(monkeypatch, records):
+    """Test a coroutine that read an older data version does not replace a newer kept table."""
+    import asyncio
+    newer = build_table(records, version=5)
+    monkeypatch.setattr(columns, '_table', newer)
+
+    async def aload_keys(ard):
+        return list(records)
+
+    async def aload_rows(ard, keys):
+        return keys, records_to_rows(keys, records)
+
+    class Meta:
+        async def get(self, key):
+            return b'4'
+
+    monkeypatch.setattr(columns, 'aload_keys', aload_keys)
+    monkeypatch.setattr(columns, 'aload_rows', aload_rows)
+    assert asyncio.run(columns.aload_table(None, Meta())).version == 4
+    assert columns._table is newer
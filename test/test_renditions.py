@@ -0,0 +1,63 @@
+import pytest
+
+matplotlib = pytest.importorskip('matplotlib')
+fakeredis = pytest.importorskip('fakeredis')
+matplotlib.use('Agg')
+
+import renditions
+from renditions import render, store, rendition_key, DEFAULT_RENDITION
+
+@pytest.fixture
+def figure():
+    """Fixture with a drawn 12x7 inch figure like the worker's plots."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(12, 7))
+    plt.hexbin([0.01, 0.02, 0.03, 0.02], [5, 10, 15, 10], gridsize=30, mincnt=1)
+    plt.title('NEO Close Approach Distance vs Relative Velocity')
+    yield fig
+    plt.close(fig)
+
+@pytest.fixture
+def client(monkeypatch):
+    """Fixture with a test client of the API and a fakeredis results database."""
+    import NEO_api
+    rdb = fakeredis.FakeRedis()
+    status = {'value': 'complete'}
+    monkeypatch.setattr(NEO_api, 'rdb', rdb)
+    monkeypatch.setattr(NEO_api, 'get_job_by_id', lambda jobid: {'id': jobid, 'status': status['value']})
+    return NEO_api.app.test_client(), rdb, status
+
+def _png_size(image):
+    # width and height from the IHDR chunk
+    return int.from_bytes(image[16:20], 'big'), int.from_bytes(image[20:24], 'big')
+
+def test_render_sizes(figure):
+    """Test each rendition is saved at its resolution and the thumbnail is a few KB."""
+    images = render(figure, ['thumb', 'standard', 'hidpi', 'svg'])
+    assert _png_size(images['standard']) == (1200, 700)
+    assert _png_size(images['hidpi']) == (2400, 1400)
+    assert _png_size(images['thumb']) == (288, 168) and len(images['thumb']) < 16 * 1024
+    assert images['svg'].lstrip().startswith(b'<?xml')
+
+def test_configured_renditions():
+    """Test unknown renditions are ignored and the default one is always saved."""
+    assert renditions._configured('thumb, svg,nope') == ['thumb', 'svg', DEFAULT_RENDITION]
+
+def test_results_served_by_size(client):
+    """Test /results serves the stored rendition asked for and the standard one by default."""
+    test_client, rdb, _ = client
+    store(rdb, 'job', {'standard': b'\x89PNG standard', 'thumb': b'\x89PNG thumb'})
+    assert rdb.get(rendition_key('job', 'standard')) == rdb.get('job_output_plot')
+    response = test_client.get('/results/job')
+    assert response.data == b'\x89PNG standard' and response.mimetype == 'image/png'
+    assert test_client.get('/results/job?size=thumb').data == b'\x89PNG thumb'
+    assert test_client.get('/results/job?size=svg').status_code == 404
+    assert test_client.get('/results/job?size=huge').status_code == 400
+
+def test_results_before_completion(client):
+    """Test an unknown job and a job still running are reported as before."""
+    test_client, rdb, status = client
+    assert test_client.get('/results/nope?size=thumb').data == b'Job ID not found\n'
+    store(rdb, 'job', {'standard': b'\x89PNG standard'})
+    status['value'] = 'in progress'
+    assert test_client.get('/results/job').data == b'Job still in progress'
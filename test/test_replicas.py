@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+import pytest
+import redis
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import replicas
+from catalog import bump_data_version
+from connections import NEO_DB, META_DB
+from replicas import Replica, ReplicaRouter
+
+def server_clients(server):
+    """Returns the catalog and metadata clients of a fakeredis server."""
+    return fakeredis.FakeRedis(server=server, db=NEO_DB), fakeredis.FakeRedis(server=server, db=META_DB)
+
+@pytest.fixture
+def router():
+    """Fixture with a router over a primary and two replicas, all at data version 1."""
+    primary, mdb = server_clients(fakeredis.FakeServer())
+    bump_data_version(mdb)
+    nodes = []
+    for name in ('replica-a:6379', 'replica-b:6379'):
+        catalog, meta = server_clients(fakeredis.FakeServer())
+        bump_data_version(meta)
+        nodes.append(Replica(name, catalog, meta))
+    return ReplicaRouter(primary, mdb, nodes)
+
+def test_round_robin_over_replicas(router):
+    """Test reads alternate between the replicas at the current data version."""
+    picks = [router.pick() for _ in range(4)]
+    assert picks == [router.replicas[0].catalog, router.replicas[1].catalog] * 2
+
+def test_stale_replica_skipped(router, monkeypatch):
+    """Test a replica behind the primary's data version is skipped until it catches up."""
+    monkeypatch.setattr(replicas, 'REPLICA_CHECK_SECONDS', 0)
+    bump_data_version(router.mdb)
+    bump_data_version(router.replicas[1].meta)
+    assert {router.pick() for _ in range(3)} == {router.replicas[1].catalog}
+    bump_data_version(router.mdb)
+    assert router.pick() is router.primary
+    bump_data_version(router.replicas[0].meta)
+    bump_data_version(router.replicas[0].meta)
+    assert {router.pick() for _ in range(2)} == {router.replicas[0].catalog}
+
+def test_unreachable_replica_left_out(router, monkeypatch):
+    """Test an unreachable replica is left out for REPLICA_RETRY_SECONDS, then tried again."""
+    monkeypatch.setattr(replicas, 'REPLICA_CHECK_SECONDS', 0)
+    monkeypatch.setattr(replicas, 'REPLICA_RETRY_SECONDS', 60)
+    healthy = router.replicas[1].meta
+    router.replicas[1].meta = MagicMock()
+    router.replicas[1].meta.get.side_effect = redis.exceptions.ConnectionError("down")
+    assert {router.pick() for _ in range(4)} == {router.replicas[0].catalog}
+    assert router.replicas[1].meta.get.call_count == 1
+    router.replicas[1].meta = healthy
+    router.replicas[1].down_until = 0.0
+    assert router.replicas[1].catalog in {router.pick() for _ in range(2)}
+
+def test_no_replicas_reads_primary():
+    """Test a router without replicas uses the primary without reading the data version."""
+    primary, mdb = MagicMock(), MagicMock()
+    router = ReplicaRouter(primary, mdb, [])
+    assert router.pick() is primary
+    mdb.get.assert_not_called()
+
+def test_reader_keeps_its_pick(router):
+    """Test a reader picks on its first command and sends every later command to the same node."""
+    router.replicas[0].catalog.hset('2025-Jan-01 00:00', 'H(mag)', '20')
+    reader = router.reader()
+    assert reader.keys() == [b'2025-Jan-01 00:00']
+    assert reader.dbsize() == 1
+
+def test_reader_fails_over_to_primary(router, monkeypatch):
+    """Test a read the replica's catalog fails is sent to the primary and the replica left out."""
+    monkeypatch.setattr(replicas, 'REPLICA_RETRY_SECONDS', 60)
+    router.primary.hset('2025-Jan-01 00:00', 'H(mag)', '20')
+    router.replicas[0].catalog = MagicMock()
+    router.replicas[0].catalog.keys.side_effect = redis.exceptions.TimeoutError("timed out")
+    reader = router.reader()
+    assert reader.keys() == [b'2025-Jan-01 00:00']
+    assert reader.dbsize() == 1
+    assert router.replicas[0].down_until > 0
+    assert {router.pick() for _ in range(2)} == {router.replicas[1].catalog}
+
+def test_reader_pipeline_fails_over_to_primary(router):
+    """Test the commands of a pipeline the replica's catalog fails to execute are sent to the primary."""
+    router.primary.hset('2025-Jan-01 00:00', 'H(mag)', '20')
+    router.replicas[0].catalog = MagicMock()
+    router.replicas[0].catalog.pipeline.return_value.execute.side_effect = redis.exceptions.ConnectionError("down")
+    pipe = router.reader().pipeline(transaction=False)
+    pipe.hmget('2025-Jan-01 00:00', ['H(mag)'])
+    assert pipe.execute() == [[b'20']]
+    assert router.replicas[0].down_until > 0
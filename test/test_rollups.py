@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+
+from rollups import (
+    rollup_delta,
+    merge_bucket,
+    subtract_bucket,
+    rollup_changes,
+    month_extremes,
+    parse_period,
+    period_counts,
+    column_stats,
+    bin_index,
+    BIN_EDGES
+)
+
+@pytest.fixture
+def records():
+    """Fixture with three NEO records, two of them in the same month."""
+    return {
+        '2025-Jan-01 00:00 ±  < 00:01': {'V relative(km/s)': 10.0, 'H(mag)': 24.1, 'Rarity': 2},
+        '2025-Jan-20 12:30 ±  00:13': {'V relative(km/s)': 20.0, 'H(mag)': None, 'Rarity': 1},
+        '2026-Mar-03 06:15 ±  00:02': {'V relative(km/s)': 'n/a', 'H(mag)': 18.0, 'Rarity': 2},
+    }
+
+def test_rollup_delta_per_month(records):
+    """Test counts, sums and extremes are grouped by month and missing values skipped."""
+    delta = rollup_delta(records)
+    assert set(delta) == {'2025-01', '2026-03'}
+    assert delta['2025-01']['count'] == 2
+    assert delta['2025-01']['velocity:sum'] == 30.0
+    assert delta['2025-01']['h:n'] == 1
+    assert 'velocity:n' not in delta['2026-03']
+    assert delta['2025-01']['rarity:bin:2'] == 1 and delta['2025-01']['rarity:bin:1'] == 1
+
+def test_merge_bucket():
+    """Test counts and sums add up while min and max are merged."""
+    merged = merge_bucket({'count': 2, 'h:min': 20.0, 'h:max': 25.0},
+                          {'count': 1, 'h:min': 18.0, 'h:max': 22.0, 'h:n': 1})
+    assert merged == {'count': 3, 'h:min': 18.0, 'h:max': 25.0, 'h:n': 1}
+
+def test_parse_period():
+    """Test years and months are parsed into YYYYMM bounds."""
+    assert parse_period('2025') == 202501
+    assert parse_period('2025', end=True) == 202512
+    assert parse_period('2030-Jun') == 203006
+    with pytest.raises(ValueError):
+        parse_period('2025-06-01')
+
+def test_column_stats_combines_buckets(records):
+    """Test statistics of a window match the ones computed on the records."""
+    buckets = {period: {k: float(v) for k, v in bucket.items()} for period, bucket in rollup_delta(records).items()}
+    stats = column_stats(buckets, 'velocity')
+    assert stats['n'] == 2 and stats['mean'] == 15.0 and stats['std'] == pytest.approx(5.0)
+    assert sum(stats['histogram']['counts']) == 2
+    assert column_stats({}, 'h')['mean'] is None
+    assert period_counts(buckets, 'year') == [{'period': '2025', 'count': 2}, {'period': '2026', 'count': 1}]
+
+def test_bin_index_clips():
+    """Test values outside the edges fall into the first and last bins."""
+    edges = BIN_EDGES['velocity']
+    assert list(bin_index(np.array([-1.0, 0.0, 49.9, 80.0]), edges)) == [0, 0, 19, 19]
+
+def test_subtract_bucket_marks_removed_extremes():
+    """Test counts and sums are subtracted and a removed min or max is left to be read again."""
+    bucket, stale = subtract_bucket({'count': 3, 'h:n': 3, 'h:sum': 60.0, 'h:min': 18.0, 'h:max': 22.0,
+                                     'velocity:min': 5.0, 'velocity:max': 9.0},
+                                    {'count': 1, 'h:n': 1, 'h:sum': 18.0, 'h:min': 18.0, 'h:max': 18.0,
+                                     'velocity:min': 7.0, 'velocity:max': 7.0})
+    assert bucket['count'] == 2 and bucket['h:n'] == 2 and bucket['h:sum'] == 42.0
+    assert stale == {'h'}
+
+def test_rollup_changes_skip_unchanged(records):
+    """Test only new records and records with other values change the rollups."""
+    previous = dict(records)
+    changed = dict(records, **{'2025-Jan-01 00:00 ±  < 00:01': {'V relative(km/s)': 12.0, 'H(mag)': 24.1, 'Rarity': 2}})
+    added, removed = rollup_changes(changed, previous)
+    assert set(added) == set(removed) == {'2025-01'}
+    assert added['2025-01']['velocity:sum'] == 12.0 and removed['2025-01']['velocity:sum'] == 10.0
+    assert rollup_changes(records, previous) == ({}, {})
+
+def test_month_extremes_with_new_values(records):
+    """Test the min and max of the asked columns are read over the month, with the new values in place."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from catalog import save_records
+    rd = fakeredis.FakeRedis()
+    pipe = rd.pipeline(transaction=False)
+    save_records(pipe, [dict(record, **{'Close-Approach (CA) Date': key}) for key, record in records.items()])
+    pipe.execute()
+    written = {'2025-Jan-20 12:30 ±  00:13': {'V relative(km/s)': 4.0, 'H(mag)': 30.0, 'Rarity': 1}}
+    assert month_extremes(rd, '2025-01', {'velocity'}, written) == {'velocity:min': 4.0, 'velocity:max': 10.0}
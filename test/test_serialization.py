@@ -0,0 +1,77 @@
+import pytest
+import gzip
+import json
+import math
+from flask import Flask, Response
+
+import serialization
+from serialization import dumps, loads, compress, compress_stream, compress_response, available_encodings
+
+def _decompress(data, encoding):
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(data)
+    return gzip.decompress(data)
+
+def test_dumps_round_trip():
+    """Test serialized data parses back to the same object."""
+    obj = {'2025-Jan-01 00:00 ±  < 00:01': {'Object': '(2025 AB)', 'H(mag)': 24.1, 'Rarity': 2}}
+    body = dumps(obj)
+    assert isinstance(body, bytes)
+    assert json.loads(body) == obj
+
+def test_loads_accepts_nan():
+    """Test stored records containing NaN can still be parsed."""
+    assert math.isnan(loads('{"Diameter": NaN}')['Diameter'])
+
+@pytest.mark.parametrize('encoding', available_encodings())
+def test_compress_stream_round_trip(encoding):
+    """Test a body compressed piece by piece decompresses to the original."""
+    body = dumps([{'i': i, 'name': f'neo {i}'} for i in range(20000)])
+    data = b''.join(compress_stream(body, encoding))
+    assert _decompress(data, encoding) == body
+    assert _decompress(compress(body, encoding), encoding) == body
+
+@pytest.fixture
+def client(monkeypatch):
+    """Fixture with a small app that compresses its responses."""
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route('/big')
+    def big():
+        return Response(b'{"data": "' + b'x' * 5000 + b'"}', mimetype='application/json')
+
+    @app.route('/small')
+    def small():
+        return Response(b'{}', mimetype='application/json')
+
+    return app.test_client()
+
+def test_response_compressed_when_accepted(client):
+    """Test a large body is gzip compressed when the client accepts gzip."""
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['data'] == 'x' * 5000
+
+def test_response_not_compressed_without_accept(client):
+    """Test a body is sent as is when the client does not accept compression."""
+    response = client.get('/big')
+    assert 'Content-Encoding' not in response.headers
+
+def test_small_response_not_compressed(client):
+    """Test a small body is not worth compressing."""
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_large_response_streamed(client, monkeypatch):
+    """Test a body above the streaming threshold is compressed while it is sent."""
+    monkeypatch.setattr(serialization, 'STREAM_MIN_BYTES', 1024)
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert 'Content-Length' not in response.headers
+    assert json.loads(gzip.decompress(response.data))['data'] == 'x' * 5000
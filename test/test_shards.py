@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from catalog import load_keys, load_records, save_records, aload_records
+from shards import ShardedCatalog, AsyncShardedCatalog, node_index
+
+KEYS = [f"{year}-Jan-0{day} 00:00 ±  < 00:01" for year in range(2020, 2030) for day in (1, 2)]
+
+@pytest.fixture
+def servers():
+    """Fixture with four separate fakeredis servers standing in for the catalog nodes."""
+    return [fakeredis.FakeServer() for _ in range(4)]
+
+@pytest.fixture
+def catalog(servers):
+    """Fixture with a sharded catalog holding two NEOs in each year from 2020 to 2029."""
+    catalog = ShardedCatalog([fakeredis.FakeRedis(server=server) for server in servers])
+    pipe = catalog.pipeline()
+    save_records(pipe, [{'Close-Approach (CA) Date': key, 'H(mag)': float(i)} for i, key in enumerate(KEYS)])
+    pipe.execute()
+    return catalog
+
+def test_year_on_one_node(catalog):
+    """Test the NEOs of a year are all stored on the node of that year."""
+    for key in KEYS:
+        assert catalog.nodes[node_index(key, 4)].exists(key)
+    assert len({node_index(key, 4) for key in KEYS}) > 1
+    assert catalog.dbsize() == len(KEYS)
+
+def test_year_pattern_reads_one_node(catalog):
+    """Test a one-year pattern is only sent to the node of that year."""
+    assert catalog.nodes_for('2025-*') == [catalog.nodes[node_index('2025', 4)]]
+    assert sorted(load_keys(catalog, '2025-*')) == KEYS[10:12]
+
+def test_scatter_gather_keeps_order(catalog):
+    """Test pipelined reads over every node come back in the order they were queued."""
+    assert sorted(load_keys(catalog)) == sorted(KEYS)
+    keys = KEYS[::-1]
+    records = load_records(catalog, fields=['H(mag)'], keys=keys)
+    assert list(records) == keys
+    assert [record['H(mag)'] for record in records.values()] == [float(i) for i in range(len(KEYS))][::-1]
+
+def test_async_catalog_matches(servers, catalog):
+    """Test the async sharded catalog reads the same records."""
+    acatalog = AsyncShardedCatalog([fakeredis.FakeAsyncRedis(server=server) for server in servers])
+    records = asyncio.run(aload_records(acatalog, fields=['H(mag)']))
+    assert records == load_records(catalog, fields=['H(mag)'])
+
+def test_flush_every_node(catalog):
+    """Test flushing the catalog empties every node."""
+    catalog.flushdb()
+    assert catalog.dbsize() == 0
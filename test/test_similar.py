@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+from werkzeug.datastructures import MultiDict
+
+from columns import build_table
+from queries import distance_rows
+from similar import KDTree, SimilarityIndex, parse_weights, search
+
+@pytest.fixture
+def points():
+    """Fixture with random points in three dimensions."""
+    return np.random.default_rng(0).normal(size=(500, 3))
+
+def test_knn_matches_brute_force(points):
+    """Test the k nearest rows match a full scan for weighted distances."""
+    tree = KDTree(points, leaf_size=8)
+    weights = np.array([1.0, 3.0, 0.0])
+    target = np.array([0.1, -0.2, 5.0])
+    expected = np.argsort(((points - target) ** 2) @ weights)[:7]
+    assert [row for _, row in tree.knn(target, 7, weights)] == expected.tolist()
+
+def test_radius_matches_brute_force(points):
+    """Test the radius search returns every row within the radius and skips the excluded one."""
+    tree = KDTree(points, leaf_size=8)
+    weights = np.ones(3)
+    distances = ((points - points[3]) ** 2).sum(axis=1)
+    expected = set(np.flatnonzero(distances <= 0.25)) - {3}
+    assert {row for _, row in tree.radius(points[3], 0.5, weights, exclude=3)} == expected
+
+def test_parse_weights():
+    """Test weights default to 1 and unknown features are rejected."""
+    assert parse_weights('velocity:2').tolist() == [1.0, 2.0, 1.0]
+    with pytest.raises(ValueError):
+        parse_weights('mass:2')
+
+def test_search_by_key():
+    """Test a search around a NEO returns its neighbors but not itself, skipping NEOs missing a feature."""
+    records = {
+        '2025-Jan-01 00:00': {'CA DistanceNominal (au)': 0.01, 'V relative(km/s)': 10.0, 'H(mag)': 22.0},
+        '2025-Jan-02 00:00': {'CA DistanceNominal (au)': 0.011, 'V relative(km/s)': 10.5, 'H(mag)': 22.1},
+        '2025-Jan-03 00:00': {'CA DistanceNominal (au)': 0.04, 'V relative(km/s)': 30.0, 'H(mag)': 18.0},
+        '2025-Jan-04 00:00': {'CA DistanceMinimum (au)': 0.01, 'V relative(km/s)': None, 'H(mag)': 22.0},
+    }
+    index = SimilarityIndex(build_table(records))
+    assert len(index) == 3
+    result = search(index, MultiDict({'key': '2025-Jan-01 00:00', 'k': '1'}))
+    assert [key for key, _ in result] == ['2025-Jan-02 00:00']
+    with pytest.raises(ValueError):
+        search(index, MultiDict({'distance': '0.01'}))
+
+def test_distance_matches_distance_query():
+    """Test the index uses the distance /data/distance_query reports, with the minimum for a nominal 0."""
+    records = {
+        '2025-Jan-01 00:00': {'CA DistanceNominal (au)': 0.01, 'V relative(km/s)': 10.0, 'H(mag)': 22.0},
+        '2025-Jan-02 00:00': {'CA DistanceNominal (au)': 0, 'CA DistanceMinimum (au)': 0.02,
+                              'V relative(km/s)': 10.5, 'H(mag)': 22.1},
+        '2025-Jan-03 00:00': {'CA DistanceMinimum (au)': 0.03, 'V relative(km/s)': 30.0, 'H(mag)': 18.0},
+    }
+    table = build_table(records)
+    index = SimilarityIndex(table)
+    _, distances = distance_rows(table)
+    assert np.allclose(index.points[:, 0] * index.std[0] + index.mean[0], distances)
+
+def test_aload_index_keeps_newer_index(monkeypatch):
+    """Test an index built for an older data version does not replace a newer kept one."""
+    import asyncio
+    import similar
+    records = {'2025-Jan-01 00:00': {'CA DistanceNominal (au)': 0.01, 'V relative(km/s)': 10.0, 'H(mag)': 22.0}}
+    newer = SimilarityIndex(build_table(records, version=5))
+    monkeypatch.setattr(similar, '_index', newer)
+
+    async def aload_table(ard, amdb):
+        return build_table(records, version=4)
+
+    monkeypatch.setattr(similar, 'aload_table', aload_table)
+    assert asyncio.run(similar.aload_index(None, None)).version == 4
+    assert similar._index is newer
@@ -0,0 +1,47 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+# import-to-ready budget of an API process, in seconds. Wall-clock time depends on the machine,
+# so the check only runs when a budget is set, e.g. STARTUP_BUDGET=0.3 on a quiet host
+STARTUP_BUDGET = os.environ.get("STARTUP_BUDGET")
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+{ready}
+seconds = time.perf_counter() - start
+import connections
+print(json.dumps({{"seconds": seconds, "modules": sorted(name for name in ("pandas", "matplotlib") if name in sys.modules),
+                  "pools": len(connections._pools)}}))
+'''
+
+API_READY = "assert NEO_api.app.test_client().get('/healthz').status_code == 200"
+
+def start(module: str, ready: str = '') -> dict:
+    """Imports a module in a new interpreter and reports the time it took and what it loaded."""
+    directory = os.path.dirname(importlib.util.find_spec(module).origin)
+    out = subprocess.run([sys.executable, '-c', SCRIPT.format(module=module, ready=ready)], cwd=directory,
+                         capture_output=True, text=True, check=True, env={**os.environ, 'LOG_LEVEL': 'WARNING'})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_api_starts_without_heavy_imports():
+    """Test the API serves its first request without pandas, matplotlib or a Redis connection."""
+    result = start('NEO_api', API_READY)
+    assert result['modules'] == []
+    assert result['pools'] == 0
+
+def test_worker_starts_without_heavy_imports():
+    """Test the worker does not load pandas or matplotlib until a job needs them."""
+    assert start('worker')['modules'] == []
+
+@pytest.mark.skipif(not STARTUP_BUDGET, reason="set STARTUP_BUDGET to time the API startup")
+def test_api_ready_time():
+    """Test the API goes from import to serving /healthz within the startup budget."""
+    best = min(start('NEO_api', API_READY)['seconds'] for _ in range(3))
+    print(f"API ready in {best * 1000:.0f} ms")
+    assert best < float(STARTUP_BUDGET)
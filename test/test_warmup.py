@@ -0,0 +1,64 @@
+import pytest
+from datetime import date
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import connections
+import jobs
+import warmup
+from catalog import bump_data_version
+from connections import QUEUE_DB, JOBS_DB, META_DB
+from warmup import popular_params, find_job, remember_job, queue_warmup
+
+@pytest.fixture
+def mdb(monkeypatch):
+    """Fixture pointing the queue, jobs and metadata databases at one fakeredis server."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(connections, '_pools', {db: fakeredis.FakeRedis(server=server, db=db).connection_pool
+                                                for db in (QUEUE_DB, JOBS_DB, META_DB)})
+    monkeypatch.setattr(connections, '_clients', {})
+    monkeypatch.setattr(connections, '_queues', {})
+    client = connections.get_redis(META_DB)
+    bump_data_version(client)
+    return client
+
+def test_popular_params(monkeypatch):
+    """Test the coming months and years are warmed, with the last day of each month."""
+    monkeypatch.setattr(warmup, 'WARMUP_MONTHS', 3)
+    monkeypatch.setattr(warmup, 'WARMUP_YEARS', 2)
+    assert popular_params(date(2027, 12, 15)) == [('2027-Dec-01', '2027-Dec-31', '2'),
+                                                  ('2028-Jan-01', '2028-Jan-31', '2'),
+                                                  ('2028-Feb-01', '2028-Feb-29', '2'),
+                                                  ('2027-Jan-01', '2027-Dec-31', '1'),
+                                                  ('2028-Jan-01', '2028-Dec-31', '1')]
+
+def test_warmup_once_per_version(mdb, monkeypatch):
+    """Test the warm-up jobs are queued at low priority once per data version."""
+    monkeypatch.setattr(warmup, 'WARMUP_MONTHS', 2)
+    monkeypatch.setattr(warmup, 'WARMUP_YEARS', 1)
+    queued = queue_warmup(mdb, date(2026, 1, 10))
+    assert [job['priority'] for job in queued] == ['low'] * 3
+    assert connections.get_redis(QUEUE_DB).llen(jobs.get_queue(jobs.queue_name('low', '2')).key) == 2
+    assert queue_warmup(mdb, date(2026, 1, 10)) == []
+    assert find_job(mdb, '2026-Feb-01', '2026-Feb-28', '2')['id'] == queued[1]['id']
+    bump_data_version(mdb)
+    assert find_job(mdb, '2026-Feb-01', '2026-Feb-28', '2') is None
+    assert len(queue_warmup(mdb, date(2026, 1, 10))) == 3
+
+def test_failed_job_not_reused(mdb):
+    """Test a job that failed is not returned for its parameters."""
+    job = jobs.add_job('2026-Jan-01', '2026-Jan-31', '2')
+    remember_job(mdb, job)
+    assert find_job(mdb, '2026-Jan-01', '2026-Jan-31', '2')['id'] == job['id']
+    jobs.update_job_status(job['id'], 'failed')
+    assert find_job(mdb, '2026-Jan-01', '2026-Jan-31', '2') is None
+
+def test_promote_queued_job(mdb):
+    """Test a queued warm-up job moves to the class of a user's request, and only up."""
+    job = jobs.add_job('2026-Jan-01', '2026-Dec-31', '1', priority='low')
+    qdb = connections.get_redis(QUEUE_DB)
+    assert jobs.promote_job(job, 'low')['priority'] == 'low'
+    assert jobs.promote_job(job, 'high')['priority'] == 'high'
+    assert qdb.llen(jobs.get_queue(jobs.queue_name('low', '1')).key) == 0
+    assert qdb.llen(jobs.get_queue(jobs.queue_name('high', '1')).key) == 1
+    assert jobs.get_job_by_id(job['id'])['priority'] == 'high'
@@ -7,7 +7,10 @@ from utils import (
     create_min_diam_column,
     create_max_diam_column,
     clean_to_date_only,
-    parse_date
+    parse_date,
+    parse_timestamps,
+    parse_timestamp_fields,
+    to_epoch
 )
 
 # ---- Tests for create_min_diam_column ----
@@ -54,3 +57,195 @@ def test_parse_date_with_extra_whitespace():
 def test_parse_invalid_date():
     with pytest.raises(ValueError):
         parse_date("01/23/2024")
+
+# ---- Tests for parse_timestamps ----
+
+def test_parse_timestamps_matches_strptime():
+    values = ["2025-Jan-01 00:00 ±  < 00:01", "2026-Feb-02 12:30 ±  00:13", "2030-Dec-31 23:59"]
+    epoch, _ = parse_timestamps(values)
+    expected = [to_epoch(datetime.strptime(v.split('±')[0].rstrip(), "%Y-%b-%d %H:%M")) for v in values]
+    assert epoch.tolist() == expected
+
+def test_parse_timestamps_uncertainty():
+    _, uncertainty = parse_timestamps(["2025-Jan-01 00:00 ±  < 00:01", "2020-Jan-24 04:12 ±  1_02:30",
+                                       "2020-Jan-24 04:12 ± 12_00:00", "2030-Dec-31 23:59"])
+    assert uncertainty[:3].tolist() == [1.0, 1590.0, 17280.0]
+    assert np.isnan(uncertainty[3])
+
+def test_parse_timestamps_invalid():
+    epoch, _ = parse_timestamps(["2025-Feb-30 00:00", "2025-Foo-01 00:00", "bogus", ""])
+    assert np.isnan(epoch).all()
+
+def test_parse_timestamp_fields():
+    fields = parse_timestamp_fields(["2025-Mar-07 14:05 ±  00:13"])
+    assert (fields['year'][0], fields['month'][0], fields['day'][0], fields['hour'][0], fields['minute'][0]) == (2025, 3, 7, 14, 5)
+
+# ---- Tests for plot_data ----
+
+def test_plot_data_range_and_missing_values():
+    from columns import build_table
+    from worker import plot_data
+    records = {
+        '2025-Jan-01 00:00 ±  < 00:01': {'V relative(km/s)': 10.0, 'CA DistanceNominal (au)': 0.01, 'H(mag)': 22.0, 'Rarity': 1},
+        '2025-Jan-02 06:00 ±  00:13': {'V relative(km/s)': 12.0, 'CA DistanceMinimum (au)': 0.02, 'H(mag)': 23.0, 'Rarity': 2},
+        '2025-Jan-03 12:00 ±  00:02': {'V relative(km/s)': None, 'CA DistanceNominal (au)': 0.03, 'H(mag)': 24.0, 'Rarity': 3},
+        '2025-Feb-01 00:00 ±  00:01': {'V relative(km/s)': 14.0, 'CA DistanceNominal (au)': 0.04, 'H(mag)': 25.0, 'Rarity': 4},
+    }
+    data = plot_data(build_table(records), to_epoch(datetime(2025, 1, 1)), to_epoch(datetime(2025, 2, 1)))
+    assert data['velocities'] == [10.0, 12.0]
+    assert data['distances'] == [0.01, 0.02]
+    assert data['days'] == [1, 2]
+    assert data['skipped'] == 1
+
+# ---- Tests for batches ----
+
+class _Queue:
+    def __init__(self, items):
+        self.items = list(items)
+
+    def get(self, block=False, timeout=None):
+        return self.items.pop(0) if self.items else None
+
+class _Scheduler:
+    def __init__(self, queue, idle=0):
+        self.queue = queue
+        self.idle = idle
+        self.waits = []
+
+    def get(self, block=False, timeout=0):
+        if block:
+            self.waits.append(timeout)
+        if self.idle:
+            self.idle -= 1
+            return None
+        return 'queue:high:2', self.queue.get()
+
+def test_next_batch_size(monkeypatch):
+    import worker
+    queue = _Queue(['a', 'b', 'c'])
+    monkeypatch.setattr(worker, 'scheduler', _Scheduler(queue))
+    monkeypatch.setattr(worker, 'get_queue', lambda name: queue)
+    assert worker.next_batch(size=2, window=0) == (['a', 'b'], 'queue:high:2')
+    assert worker.next_batch(size=2, window=0) == (['c'], 'queue:high:2')
+
+def test_next_batch_waits_in_short_steps(monkeypatch):
+    import worker
+    queue = _Queue(['a'])
+    scheduler = _Scheduler(queue, idle=3)
+    monkeypatch.setattr(worker, 'scheduler', scheduler)
+    monkeypatch.setattr(worker, 'get_queue', lambda name: queue)
+    assert worker.next_batch(size=1, window=0) == (['a'], 'queue:high:2')
+    assert scheduler.waits == [worker.QUEUE_WAIT_SECONDS] * 3
+    assert 0 < worker.QUEUE_WAIT_SECONDS < worker.REDIS_SOCKET_TIMEOUT
+
+def test_empty_queue_wait_returns_none(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    import connections
+    import jobs
+    monkeypatch.setattr(connections, '_pools', {connections.QUEUE_DB: fakeredis.FakeRedis().connection_pool})
+    monkeypatch.setattr(connections, '_clients', {})
+    monkeypatch.setattr(connections, '_queues', {})
+    assert jobs.JobScheduler().get(block=True, timeout=0.1) is None
+
+def test_do_batch_shares_one_table(monkeypatch):
+    import worker
+    from columns import build_table
+    table = build_table({
+        '2025-Jan-01 00:00 ±  < 00:01': {'V relative(km/s)': 10.0, 'CA DistanceNominal (au)': 0.01, 'H(mag)': 22.0, 'Rarity': 1},
+        '2025-Feb-02 06:00 ±  00:13': {'V relative(km/s)': 12.0, 'CA DistanceNominal (au)': 0.02, 'H(mag)': 23.0, 'Rarity': 2},
+        '2025-Feb-03 12:00 ±  00:02': {'V relative(km/s)': 14.0, 'CA DistanceNominal (au)': 0.03, 'H(mag)': 24.0, 'Rarity': 3},
+    })
+    jobs = {'jan': {'start': '2025-Jan-01', 'end': '2025-Jan-31', 'kind': '2'},
+            'feb': {'start': '2025-Feb-01', 'end': '2025-Feb-28', 'kind': '2'},
+            'mar': {'start': '2025-Mar-01', 'end': '2025-Mar-31', 'kind': '2'}}
+    loads, rendered, failed = [], {}, {}
+    monkeypatch.setattr(worker, 'start_job', jobs.get)
+    monkeypatch.setattr(worker, 'resident_table', lambda rd, mdb: loads.append(1) or table)
+    monkeypatch.setattr(worker, 'render_plot', lambda jobid, job_data, data: rendered.update({jobid: data['days']}))
+    monkeypatch.setattr(worker, 'fail_job', lambda jobid, error: failed.update({jobid: error}))
+    monkeypatch.setattr(worker, 'cancel_requested', lambda jobid: False)
+    monkeypatch.setattr(worker.metrics, 'publish', lambda mdb: None)
+    worker.do_batch(['jan', 'feb', 'mar'])
+    assert len(loads) == 1
+    assert rendered == {'jan': [1], 'feb': [2, 3]}
+    assert failed == {'mar': 'No valid NEO data found in date range'}
+
+def test_do_batch_yields_to_higher_priority(monkeypatch):
+    import worker
+    jobs = {jobid: {'start': '2025-Jan-01', 'end': '2025-Jan-31', 'kind': '1'} for jobid in ('a', 'b', 'c')}
+    rendered, requeued = [], []
+    monkeypatch.setattr(worker, 'start_job', jobs.get)
+    monkeypatch.setattr(worker, 'load_plot_table', lambda ranges: None)
+    monkeypatch.setattr(worker, 'plot_data', lambda table, start, end: {'velocities': [1.0], 'distances': [1.0], 'skipped': 0})
+    monkeypatch.setattr(worker, 'render_plot', lambda jobid, job_data, data: rendered.append(jobid))
+    monkeypatch.setattr(worker.scheduler, 'waiting_above', lambda priority: priority == 'normal')
+    monkeypatch.setattr(worker, 'requeue', lambda name, jobids: requeued.append((name, jobids)))
+    monkeypatch.setattr(worker, 'cancel_requested', lambda jobid: False)
+    monkeypatch.setattr(worker.metrics, 'publish', lambda mdb: None)
+    worker.do_batch(['a', 'b', 'c'], 'queue:normal:1')
+    assert rendered == ['a']
+    assert requeued == [('queue:normal:1', ['b', 'c'])]
+
+def test_cancelled_job_is_not_drawn(monkeypatch):
+    import worker
+    jobs = {jobid: {'start': '2025-Jan-01', 'end': '2025-Jan-31', 'kind': '2'} for jobid in ('a', 'b')}
+    rendered, stopped = [], {}
+    monkeypatch.setattr(worker, 'load_plot_table', lambda ranges: None)
+    monkeypatch.setattr(worker, 'plot_data', lambda table, start, end: {'velocities': [1.0], 'distances': [1.0], 'skipped': 0})
+    monkeypatch.setattr(worker, 'render_plot', lambda jobid, job_data, data: rendered.append(jobid))
+    monkeypatch.setattr(worker, 'cancel_requested', lambda jobid: jobid == 'b')
+    monkeypatch.setattr(worker, 'stop_job', lambda jobid, reason: stopped.update({jobid: reason.status}))
+    worker.run_plot_jobs(list(jobs.items()))
+    assert rendered == ['a']
+    assert stopped == {'b': 'cancelled'}
+
+# ---- Tests for scheduling ----
+
+def _serve(scheduler, busy):
+    names = scheduler.order()
+    name = next(name for name in names if name.split(':')[1:2] and name.split(':')[1] in busy)
+    scheduler.served(names, name)
+    return name
+
+def test_weighted_scheduling_shares():
+    from jobs import JobScheduler
+    scheduler = JobScheduler(weights={'high': 6, 'normal': 3, 'low': 1}, strict=False)
+    served = [_serve(scheduler, ('high', 'normal', 'low')).split(':')[1] for _ in range(100)]
+    assert (served.count('high'), served.count('normal'), served.count('low')) == (60, 30, 10)
+
+def test_strict_scheduling():
+    from jobs import JobScheduler
+    scheduler = JobScheduler(strict=True)
+    assert all(_serve(scheduler, ('high', 'low')).startswith('queue:high') for _ in range(10))
+
+def test_kinds_take_turns():
+    from jobs import JobScheduler
+    scheduler = JobScheduler(strict=True)
+    assert [_serve(scheduler, ('high',)) for _ in range(4)] == ['queue:high:1', 'queue:high:2', 'queue:high:ingest', 'queue:high:1']
+
+def test_idle_class_saves_no_credit():
+    from jobs import JobScheduler
+    scheduler = JobScheduler(weights={'high': 6, 'normal': 3, 'low': 1}, strict=False)
+    for _ in range(50):
+        _serve(scheduler, ('low',))
+    served = [_serve(scheduler, ('high', 'low')).split(':')[1] for _ in range(7)]
+    assert served.count('low') == 1
+
+def test_stopped_render_closes_figure(monkeypatch):
+    pytest.importorskip('matplotlib')
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import worker
+    from limits import JobTimedOut
+
+    def render(figure):
+        raise JobTimedOut("Job timed out")
+
+    monkeypatch.setattr(worker.renditions, 'render', render)
+    data = {'velocities': [10.0, 12.0], 'distances': [0.01, 0.02], 'mags': [22.0, 23.0], 'raritys': [1, 2], 'days': [1, 2]}
+    open_figures = plt.get_fignums()
+    for kind in ('1', '2'):
+        with pytest.raises(JobTimedOut):
+            worker.render_plot('a', {'start': '2025-Jan-01', 'end': '2025-Jan-31', 'kind': kind}, data)
+    assert plt.get_fignums() == open_figures